@@ -15,6 +15,7 @@ from flask_socketio import SocketIO
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.middleware.proxy_fix import ProxyFix
 
+from . import metrics
 from .mycelery import celery_init_app
 from .utils.logger import setup_logging
 
@@ -27,7 +28,7 @@ def my_key_func():
 db = SQLAlchemy()
 jwt = JWTManager()
 mail = Mail()
-redis = FlaskRedis()
+redis = FlaskRedis.from_custom_provider(metrics.InstrumentedRedis)
 socketio = SocketIO()
 cache = Cache()
 
@@ -73,6 +74,8 @@ def create_app(config_name):
     # 配置日志系统
     setup_logging(app)
 
+    # 指标，需在数据库初始化之前
+    metrics.init_app(app)
     db.init_app(app)
     jwt.init_app(app)
     mail.init_app(app)
@@ -125,6 +128,8 @@ def create_ws_app(config_name):
     # 配置日志系统
     setup_logging(app)
 
+    # 连接池指标，需在数据库初始化之前；/metrics 由 HTTP 应用汇总各进程的指标
+    metrics.init_pool(app)
     db.init_app(app)
     jwt.init_app(app)
     redis.init_app(app, decode_responses=True)
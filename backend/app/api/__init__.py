@@ -2,7 +2,7 @@ from flask import Blueprint
 
 api = Blueprint("api", __name__)
 
-from . import _admin, authentication, errors, follow, upload, users
+from . import _admin, authentication, errors, follow, hook, upload, users
 from .comments import register_comment_api
 from .follow import register_follow_api
 from .logs import register_log_api
@@ -28,8 +28,12 @@ register_praise_api(
     comment_praise_url="/comments/<int:comment_id>/likes",
 )
 register_tag_api(api, tag_user_url="/users/<int:user_id>/tags", tag_url="/tags")
-register_message_api(api, message_url="/conversations/<int:user_id>/messages")
-register_log_api(api, logs_url="/logs")
+register_message_api(
+    api,
+    message_url="/conversations/<int:user_id>/messages",
+    conversation_url="/conversations",
+)
+register_log_api(api, logs_url="/logs", stats_url="/logs/stats")
 register_comment_api(
     api,
     comment_url="/posts/<int:post_id>/comments",
@@ -3,11 +3,12 @@ import logging
 from flask import request
 from flask_jwt_extended import jwt_required
 
-from .. import db
+from .. import db, redis
 from ..decorators import permission_required
 from ..models import Image, ImageType, Permission, Post, PostType
 from ..utils.markdown_truncate import MarkdownTruncator
 from ..utils.response import error, success
+from ..utils.sql_profiler import SqlProfiler
 from . import api
 
 
@@ -168,3 +169,32 @@ def update_post_type():
         message=f"成功为 id为{post_id} 的文章类型改为{post_type}",
         data="",
     )
+
+
+@api.route("/admin/sql-profile")
+@jwt_required()
+@permission_required(Permission.ADMIN)
+def get_sql_profile():
+    """
+    管理员专用：各接口的 SQL 次数、耗时与总耗时分位数（毫秒），以及累计耗时最多的慢查询
+    """
+    limit = request.args.get("limit", 20, type=int)
+    profiler = SqlProfiler(redis)
+    return success(
+        data={
+            "endpoints": profiler.endpoint_stats(),
+            "slowQueries": profiler.slow_queries(limit),
+        }
+    )
+
+
+@api.route("/admin/sql-profile", methods=["DELETE"])
+@jwt_required()
+@permission_required(Permission.ADMIN)
+def reset_sql_profile():
+    """
+    管理员专用：清空 SQL 统计
+    """
+    SqlProfiler(redis).reset()
+    logging.info("已清空SQL统计")
+    return success(message="已清空SQL统计")
@@ -2,6 +2,7 @@ import logging
 
 from flask import current_app, request
 from flask_jwt_extended import current_user, jwt_required
+from sqlalchemy.orm import joinedload
 from werkzeug.exceptions import TooManyRequests
 
 from .. import db, limiter
@@ -9,8 +10,9 @@ from ..decorators import DecoratedMethodView, permission_required
 from ..models import Comment, NotificationType, Permission, Post
 from ..mycelery.notification_task import create_comment_notifications
 from ..utils.common import get_avatars_url
+from ..utils.pagination import cached_count, keyset_paginate
 from ..utils.response import error, success
-from ..utils.text_filter import DFAFilter
+from ..utils.text_filter import get_keyword_filter
 from ..utils.time_util import DateUtils
 from . import api
 
@@ -58,7 +60,7 @@ class CommentApi(DecoratedMethodView):
         """
         # 基础查询：直接回复
         query = Comment.query.filter_by(root_comment_id=root_comment_id).order_by(
-            Comment.timestamp.desc()
+            Comment.timestamp.desc(), Comment.id.desc()
         )
         # 分页查询
         pagination = query.paginate(
@@ -66,12 +68,7 @@ class CommentApi(DecoratedMethodView):
             per_page=current_app.config["FLASKY_COMMENTS_REPLY_PER_PAGE"],
             error_out=False,
         )
-        replies = []
-        for reply in pagination.items:
-            reply_data = reply.to_json()
-            replies.append(reply_data)
-
-        return replies, query.count()
+        return Comment.batch_to_json(pagination.items), pagination.total
 
     @staticmethod
     def create_comment_notification(
@@ -101,39 +98,55 @@ class CommentApi(DecoratedMethodView):
             post_id, comment_id, current_user.id, notifications_data
         )
 
+    @staticmethod
+    def build_comment_tree(root_comments):
+        """为根评论附加第一页回复，返回 (评论列表, 当前用户已点赞的评论id)"""
+        return Comment.load_threads(
+            root_comments, current_app.config["FLASKY_COMMENTS_REPLY_PER_PAGE"]
+        )
+
     def get(self, post_id):
+        """获取文章评论
+
+        传入 cursor 参数（第一页传空字符串）时使用游标分页，返回 next_cursor
+        """
         logging.info(f"获取文章评论: post_id={post_id}")
         post = Post.query.get_or_404(post_id)
-        page = request.args.get("page", 1, type=int)
         per_page = request.args.get(
             "size", current_app.config["FLASKY_COMMENTS_PER_PAGE"], type=int
         )
-        # 获取根评论分页（parent_comment_id为None）
-        root_comments_pagination = (
-            post.comments.filter(Comment.root_comment_id.is_(None))
-            .order_by(Comment.timestamp.desc())
-            .paginate(page=page, per_page=per_page, error_out=False)
-        )
+        # 根评论（root_comment_id为None）
+        root_query = post.comments.filter(Comment.root_comment_id.is_(None))
 
-        comments = []
-        for root_comment in root_comments_pagination.items:
-            comment_data = root_comment.to_json()
-            # 获取该根评论下的第一层直接回复（direct_parent_id=根评论ID）
-            first_level_replies, reply_total = CommentApi.get_replies_by_parent(
-                root_comment.id, page=1
+        cursor = request.args.get("cursor")
+        if cursor is not None:
+            root_comments, next_cursor = keyset_paginate(
+                root_query, Comment.timestamp, Comment.id, cursor, per_page
             )
-            comment_data.update(
-                {
-                    "reply": {
-                        "list": first_level_replies,
-                        "total": reply_total,
-                    }
-                }
+            extra = {}
+            if request.args.get("with_total") == "true":
+                extra["total"] = cached_count(f"comments:post:{post_id}", root_query)
+            comments, liked_ids = CommentApi.build_comment_tree(root_comments)
+            return success(
+                data=comments,
+                liked_ids=liked_ids,
+                next_cursor=next_cursor,
+                **extra,
             )
-            comments.append(comment_data)
 
+        page = request.args.get("page", 1, type=int)
+        root_comments_pagination = root_query.order_by(
+            Comment.timestamp.desc(), Comment.id.desc()
+        ).paginate(page=page, per_page=per_page, error_out=False)
+
+        comments, liked_ids = CommentApi.build_comment_tree(
+            root_comments_pagination.items
+        )
         return success(
-            data=comments, total=root_comments_pagination.total, current_page=page
+            data=comments,
+            liked_ids=liked_ids,
+            total=root_comments_pagination.total,
+            current_page=page,
         )
 
     def post(self, post_id):
@@ -162,9 +175,9 @@ class CommentApi(DecoratedMethodView):
                 )
             # 创建评论（设置两个父级关系）
             comment = Comment(
-                body=DFAFilter().filter(data.get("body"), "*"),
+                body=get_keyword_filter().filter(data.get("body"), "*"),
                 post=post,
-                author=current_user,
+                author_id=current_user.id,
                 direct_parent=direct_parent,
                 root_comment=root_comment,
             )
@@ -210,10 +223,14 @@ class CommentManageApi(DecoratedMethodView):
     @staticmethod
     def all_comments(page):
         query = Comment.query
-        pagination = query.order_by(Comment.timestamp.desc()).paginate(
-            page=page,
-            per_page=current_app.config["FLASKY_COMMENTS_PER_PAGE"],
-            error_out=False,
+        pagination = (
+            query.options(joinedload(Comment.author))
+            .order_by(Comment.timestamp.desc())
+            .paginate(
+                page=page,
+                per_page=current_app.config["FLASKY_COMMENTS_PER_PAGE"],
+                error_out=False,
+            )
         )
         comments = [
             {
@@ -227,8 +244,7 @@ class CommentManageApi(DecoratedMethodView):
             }
             for item in pagination.items
         ]
-        total = query.count()
-        return comments, total
+        return comments, pagination.total
 
     def patch(self, comment_id):
         """禁用/恢复评论"""
@@ -262,7 +278,7 @@ class CommentManageApi(DecoratedMethodView):
             post = Post.query.get(comment.post_id)
             is_comment_author = current_user.id == comment.author_id
             is_post_author = current_user.id == post.author_id
-            is_admin = current_user.role.permissions & Permission.ADMIN
+            is_admin = current_user.is_administrator()
 
             if not (is_comment_author or is_post_author or is_admin):
                 return error(403, "没有权限删除此评论")
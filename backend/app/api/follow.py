@@ -6,6 +6,7 @@ from flask_jwt_extended import current_user, jwt_required
 from .. import db
 from ..decorators import DecoratedMethodView, permission_required
 from ..models import Follow, Permission, User
+from ..timeline import timeline
 from ..utils.common import get_avatars_url
 from ..utils.response import error, not_found, success
 from ..utils.time_util import DateUtils
@@ -189,6 +190,7 @@ class UserFollowApi(DecoratedMethodView):
         try:
             current_user.follow(user)
             db.session.commit()
+            timeline.on_follow(current_user.id, user.id)
             return success(data=user.to_json())
         except Exception as e:
             logging.error(f"关注用户失败: {str(e)}", exc_info=True)
@@ -207,6 +209,7 @@ class UserFollowApi(DecoratedMethodView):
         try:
             current_user.unfollow(user)
             db.session.commit()
+            timeline.on_unfollow(current_user.id, user.id)
             return success(data=user.to_json())
         except Exception as e:
             logging.error(f"取消关注用户失败: {str(e)}", exc_info=True)
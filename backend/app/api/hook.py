@@ -1,18 +1,69 @@
 import logging
+import random
 
-from flask import current_app
-from flask_sqlalchemy import record_queries
+from flask import current_app, request
+from sqlalchemy import event
 
+from .. import db, redis
+from ..utils import sql_profiler
+from ..utils.sql_profiler import SqlProfiler
 from . import api
 
 
+@api.record_once
+def listen_sql(state):
+    """在数据库引擎上记录每条语句的耗时，只在请求内累加"""
+    with state.app.app_context():
+        event.listen(
+            db.engine, "before_cursor_execute", sql_profiler.before_cursor_execute
+        )
+        event.listen(
+            db.engine, "after_cursor_execute", sql_profiler.after_cursor_execute
+        )
+
+
+@api.before_app_request
+def before_request():
+    rate = current_app.config["SQL_PROFILE_SAMPLE_RATE"]
+    sql_profiler.start_request(rate > 0 and random.random() < rate)
+
+
 @api.after_app_request
 def after_request(response):
-    for query in record_queries.get_recorded_queries():
-        if query.duration >= current_app.config["FLASKY_SLOW_DB_QUERY_TIME"]:
-            print("发现慢查询")
+    profile = sql_profiler.finish_request()
+    if profile is None:
+        return response
+    try:
+        _record_profile(profile)
+    except Exception as e:
+        logging.error(f"记录SQL统计失败: {str(e)}", exc_info=True)
+    return response
+
+
+def _record_profile(profile):
+    config = current_app.config
+    endpoint = request.endpoint or "unknown"
+    total_time = profile.total_time
+    slow_query_time = config["FLASKY_SLOW_DB_QUERY_TIME"]
+    SqlProfiler(redis).record_request(endpoint, profile, total_time, slow_query_time)
+
+    for statement, parameters, duration in profile.statements:
+        if duration >= slow_query_time:
             logging.warning(
-                "慢查询: %s\n参数: %s\n时长: %fs\n"
-                % (query.statement, query.parameters, query.duration)
+                "慢查询: %s\n参数: %s\n时长: %fs\n" % (statement, parameters, duration)
             )
-    return response
+
+    # 抽样或整体耗时超过阈值的请求，记录全部语句
+    if profile.sampled or total_time >= config["SQL_PROFILE_SLOW_REQUEST"]:
+        lines = [
+            f"SQL统计 {request.method} {request.path} ({endpoint}): "
+            f"{profile.queries} 条, SQL耗时 {profile.sql_time:.3f}s, "
+            f"总耗时 {total_time:.3f}s"
+        ]
+        for idx, (statement, parameters, duration) in enumerate(
+            profile.statements, start=1
+        ):
+            lines.append(f"[{idx}] ({duration:.6f}s) {statement}")
+            if parameters is not None:
+                lines.append(f"    参数: {parameters}")
+        logging.info("\n".join(lines))
@@ -1,12 +1,16 @@
 import logging
+from datetime import datetime, timedelta
 
 from flask import current_app, request
 from flask_jwt_extended import jwt_required
 
 from .. import db, redis
 from ..decorators import DecoratedMethodView, admin_required
-from ..models import Log, User
+from ..models import Log, LogRollup, User
+from ..mycelery.log_task import UA_CACHE_SIZES_KEY, UA_CACHE_STATS_KEY
+from ..utils.pagination import cached_count, invalidate_count, keyset_paginate
 from ..utils.response import error, success
+from ..utils.time_util import DateUtils
 from ..websocket import init_ws_services
 from . import api
 
@@ -19,7 +23,7 @@ def online():
     """获取在线用户信息"""
     logging.info("获取在线用户信息")
 
-    _, presence, _ = init_ws_services(redis)
+    _, presence, _, _ = init_ws_services(redis)
     # 在线人数信息
     user_ids = presence.list_online_users()
     logging.info(f"在线用户:{user_ids}")
@@ -28,25 +32,55 @@ def online():
     return success(data=users, total=len(user_ids))
 
 
+@api.route("/logs/ua-cache")
+@admin_required
+@jwt_required()
+def ua_cache():
+    """获取 user-agent 解析缓存的命中情况（各进程截至最近一次日志入库的合计）"""
+    stats = {k: int(v) for k, v in redis.hgetall(UA_CACHE_STATS_KEY).items()}
+    stats["size"] = sum(int(v) for v in redis.hvals(UA_CACHE_SIZES_KEY))
+    hits, misses = stats.get("hits", 0), stats.get("misses", 0)
+    total = hits + misses
+    return success(data={**stats, "hitRate": hits / total if total else 0.0})
+
+
 class LogApi(DecoratedMethodView):
     method_decorators = {
         "share": [jwt_required(), admin_required],
     }
 
     def get(self):
-        """获取系统日志"""
+        """获取系统日志
+
+        传入 cursor 参数（第一页传空字符串）时使用游标分页，返回 next_cursor；
+        日志总数为缓存值，可能有 1 分钟内的误差
+        """
         logging.info("获取系统日志")
-        page = request.args.get("page", 1, type=int)
         per_page = request.args.get(
             "per_page", current_app.config["FLASKY_LOG_PER_PAGE"], type=int
         )
         query = Log.query
-        paginate = query.order_by(Log.operate_time.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
+
+        cursor = request.args.get("cursor")
+        if cursor is not None:
+            logs, next_cursor = keyset_paginate(
+                query, Log.operate_time, Log.id, cursor, per_page
+            )
+            return success(
+                data=[log.to_json() for log in logs],
+                next_cursor=next_cursor,
+                total=cached_count("logs", query),
+            )
+
+        page = request.args.get("page", 1, type=int)
+        paginate = query.order_by(Log.operate_time.desc(), Log.id.desc()).paginate(
+            page=page, per_page=per_page, error_out=False, count=False
         )
         logs = paginate.items
         logging.info(f"获取到 {len(logs)} 条日志记录")
-        return success(data=[log.to_json() for log in logs], total=query.count())
+        return success(
+            data=[log.to_json() for log in logs], total=cached_count("logs", query)
+        )
 
     def delete(self):
         """删除系统日志"""
@@ -59,6 +93,7 @@ class LogApi(DecoratedMethodView):
 
             deleted_count = Log.query.filter(Log.id.in_(ids)).delete()
             db.session.commit()
+            invalidate_count("logs")
             logging.info(f"成功删除 {deleted_count} 条日志记录")
             return success(message=f"成功删除 {deleted_count} 条日志记录")
         except Exception as e:
@@ -67,7 +102,36 @@ class LogApi(DecoratedMethodView):
             return error(500, f"删除日志失败: {str(e)}")
 
 
-def register_log_api(bp, *, logs_url):
-    logging.info(f"注册日志API: {logs_url}")
+class LogStatsApi(DecoratedMethodView):
+    method_decorators = {
+        "share": [jwt_required(), admin_required],
+    }
+
+    def get(self):
+        """获取访客统计，读取汇总表，不扫描日志
+
+        period: hour 按小时（默认最近 1 天）或 day 按天（默认最近 30 天）
+        days: 统计最近的天数
+        limit: 每个维度返回访问量最多的取值个数
+        """
+        period = request.args.get("period", LogRollup.DAY)
+        if period not in LogRollup.PERIODS:
+            return error(400, f"不支持的统计周期: {period}")
+        days = request.args.get("days", 1 if period == LogRollup.HOUR else 30, type=int)
+        limit = request.args.get("limit", 10, type=int)
+        logging.info(f"获取访客统计: period={period}, days={days}")
+
+        now = datetime.now(DateUtils.Shanghai_tz).replace(tzinfo=None)
+        start = LogRollup.bucket_of(period, now - timedelta(days=days))
+        data = {"timeline": LogRollup.timeline(period, start)}
+        for dimension in LogRollup.DIMENSIONS:
+            data[dimension] = LogRollup.top_values(period, start, dimension, limit)
+        return success(data=data)
+
+
+def register_log_api(bp, *, logs_url, stats_url):
+    logging.info(f"注册日志API: {logs_url}, {stats_url}")
     _log = LogApi.as_view("logs")
     bp.add_url_rule(logs_url, view_func=_log)
+    _stats = LogStatsApi.as_view("log_stats")
+    bp.add_url_rule(stats_url, view_func=_stats)
@@ -2,10 +2,12 @@ import logging
 
 from flask import current_app, request
 from flask_jwt_extended import current_user, jwt_required
+from sqlalchemy.orm import joinedload
 
 from .. import db
 from ..decorators import DecoratedMethodView
-from ..models import Message
+from ..models import Conversation, Message
+from ..utils.pagination import decode_cursor, encode_cursor
 from ..utils.response import success
 
 # --------------------------- 聊天消息 ---------------------------
@@ -16,28 +18,8 @@ class MessageApi(DecoratedMethodView):
         "share": [jwt_required()],
     }
 
-    def get(self, user_id):
-        """获取聊天历史记录"""
-        logging.info(f"获取聊天历史: user_id={current_user.id}")
-        current_user_id = current_user.id
-        other_user_id = user_id
-        page = request.args.get("page", 1, type=int)
-        query = Message.query.filter(
-            (
-                (Message.sender_id == current_user_id)
-                & (Message.receiver_id == other_user_id)
-            )
-            | (
-                (Message.sender_id == other_user_id)
-                & (Message.receiver_id == current_user_id)
-            )
-        ).order_by(Message.timestamp.desc())
-        pagination = query.paginate(
-            page=page,
-            per_page=current_app.config["FLASKY_CHAT_PER_PAGE"],
-            error_out=False,
-        )
-        messages = pagination.items
+    @staticmethod
+    def messages_to_json(messages):
         r = []
         _id = len(messages)
         for message in messages:
@@ -45,21 +27,93 @@ class MessageApi(DecoratedMethodView):
             r1.update({"id": _id})
             r.append(r1)
             _id -= 1
-        return success(data=r, total=pagination.total)
+        return r
+
+    @staticmethod
+    def paginate_by_id(query, cursor, per_page):
+        """按 id 倒序的游标分页，游标格式与 keyset_paginate 相同"""
+        if cursor:
+            _, ident = decode_cursor(cursor)
+            query = query.filter(Message.id < ident)
+        messages = query.order_by(Message.id.desc()).limit(per_page + 1).all()
+        if len(messages) <= per_page:
+            return messages, None
+        messages = messages[:per_page]
+        return messages, encode_cursor(messages[-1].timestamp, messages[-1].id)
+
+    def get(self, user_id):
+        """获取聊天历史记录
+
+        传入 cursor 参数（第一页传空字符串）时使用游标分页，返回 next_cursor
+        """
+        logging.info(f"获取聊天历史: user_id={current_user.id}")
+        current_user_id = current_user.id
+        other_user_id = user_id
+        per_page = current_app.config["FLASKY_CHAT_PER_PAGE"]
+        # 消息id随发送时间递增，按 (conversation_id, id) 索引倒序扫描
+        query = Message.query.filter(
+            Message.conversation_id
+            == Message.conversation_key(current_user_id, other_user_id)
+        )
+
+        cursor = request.args.get("cursor")
+        if cursor is not None:
+            messages, next_cursor = MessageApi.paginate_by_id(query, cursor, per_page)
+            return success(
+                data=MessageApi.messages_to_json(messages), next_cursor=next_cursor
+            )
+
+        page = request.args.get("page", 1, type=int)
+        pagination = query.order_by(Message.id.desc()).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
+        return success(
+            data=MessageApi.messages_to_json(pagination.items), total=pagination.total
+        )
 
     def post(self, user_id):
         """标记消息为已读"""
         logging.info(f"标记消息已读: user_id={current_user.id}")
         message_ids = request.json.get("ids", [])
-        Message.query.filter(
-            Message.id.in_(message_ids),
-            Message.receiver_id == current_user.id,
-            Message.sender_id == user_id,
-        ).update({"is_read": True}, synchronize_session=False)
+        Conversation.mark_read(current_user.id, user_id, message_ids)
         db.session.commit()
         return success(message="消息已标记为已读")
 
 
-def register_message_api(bp, *, message_url):
+class ConversationApi(DecoratedMethodView):
+    method_decorators = {
+        "share": [jwt_required()],
+    }
+
+    def get(self):
+        """获取当前用户的会话列表，按最近消息倒序
+
+        cursor 为上一页最后一个会话的最后消息id，第一页不传
+        """
+        per_page = current_app.config["FLASKY_CONVERSATIONS_PER_PAGE"]
+        query = Conversation.query.options(joinedload(Conversation.peer)).filter(
+            Conversation.user_id == current_user.id
+        )
+        cursor = request.args.get("cursor", type=int)
+        if cursor:
+            query = query.filter(Conversation.last_message_id < cursor)
+        conversations = (
+            query.order_by(Conversation.last_message_id.desc())
+            .limit(per_page + 1)
+            .all()
+        )
+        next_cursor = None
+        if len(conversations) > per_page:
+            conversations = conversations[:per_page]
+            next_cursor = conversations[-1].last_message_id
+        return success(
+            data=[conversation.to_json() for conversation in conversations],
+            next_cursor=next_cursor,
+        )
+
+
+def register_message_api(bp, *, message_url, conversation_url):
     message = MessageApi.as_view("message")
     bp.add_url_rule(message_url, view_func=message)
+    conversation = ConversationApi.as_view("conversation")
+    bp.add_url_rule(conversation_url, view_func=conversation)
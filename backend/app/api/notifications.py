@@ -1,12 +1,13 @@
 import logging
 
-from flask import request
+from flask import current_app, request
 from flask_jwt_extended import current_user, jwt_required
 from sqlalchemy.orm import joinedload
 
 from .. import db
 from ..decorators import DecoratedMethodView
 from ..models import Notification, User
+from ..utils.pagination import keyset_paginate
 from ..utils.response import success
 
 
@@ -17,30 +18,69 @@ class NotificationApi(DecoratedMethodView):
     }
 
     def get(self):
-        """获取当前用户的所有通知"""
+        """获取当前用户的通知
+
+        默认返回最新一页，传入 cursor 获取更早的一页（返回 next_cursor），
+        传入 since_id 按 id 从小到大获取该 id 之后的新通知，返回下一次请求用的
+        since_id 和是否还有更多 has_more；均附带未读数 unread
+        """
         logging.info(f"获取用户通知: user_id={current_user.id}")
+        per_page = request.args.get(
+            "per_page", current_app.config["FLASKY_NOTIFICATIONS_PER_PAGE"], type=int
+        )
         # 预加载触发用户数据避免N+1查询
-        notifications = (
-            Notification.query.options(
-                joinedload(Notification.trigger_user).load_only(
-                    User.id, User.username, User.nickname, User.image
-                )
+        query = Notification.query.options(
+            joinedload(Notification.trigger_user).load_only(
+                User.id, User.username, User.nickname, User.image
+            )
+        ).filter_by(receiver_id=current_user.id)
+        unread = Notification.unread_count(current_user.id)
+
+        since_id = request.args.get("since_id", type=int)
+        if since_id is not None:
+            # 按 id 升序取，超过一页时下次从本页最后一条继续，不会跳过较早的新通知
+            notifications = (
+                query.filter(Notification.id > since_id)
+                .order_by(Notification.id.asc())
+                .limit(per_page + 1)
+                .all()
             )
-            .filter_by(receiver_id=current_user.id)
-            .order_by(Notification.created_at.desc())
-            .all()
+            has_more = len(notifications) > per_page
+            notifications = notifications[:per_page]
+            return success(
+                data=[item.to_json() for item in notifications],
+                since_id=notifications[-1].id if notifications else since_id,
+                has_more=has_more,
+                unread=unread,
+            )
+
+        notifications, next_cursor = keyset_paginate(
+            query,
+            Notification.updated_at,
+            Notification.id,
+            request.args.get("cursor"),
+            per_page,
+        )
+        return success(
+            data=[item.to_json() for item in notifications],
+            next_cursor=next_cursor,
+            unread=unread,
         )
-        return success(data=[item.to_json() for item in notifications])
 
     def patch(self):
         """标记通知为已读"""
         logging.info(f"标记通知已读: user_id={current_user.id}")
         ids = request.get_json().get("ids", [])
-        Notification.query.filter(
-            Notification.id.in_(ids), Notification.receiver_id == current_user.id
+        updated = Notification.query.filter(
+            Notification.id.in_(ids),
+            Notification.receiver_id == current_user.id,
+            Notification.is_read.is_(False),
         ).update({"is_read": True}, synchronize_session=False)
         db.session.commit()
-        return success(message="通知已标记为已读")
+        Notification.adjust_unread({current_user.id: -updated})
+        return success(
+            message="通知已标记为已读", unread=Notification.unread_count(current_user.id)
+        )
 
 
 def register_notification_api(bp, *, notification_url):
@@ -5,10 +5,19 @@ from flask_jwt_extended import current_user, jwt_required
 from sqlalchemy.orm import joinedload
 
 from .. import cache, db, limiter
-from ..decorators import DecoratedMethodView, log_operate, sql_profile
-from ..models import Follow, Image, ImageType, Permission, Post, PostType, User
+from ..decorators import DecoratedMethodView, log_operate
+from ..models import Image, ImageType, Permission, Post, PostType, User
 from ..mycelery.notification_task import create_new_post_notifications
+from ..mycelery.timeline_task import fan_out_post, remove_post_from_timelines
+from ..timeline import timeline
+from ..utils.feed_cache import ALL_FEED, bump_feeds, feed_version
 from ..utils.markdown_truncate import MarkdownTruncator
+from ..utils.pagination import (
+    cached_count,
+    decode_cursor,
+    encode_cursor,
+    keyset_paginate,
+)
 from ..utils.response import error, success
 
 
@@ -50,7 +59,9 @@ class PostItemApi(DecoratedMethodView):
             return error(404, "文章不存在")
         PostItemApi.soft_delete(p)
         # 移除文章缓存
-        cache.delete_memoized(PostGroupApi.query_post)
+        Post.invalidate_cards([p.id])
+        bump_feeds([ALL_FEED])
+        remove_post_from_timelines.delay(p.id, p.author_id)
         return success(message="文章删除成功")
 
     def patch(self, id):
@@ -87,6 +98,7 @@ class PostItemApi(DecoratedMethodView):
             ]
             db.session.add_all(images)
         db.session.commit()
+        Post.invalidate_cards([post.id])
 
         posts_json = Post.batch_query_with_data([post], is_list=False)
 
@@ -95,50 +107,99 @@ class PostItemApi(DecoratedMethodView):
 
 class PostGroupApi(DecoratedMethodView):
     method_decorators = {
-        "get": [log_operate, sql_profile],
-        # "get": [sql_profile],
+        "get": [log_operate],
         "post": [jwt_required()],
     }
 
+    # 每页文章id的缓存时间（秒）
+    PAGE_CACHE_TIMEOUT = 60
+
     @staticmethod
-    @cache.memoize(timeout=60)
-    def query_post(page, per_page, tab_name=None):
+    def feed_query(tab_name=None):
+        """文章列表基础查询"""
         if tab_name and tab_name == "showFollowed":
-            base_query = current_user.followed_posts
-        else:
-            base_query = Post.query.filter_by(deleted=False)
+            return current_user.followed_posts
+        return Post.query.filter_by(deleted=False)
 
-        # 主查询：预加载作者信息
-        # joinedload() 的行为是自动创建 join
-        query = base_query.options(
-            joinedload(Post.author).load_only(
-                User.id, User.username, User.nickname, User.image
-            )
-        ).order_by(Post.timestamp.desc())
+    @staticmethod
+    def query_post_ids(page, per_page, tab_name=None):
+        """分页查询文章id，返回 (文章id列表, 总数)
 
-        # 分页查询
-        paginate = query.paginate(page=page, per_page=per_page, error_out=False)
-        posts = paginate.items
+        关注文章流读取时间线；全部文章按 (版本号, 页码) 缓存，文章发布/删除时版本号递增
+        """
+        if tab_name and tab_name == "showFollowed":
+            post_ids = timeline.read(current_user.id, limit=page * per_page)
+            if post_ids is not None:
+                total = cached_count(
+                    f"posts:followed:{current_user.id}",
+                    PostGroupApi.feed_query(tab_name),
+                )
+                return post_ids[(page - 1) * per_page :], total
+            return PostGroupApi.query_post_ids_from_db(page, per_page, tab_name)
 
-        if not posts:
-            return [], paginate.total
+        key = f"feed_page:{ALL_FEED}:{feed_version(ALL_FEED)}:{page}:{per_page}"
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+        result = PostGroupApi.query_post_ids_from_db(page, per_page, tab_name)
+        cache.set(key, result, timeout=PostGroupApi.PAGE_CACHE_TIMEOUT)
+        return result
 
-        result = Post.batch_query_with_data(posts, is_list=True)
+    @staticmethod
+    def query_post_ids_from_db(page, per_page, tab_name=None):
+        query = PostGroupApi.feed_query(tab_name)
+        total = query.order_by(None).count()
+        rows = (
+            query.with_entities(Post.id)
+            .order_by(Post.timestamp.desc(), Post.id.desc())
+            .offset((page - 1) * per_page)
+            .limit(per_page)
+            .all()
+        )
+        return [post_id for post_id, in rows], total
 
-        return result, paginate.total
+    @staticmethod
+    def query_post(page, per_page, tab_name=None):
+        post_ids, total = PostGroupApi.query_post_ids(page, per_page, tab_name)
+        return Post.feed_cards(post_ids), total
 
     @staticmethod
-    def new_post_notification(post_id):
-        """异步创建新文章通知并推送给粉丝"""
-        # 批量查询当前用户的所有粉丝（排除自己）
-        followers = (
-            Follow.query.filter_by(followed_id=current_user.id)
-            .filter(Follow.follower_id != current_user.id)
-            .all()
+    def query_post_by_cursor(cursor, per_page, tab_name=None):
+        """游标分页获取文章列表"""
+        if tab_name and tab_name == "showFollowed":
+            before_id = decode_cursor(cursor)[1] if cursor else None
+            post_ids = timeline.read(current_user.id, before_id, per_page + 1)
+            if post_ids is not None:
+                posts = Post.feed_cards(post_ids[:per_page])
+                next_cursor = None
+                if len(post_ids) > per_page:
+                    # 游标取自时间线中的 id（即分数），本页文章都已删除或被过滤时仍可继续翻页；
+                    # 文章为逻辑删除，时间仍可查到，供回退到数据库分页时使用
+                    last_id = post_ids[per_page - 1]
+                    timestamp = db.session.scalar(
+                        db.select(Post.timestamp).where(Post.id == last_id)
+                    )
+                    next_cursor = encode_cursor(timestamp, last_id)
+                return posts, next_cursor
+
+        query = PostGroupApi.feed_query(tab_name).options(
+            joinedload(Post.author).load_only(
+                User.id, User.username, User.nickname, User.image
+            )
+        )
+        posts, next_cursor = keyset_paginate(
+            query,
+            Post.timestamp,
+            Post.id,
+            cursor,
+            per_page,
         )
+        return Post.batch_query_with_data(posts, is_list=True), next_cursor
 
-        follower_ids = [follow.follower_id for follow in followers]
-        create_new_post_notifications.delay(post_id, current_user.id, follower_ids)
+    @staticmethod
+    def new_post_notification(post_id):
+        """异步创建新文章通知并推送给粉丝，粉丝由任务分批查询"""
+        create_new_post_notifications.delay(post_id, current_user.id)
 
     @staticmethod
     def submit_to_db(post_type, content, images=None):
@@ -148,7 +209,7 @@ class PostGroupApi(DecoratedMethodView):
                 summary=MarkdownTruncator.get_smart_preview(content),
                 type=post_type,
                 has_image=bool(images),  # 如果有图片则设置has_image为True
-                author=current_user,
+                author_id=current_user.id,
             )
             db.session.add(post)
             db.session.flush()
@@ -173,6 +234,7 @@ class PostGroupApi(DecoratedMethodView):
                 ]
                 db.session.add_all(images)
             db.session.commit()
+            fan_out_post.delay(post.id, current_user.id)
             PostGroupApi.new_post_notification(post.id)
             logging.info(f"创建新文章: user_id={current_user.id}, post_id={post.id}")
         except Exception as e:
@@ -198,14 +260,32 @@ class PostGroupApi(DecoratedMethodView):
                 PostGroupApi.submit_to_db(PostType.MARKDOWN, content, images)
 
     def get(self):
-        """获取所有文章"""
-        page = request.args.get("page", 1, type=int)
+        """获取所有文章
+
+        传入 cursor 参数（第一页传空字符串）时使用游标分页，返回 next_cursor；
+        with_total=true 时附带缓存的总数
+        """
         per_page = request.args.get(
             "per_page", current_app.config["FLASKY_POSTS_PER_PAGE"], type=int
         )
-        posts, total = PostGroupApi.query_post(
-            page, per_page, request.args.get("tabName")
-        )
+        tab_name = request.args.get("tabName")
+        cursor = request.args.get("cursor")
+        if cursor is not None:
+            posts, next_cursor = PostGroupApi.query_post_by_cursor(
+                cursor, per_page, tab_name
+            )
+            extra = {}
+            if request.args.get("with_total") == "true":
+                key = (
+                    f"posts:followed:{current_user.id}"
+                    if tab_name == "showFollowed"
+                    else "posts"
+                )
+                extra["total"] = cached_count(key, PostGroupApi.feed_query(tab_name))
+            return success(data=posts, next_cursor=next_cursor, **extra)
+
+        page = request.args.get("page", 1, type=int)
+        posts, total = PostGroupApi.query_post(page, per_page, tab_name)
         return success(data=posts, total=total)
 
     def post(self):
@@ -214,7 +294,7 @@ class PostGroupApi(DecoratedMethodView):
             try:
                 PostGroupApi.posts_publish(request.json)
                 # 清除缓存
-                cache.delete_memoized(PostGroupApi.query_post)
+                bump_feeds([ALL_FEED])
             except Exception as e:
                 return error(500, f"{str(e)}")
             posts, total = PostGroupApi.query_post(
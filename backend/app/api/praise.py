@@ -43,7 +43,7 @@ class PraisePostApi(DecoratedMethodView):
         # 获取文章点赞总数
         logging.info(f"获取文章点赞总数: id={post_id}")
         post = Post.query.get_or_404(post_id)
-        return success(data={"praise_total": post.praise.count()})
+        return success(data={"praise_total": post.like_count})
 
     def post(self, post_id):
         """文章点赞"""
@@ -55,7 +55,7 @@ class PraisePostApi(DecoratedMethodView):
             return error(400, "您已经点赞过了~")
 
         try:
-            praise = Praise(post=post, author=current_user)
+            praise = Praise(post=post, author_id=current_user.id)
             db.session.add(praise)
 
             # 异步创建点赞通知
@@ -65,10 +65,8 @@ class PraisePostApi(DecoratedMethodView):
                 )
 
             db.session.commit()
-            # 使用relationship的len()替代count()查询
-            return success(
-                data={"praise_total": post.praise.count(), "has_praised": True}
-            )
+            # 点赞数由计数字段维护，提交后重新读取
+            return success(data={"praise_total": post.like_count, "has_praised": True})
         except Exception as e:
             logging.error(f"文章点赞失败: {str(e)}", exc_info=True)
             db.session.rollback()
@@ -90,7 +88,7 @@ class PraiseCommentApi(DecoratedMethodView):
         """获取评论点赞总数"""
         logging.info(f"获取评论点赞总数: id={comment_id}")
         comment = Comment.query.get_or_404(comment_id)
-        return success(data={"praise_total": comment.praise.count()})
+        return success(data={"praise_total": comment.like_count})
 
     def post(self, comment_id):
         """评论点赞"""
@@ -104,7 +102,7 @@ class PraiseCommentApi(DecoratedMethodView):
             return error(400, "您已经点赞过了~")
 
         try:
-            praise = Praise(comment=comment, author=current_user)
+            praise = Praise(comment=comment, author_id=current_user.id)
             db.session.add(praise)
 
             # 异步创建点赞通知
@@ -115,8 +113,8 @@ class PraiseCommentApi(DecoratedMethodView):
 
             db.session.commit()
 
-            # 使用relationship的len()替代count()查询
-            return success(data={"praise_total": comment.praise.count()})
+            # 点赞数由计数字段维护，提交后重新读取
+            return success(data={"praise_total": comment.like_count})
         except Exception as e:
             logging.error(f"评论点赞失败: {str(e)}", exc_info=True)
             db.session.rollback()
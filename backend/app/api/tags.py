@@ -6,7 +6,7 @@ from flask_jwt_extended import current_user, jwt_required
 
 from .. import db
 from ..decorators import DecoratedMethodView, admin_required
-from ..models import Tag
+from ..models import Tag, User
 from ..utils.response import error, success
 
 
@@ -38,6 +38,7 @@ class TagUserApi(DecoratedMethodView):
             if tag:
                 current_user.tags.remove(tag)
         db.session.commit()
+        User.invalidate_profile(current_user.id)
         return success(message="用户标签更新成功")
 
 
@@ -10,7 +10,7 @@ from qiniu import Auth, BucketManager, build_batch_delete
 from sqlalchemy import and_
 
 from .. import db
-from ..models import Image, ImageType
+from ..models import Image, ImageType, User
 from ..utils.common import get_avatars_url
 from ..utils.response import bad_request, success
 from . import api
@@ -172,5 +172,6 @@ def upload_favorite_book_image(user_id):
     if images:
         db.session.add_all(images)
         db.session.commit()
+    User.invalidate_profile(user_id)
     d = [image.to_json() for image in images]
     return success(data=d)
@@ -7,6 +7,7 @@ from .. import db
 from ..api.upload import get_random_user_avatars
 from ..decorators import admin_required
 from ..models import User
+from ..mycelery.notification_task import revoke_user_sockets
 from ..mycelery.tasks import send_email
 from ..schemas import (
     BindEmailRequest,
@@ -144,6 +145,7 @@ def change_password(validated_data):
     if current_user.verify_password(validated_data.old_password):
         current_user.password = validated_data.new_password
         db.session.commit()
+        revoke_user_sockets.delay(current_user.id)
         return success()
     return error(message="原密码错误")
 
@@ -162,6 +164,7 @@ def reset_password(validated_data):
             return error(message="此邮箱尚未绑定")
         user.password = password
         db.session.commit()
+        revoke_user_sockets.delay(user.id)
         return success()
     return error(message="验证码错误")
 
@@ -176,5 +179,6 @@ def change_password_admin():
     if user:
         user.password = new_password
         db.session.commit()
+        revoke_user_sockets.delay(user.id)
         return success()
     return error(message="用户不存在")
@@ -1,12 +1,8 @@
-import logging
-import time
 from functools import wraps
 
 from flask import abort, request
 from flask.views import MethodView
 from flask_jwt_extended import current_user
-from flask_sqlalchemy import record_queries
-from user_agents import parse
 
 from .models import Permission
 from .mycelery.log_task import log_visitor
@@ -52,77 +48,23 @@ def admin_required(f):
 
 def log_operate(f):
     def decorate(*args, **kwargs):
-        if request.args.get("page", 1, type=int) != 1:
+        # 只记录首页访问（页码分页的第1页或游标分页的第一页）
+        if request.args.get("page", 1, type=int) != 1 or request.args.get("cursor"):
             return f(*args, **kwargs)
 
-        if "X-Forwarded-For" in request.headers:
-            client_ip = request.headers.get("X-Forwarded-For")
-        else:
-            client_ip = request.remote_addr
-
-        user_agent = request.headers.get("user-agent")
-        if user_agent:
-            u = parse(user_agent)
-            ua = {
-                "browser": u.browser.family,
-                "browser_version": u.browser.version_string,
-                "os": u.os.family,
-                "os_version": u.os.version_string,
-                "device": u.device.family,
-            }
-        else:
-            ua = {
-                "browser": "",
-                "browser_version": "",
-                "os": "",
-                "os_version": "",
-                "device": "",
-            }
+        # ProxyFix 已按信任的代理层数取得客户端地址，不直接读取可伪造的 X-Forwarded-For
+        client_ip = request.remote_addr
+
         is_register = True if current_user else False
-        ua.update(
-            {
-                "username": current_user.username if is_register else "游客",
-                "operate": "访问首页",
-            }
+        visitor = {
+            "username": current_user.username if is_register else "游客",
+            "operate": "访问首页",
+        }
+
+        # 记录用户，user-agent 在入库时解析
+        log_visitor(
+            is_register, client_ip, visitor, request.headers.get("user-agent", "")
         )
-
-        # 记录用户
-        log_visitor.delay(is_register, client_ip, ua)
         return f(*args, **kwargs)
 
     return decorate
-
-
-def sql_profile(func):
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        # 记录开始时间
-        start_time = time.time()
-
-        # 执行函数
-        result = func(*args, **kwargs)
-
-        # 拿到 SQL 执行记录
-        queries = record_queries.get_recorded_queries()
-
-        total_sql = len(queries)
-        total_sql_time = sum(q.duration for q in queries)  # 秒
-
-        # 函数名称
-        func_name = func.__name__
-
-        logging.info("\n===== SQL STATISTICS =====")
-        logging.info(f"Function     : {func_name}")
-        logging.info(f"Total SQL    : {total_sql}")
-        logging.info(f"SQL Time     : {total_sql_time:.2f} sec")
-        logging.info(f"Total Time   : {time.time() - start_time:.2f} sec\n")
-
-        for idx, q in enumerate(queries, start=1):
-            logging.info(
-                f"\n[{idx}] ({q.duration:.6f}s) \n{q.statement} \nParams: {q.parameters} \n{'-' * 60}"
-            )
-        logging.info("==========================\n")
-
-        return result
-
-    return wrapper
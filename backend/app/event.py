@@ -1,24 +1,49 @@
 import logging
+import os
+import socket
 
 import eventlet
 from flask import request
 from flask_jwt_extended import decode_token
-from flask_socketio import ConnectionRefusedError, join_room
+from flask_socketio import ConnectionRefusedError, disconnect, join_room
 
 from . import db, redis
-from .models import Message, Notification, NotificationType, User
-from .mycelery.notification_task import create_chat_notifications
-from .websocket import init_ws_services
+from .metrics import count_event
+from .models import Conversation, Notification, NotificationType, User
+from .websocket import OfflineDeliveryService, SocketSession, init_ws_services
+from .websocket.message_writer import MessageWriter
 
-connection, presence, conversation = init_ws_services(redis)
+connection, presence, conversation, sessions = init_ws_services(redis)
+delivery = OfflineDeliveryService(redis)
 
 
 # 封装为注册函数
 def register_ws_events(socketio, app):
     """注册WS事件，绑定传入的socketio实例和app上下文"""
+    # 每个 websocket 进程是一个 worker，跨进程推送经由消息队列
+    connection.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+    def worker_heartbeat():
+        interval = app.config["WS_WORKER_HEARTBEAT"]
+        while True:
+            try:
+                connection.heartbeat()
+            except Exception as e:
+                logging.error(f"worker心跳失败: {str(e)}", exc_info=True)
+            eventlet.sleep(interval)
+
+    eventlet.spawn(worker_heartbeat)
+
+    def on(event_name):
+        """注册事件处理，并统计事件数"""
+
+        def decorator(handler):
+            return socketio.on(event_name)(count_event(event_name)(handler))
+
+        return decorator
 
     def verify_token_in_websocket():
-        """连接websocket时验证用户身份"""
+        """连接websocket时验证用户身份，只在连接时解析 token、查询用户"""
         try:
             token = request.args.get("token")
             if not token:
@@ -27,34 +52,67 @@ def register_ws_events(socketio, app):
 
             raw_token = token.replace("Bearer ", "", 1)
             decoded_token = decode_token(raw_token)
-            user_id = decoded_token["sub"]
+            user_id = int(decoded_token["sub"])
             logging.info(f"WebSocket连接token验证成功，用户ID: {user_id}")
+        except ConnectionRefusedError:
+            raise
         except Exception as e:
             logging.error(f"WebSocket身份验证失败: {str(e)}", exc_info=True)
             raise ConnectionRefusedError("WebSocket身份验证失败，token解析错误")
 
-        # 检查用户是否存在（DB操作，后续异步场景需绑定上下文）
-        user = User.query.get(user_id)
-        if not user:
+        username = db.session.scalar(db.select(User.username).where(User.id == user_id))
+        if username is None:
             logging.warning(f"WebSocket连接失败: 用户ID {user_id} 不存在")
             raise ConnectionRefusedError("WebSocket身份验证失败，用户不存在")
 
-        return user.username, user.id
+        session = SocketSession(
+            user_id=user_id,
+            username=username,
+            issued_at=decoded_token.get("iat", 0),
+            expires_at=decoded_token.get("exp"),
+        )
+        if sessions.is_revoked(session):
+            logging.warning(f"WebSocket连接失败: 用户ID {user_id} 的token已吊销")
+            raise ConnectionRefusedError("WebSocket身份验证失败，token已失效")
+        return session
+
+    def current_session():
+        """读取连接建立时保存的身份，token 过期时强制断开"""
+        session = sessions.get(request.sid)
+        if session is None:
+            logging.warning(f"WebSocket连接 {request.sid} 身份已失效，强制断开")
+            disconnect()
+        return session
 
     # 连接事件
     @socketio.on("connect")
     def handle_connect():
-        username, user_id = verify_token_in_websocket()
+        session = verify_token_in_websocket()
+        sessions.open(request.sid, session)
         # 内存操作同步执行（无阻塞）
-        connection.bind_socket_to_user(user_id, request.sid)
-        presence.mark_user_online(user_id)
-        join_room(str(user_id))
-        logging.info(f"用户 {username} 已连接，新连接ID：{request.sid}")
+        connection.bind_socket_to_user(session.user_id, request.sid)
+        presence.mark_user_online(session.user_id)
+        join_room(str(session.user_id))
+        logging.info(f"用户 {session.username} 已连接，新连接ID：{request.sid}")
+
+        # 补发离线期间收到的消息，客户端通过 messages_delivered 确认
+        pending = delivery.pending(session.user_id)
+        if pending:
+            socketio.emit("missed_messages", {"messages": pending}, room=request.sid)
+            logging.info(f"向用户 {session.username} 补发离线消息 {len(pending)} 条")
+
+    @on("messages_delivered")
+    def handle_messages_delivered(data):
+        """客户端确认已收到补发的离线消息"""
+        session = current_session()
+        if not session:
+            return
+        delivery.ack(session.user_id, str(data.get("deliveryId", "")))
 
     # 断开事件：纯内存操作，同步执行
     @socketio.on("disconnect")
     def handle_disconnect():
-        username, user_id = verify_token_in_websocket()
+        session = sessions.close(request.sid)
 
         user_id = connection.unbind_socket(request.sid)
         if not user_id:
@@ -64,26 +122,24 @@ def register_ws_events(socketio, app):
         if not connection.get_bound_sockets(user_id):
             presence.mark_user_offline(user_id)
 
-        logging.info(f"用户 {username} 已断开连接")
+        logging.info(f"用户 {session.username if session else user_id} 已断开连接")
 
     # 心跳事件：纯内存操作，同步执行
-    @socketio.on("heartbeat")
+    @on("heartbeat")
     def handle_heartbeat():
-        username, user_id = verify_token_in_websocket()
-        presence.update_last_active(user_id)
-        logging.info(f"用户 {username} 发送心跳包")
+        session = current_session()
+        if not session:
+            return
+        presence.update_last_active(session.user_id)
+        logging.info(f"用户 {session.username} 发送心跳包")
 
     # 进入聊天事件-异步DB操作（标记已读）
     def async_enter_chat(user_id, target_id):
         """异步处理进入聊天的DB操作（标记已读）"""
         with app.app_context():  # 绑定WS应用上下文
             try:
-                # 标记消息已读
-                updated_messages = Message.query.filter(
-                    Message.receiver_id == user_id,
-                    Message.sender_id == target_id,
-                    Message.is_read.is_(False),
-                ).update({"is_read": True}, synchronize_session="fetch")
+                # 标记消息已读，同时清零会话未读数
+                updated_messages = Conversation.mark_read(user_id, target_id)
                 logging.info(f"已将 {updated_messages} 条消息标记为已读")
 
                 # 标记通知已读
@@ -103,9 +159,12 @@ def register_ws_events(socketio, app):
                 db.session.rollback()  # 事务回滚
                 logging.error(f"更新消息和通知状态失败: {str(e)}", exc_info=True)
 
-    @socketio.on("enter_chat")
+    @on("enter_chat")
     def handle_enter_chat(data):
-        username, user_id = verify_token_in_websocket()
+        session = current_session()
+        if not session:
+            return
+        username, user_id = session.username, session.user_id
         target_id = data["targetId"]
 
         # 内存操作同步执行
@@ -118,66 +177,69 @@ def register_ws_events(socketio, app):
         eventlet.spawn_n(async_enter_chat, user_id, target_id)
 
     # 输入状态事件
-    @socketio.on("chat:typing")
+    def watch_typing(user_id, username, target_id):
+        """输入状态过期后通知对方停止输入，期间有新输入则顺延"""
+        ttl = conversation.typing_ttl(user_id, target_id)
+        if ttl > 0:
+            eventlet.spawn_after(ttl, watch_typing, user_id, username, target_id)
+            return
+        socketio.emit(
+            "chat:typing",
+            {"sender_id": user_id, "sender_name": username, "typing": False},
+            room=str(target_id),
+        )
+
+    @on("chat:typing")
     def handle_typing(data):
-        """处理用户正在输入事件"""
-        username, user_id = verify_token_in_websocket()
+        """处理用户正在输入事件，只在开始输入、停止输入时通知对方"""
+        session = current_session()
+        if not session:
+            return
+        username, user_id = session.username, session.user_id
         target_id = data.get("target_id")
 
-        if target_id:
-            # 标记用户正在输入
-            conversation.mark_typing(user_id, target_id)
-            logging.info(f"用户 {username} 正在给用户 {target_id} 输入")
+        # 连续输入只刷新过期时间
+        if target_id and conversation.mark_typing(user_id, target_id):
+            logging.info(f"用户 {username} 开始给用户 {target_id} 输入")
 
             # 向目标用户发送typing事件
             socketio.emit(
                 "chat:typing",
-                {"sender_id": user_id, "sender_name": username},
+                {"sender_id": user_id, "sender_name": username, "typing": True},
                 room=str(target_id),
             )
+            eventlet.spawn_after(
+                conversation.TYPING_TTL, watch_typing, user_id, username, target_id
+            )
 
-    # 发送消息事件-异步DB操作（消息入库+通知）
-    def async_send_message(sender_id, receiver_id, content, sid):
-        """异步处理发送消息的DB操作"""
-        with app.app_context():
-            msg = Message(sender_id=sender_id, receiver_id=receiver_id, content=content)
-            db.session.add(msg)
-            db.session.flush()
-
-            try:
-                receiver_presence = presence.get_user_presence(receiver_id)
-                active_chat = conversation.get_active_chat(receiver_id)
-                logging.info(
-                    f"接收者 {receiver_id} 状态: {receiver_presence}, 活跃聊天: {active_chat}"
-                )
-
-                if active_chat == sender_id:
-                    logging.info(f"用户 {receiver_id} 当前正在与发送者 {sender_id} 聊天")
-                    msg.is_read = True
-                    socketio.emit("new_message", msg.to_json(), to=str(receiver_id))
-                else:
-                    # 异步生成通知（Celery任务）
-                    create_chat_notifications.delay(receiver_id, sender_id, msg.id)
-                    if presence.is_user_online(receiver_id):
-                        logging.info(f"用户 {receiver_id} 在线但不在聊天页面，消息已保存")
-                    else:
-                        logging.info(f"用户 {receiver_id} 离线，消息已保存")
+    # 发送消息事件：放入写入队列，由写入协程批量入库
+    writer = MessageWriter(app, socketio, conversation, connection, delivery)
+    writer.start()
 
-                db.session.commit()
-                socketio.emit("message_sent", msg.to_json(), room=sid)
-                logging.info(f"消息 ID:{msg.id} 发送成功")
-            except Exception as e:
-                db.session.rollback()  # 事务回滚
-                logging.error(f"消息发送失败: {str(e)}", exc_info=True)
-
-    @socketio.on("send_message")
+    @on("send_message")
     def handle_send_message(data):
-        username, sender_id = verify_token_in_websocket()
+        session = current_session()
+        if not session:
+            return
+        username, sender_id = session.username, session.user_id
         receiver_id = data["receiver_id"]
         content = data["content"]
+        client_id = data.get("client_id")
+        # 消息发出即停止输入
+        conversation.clear_typing(sender_id, receiver_id)
         logging.info(f"用户 {username} 发送消息给用户 {receiver_id}: {content[:20]}...")
 
-        # DB操作异步执行
-        eventlet.spawn_n(
-            async_send_message, sender_id, receiver_id, content, request.sid
+        uuid = writer.submit(sender_id, receiver_id, content, request.sid, client_id)
+        if uuid is None:
+            logging.warning(f"消息写入队列已满，拒绝用户 {username} 的消息")
+            socketio.emit(
+                "message_failed",
+                {"reason": "busy", "client_id": client_id},
+                room=request.sid,
+            )
+            return
+        socketio.emit(
+            "message_accepted",
+            {"uuid": uuid, "client_id": client_id, "worker": connection.worker_id},
+            room=request.sid,
         )
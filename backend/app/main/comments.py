@@ -11,7 +11,7 @@ from ..models import Comment, NotificationType, Permission, Post
 from ..mycelery.notification_task import create_comment_notifications
 from ..utils.common import get_avatars_url
 from ..utils.response import error, success
-from ..utils.text_filter import DFAFilter
+from ..utils.text_filter import get_keyword_filter
 from ..utils.time_util import DateUtils
 from . import main
 
@@ -47,9 +47,9 @@ def post(id):
             )
         # 创建评论（设置两个父级关系）
         comment = Comment(
-            body=DFAFilter().filter(data.get("body"), "*"),
+            body=get_keyword_filter().filter(data.get("body"), "*"),
             post=post,
-            author=current_user,
+            author_id=current_user.id,
             direct_parent=direct_parent,
             root_comment=root_comment,
         )
@@ -7,6 +7,7 @@ from flask_jwt_extended import current_user, jwt_required
 from .. import db
 from ..decorators import permission_required
 from ..models import Follow, Permission, User
+from ..timeline import timeline
 from ..utils.common import get_avatars_url
 from ..utils.response import error, not_found, success
 from ..utils.time_util import DateUtils
@@ -29,6 +30,7 @@ def follow(username):
     try:
         current_user.follow(user)
         db.session.commit()
+        timeline.on_follow(current_user.id, user.id)
         return success(data=user.to_json())
     except Exception as e:
         logging.error(f"关注用户失败: {str(e)}", exc_info=True)
@@ -51,6 +53,7 @@ def unfollow(username):
     try:
         current_user.unfollow(user)
         db.session.commit()
+        timeline.on_unfollow(current_user.id, user.id)
         return success(data=user.to_json())
     except Exception as e:
         logging.error(f"取消关注用户失败: {str(e)}", exc_info=True)
@@ -89,7 +92,7 @@ def followers(username):
                     "is_following": is_following_back,
                 }
             )
-    return success(data=follows, total=user.followers.count() - 1)
+    return success(data=follows, total=user.followers_count)
 
 
 @main.route("/followed_by/<username>")
@@ -123,4 +126,4 @@ def followed_by(username):
                     "is_following_back": is_following_back,
                 }
             )
-    return success(data=follows, total=user.followed.count() - 1)
+    return success(data=follows, total=user.followed_count)
@@ -5,7 +5,7 @@ from flask import current_app, request
 from flask_jwt_extended import current_user, jwt_required
 
 from .. import db
-from ..models import Message
+from ..models import Conversation, Message
 from ..utils.response import success
 from . import main
 
@@ -17,18 +17,12 @@ def get_message_history():
     """获取聊天历史记录"""
     logging.info(f"获取聊天历史: user_id={current_user.id}")
     current_user_id = current_user.id
-    other_user_id = request.args.get("userId")
+    other_user_id = request.args.get("userId", 0, type=int)
     page = request.args.get("page", 1, type=int)
     query = Message.query.filter(
-        (
-            (Message.sender_id == current_user_id)
-            & (Message.receiver_id == other_user_id)
-        )
-        | (
-            (Message.sender_id == other_user_id)
-            & (Message.receiver_id == current_user_id)
-        )
-    ).order_by(Message.timestamp.desc())
+        Message.conversation_id
+        == Message.conversation_key(current_user_id, other_user_id)
+    ).order_by(Message.id.desc())
     pagination = query.paginate(
         page=page, per_page=current_app.config["FLASKY_CHAT_PER_PAGE"], error_out=False
     )
@@ -49,8 +43,12 @@ def mark_messages_read():
     """标记消息为已读"""
     logging.info(f"标记消息已读: user_id={current_user.id}")
     message_ids = request.json.get("ids", [])
-    Message.query.filter(
-        Message.id.in_(message_ids), Message.receiver_id == current_user.id
-    ).update({"is_read": True}, synchronize_session=False)
+    sender_ids = db.session.scalars(
+        db.select(Message.sender_id)
+        .where(Message.id.in_(message_ids), Message.receiver_id == current_user.id)
+        .distinct()
+    ).all()
+    for sender_id in sender_ids:
+        Conversation.mark_read(current_user.id, sender_id, message_ids)
     db.session.commit()
     return success(message="消息已标记为已读")
@@ -28,7 +28,7 @@ def get_currentUsernotification():
             )
         )
         .filter_by(receiver_id=current_user.id)
-        .order_by(Notification.created_at.desc())
+        .order_by(Notification.updated_at.desc(), Notification.id.desc())
         .all()
     )
     return success(data=[item.to_json() for item in notifications])
@@ -8,6 +8,9 @@ from sqlalchemy.orm import joinedload
 from .. import db, limiter
 from ..models import Image, ImageType, Permission, Post, PostType, User
 from ..mycelery.notification_task import create_new_post_notifications
+from ..mycelery.timeline_task import fan_out_post
+from ..utils.feed_cache import ALL_FEED, bump_feeds
+from ..utils.markdown_truncate import MarkdownTruncator
 from ..utils.response import error, forbidden, not_found, success
 from . import main
 
@@ -33,7 +36,7 @@ def index():
                 content=j.get("content"),
                 type=post_type_enum,
                 has_image=bool(images),  # 如果有图片则设置has_image为True
-                author=current_user,
+                author_id=current_user.id,
             )
             db.session.add(post)
             db.session.flush()
@@ -49,17 +52,12 @@ def index():
                 ]
                 db.session.add_all(images)
             db.session.commit()
+            # 最新文章页缓存失效
+            bump_feeds([ALL_FEED])
 
             # 异步创建新文章通知
-            from ..models import Follow
-
-            followers = (
-                Follow.query.filter_by(followed_id=current_user.id)
-                .filter(Follow.follower_id != current_user.id)
-                .all()
-            )
-            follower_ids = [follow.follower_id for follow in followers]
-            create_new_post_notifications.delay(post.id, current_user.id, follower_ids)
+            create_new_post_notifications.delay(post.id, current_user.id)
+            fan_out_post.delay(post.id, current_user.id)
 
             logging.info(f"创建新文章: user_id={current_user.id}, post_id={post.id}")
         except Exception as e:
@@ -142,7 +140,10 @@ def edit(id):
         # 对表单编辑业务逻辑
         j = request.get_json()
         post.content = j.get("content", post.content)
+        if "content" in j:
+            post.summary = MarkdownTruncator.get_smart_preview(post.content)
         db.session.commit()
+        Post.invalidate_cards([post.id])
         return success(message="文章编辑成功")
     except Exception as e:
         logging.error(f"编辑文章失败: {str(e)}", exc_info=True)
@@ -162,7 +163,7 @@ def create_post():
         content=content,
         type=PostType.MARKDOWN,
         has_image=bool(image_urls),
-        author=current_user,
+        author_id=current_user.id,
     )
     db.session.flush()
     images = [
@@ -170,6 +171,7 @@ def create_post():
     ]
     db.session.add_all(images)
     db.session.commit()
+    bump_feeds([ALL_FEED])
 
     posts_json = Post.batch_query_with_data([p])
 
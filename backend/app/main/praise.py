@@ -27,7 +27,7 @@ def praise(id):
             return error(400, "您已经点赞过了~")
 
         try:
-            praise = Praise(post=post, author=current_user)
+            praise = Praise(post=post, author_id=current_user.id)
             db.session.add(praise)
             db.session.commit()
 
@@ -37,15 +37,13 @@ def praise(id):
                     post.id, None, current_user.id, post.author_id
                 )
 
-            return success(
-                data={"praise_total": post.praise.count(), "has_praised": True}
-            )
+            return success(data={"praise_total": post.like_count, "has_praised": True})
         except Exception as e:
             logging.error(f"文章点赞失败: {str(e)}", exc_info=True)
             db.session.rollback()
             return error(500, f"操作失败，已回滚: {str(e)}")
 
-    return success(data={"praise_total": post.praise.count()})
+    return success(data={"praise_total": post.like_count})
 
 
 @main.route("/praise/comment/<int:id>", methods=["GET", "POST"])
@@ -59,7 +57,7 @@ def praise_comment(id):
         verify_jwt_in_request()
 
         try:
-            praise = Praise(comment=comment, author=current_user)
+            praise = Praise(comment=comment, author_id=current_user.id)
             db.session.add(praise)
             db.session.commit()
 
@@ -69,13 +67,13 @@ def praise_comment(id):
                     comment.post_id, comment.id, current_user.id, comment.author_id
                 )
 
-            return success(data={"praise_total": comment.praise.count()})
+            return success(data={"praise_total": comment.like_count})
         except Exception as e:
             logging.error(f"评论点赞失败: {str(e)}", exc_info=True)
             db.session.rollback()
             return error(500, f"点赞操作失败，已回滚: {str(e)}")
 
-    return success(data={"praise_total": comment.praise.count()})
+    return success(data={"praise_total": comment.like_count})
 
 
 @main.route("/has_praised/<int:post_id>")
@@ -6,7 +6,7 @@ from flask_jwt_extended import current_user, jwt_required
 
 from .. import db
 from ..decorators import admin_required
-from ..models import Tag
+from ..models import Tag, User
 from ..utils.response import success
 from . import main
 
@@ -43,6 +43,7 @@ def edit_user_tag():
         if tag:
             current_user.tags.remove(tag)
     db.session.commit()
+    User.invalidate_profile(current_user.id)
     return success(message="用户标签更新成功")
 
 
@@ -10,7 +10,7 @@ from sqlalchemy import and_
 
 from .. import db
 from ..api.upload import dir_file_name
-from ..models import Image, ImageType
+from ..models import Image, ImageType, User
 from ..utils.response import bad_request, success
 from . import main
 
@@ -131,5 +131,6 @@ def upload_favorite_book_image(user_id):
     if images:
         db.session.add_all(images)
         db.session.commit()
+    User.invalidate_profile(user_id)
     d = [image.to_json() for image in images]
     return success(data=d)
@@ -53,6 +53,7 @@ def edit_profile_admin(id):
         user.about_me = user_info.get("about_me")
 
         db.session.commit()
+        User.invalidate_profile(user.id)
         return success(message="用户资料更新成功")
     except Exception as e:
         logging.error(f"管理员编辑用户资料失败: {str(e)}", exc_info=True)
@@ -111,7 +112,7 @@ def generate_user_posts():
 def online():
     """获取在线用户信息"""
     logging.info("获取在线用户信息")
-    _, presence, _ = init_ws_services(redis)
+    _, presence, _, _ = init_ws_services(redis)
     # 在线人数信息
     user_ids = presence.list_online_users()
     online_users = User.query.filter(User.id.in_(user_ids)).all()
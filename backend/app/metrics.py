@@ -0,0 +1,259 @@
+"""
+Prometheus 指标
+
+gunicorn 多进程、Celery、websocket 进程各自记录，设置环境变量
+PROMETHEUS_MULTIPROC_DIR 后写入该目录下的共享文件，由 /metrics 汇总；
+Celery 队列长度、websocket 连接数等全局状态在抓取时从 Redis 读取；
+/metrics 只允许 METRICS_ALLOWED_NETWORKS 内的地址访问
+"""
+
+import ipaddress
+import os
+import time
+from functools import wraps
+
+from celery.signals import task_postrun, task_prerun
+from flask import Response, abort, current_app, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+from redis import Redis, StrictRedis
+from redis.client import Pipeline
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP 请求耗时",
+    ["method", "blueprint", "endpoint", "status"],
+)
+DB_POOL_CHECKOUTS = Counter("db_pool_checkouts_total", "从连接池取出连接的次数")
+DB_POOL_OVERFLOW_CHECKOUTS = Counter(
+    "db_pool_overflow_checkouts_total", "连接池已满、使用溢出连接的次数"
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out", "正在使用的连接数", multiprocess_mode="livesum"
+)
+DB_POOL_WAIT = Histogram(
+    "db_pool_checkout_seconds",
+    "取得连接的耗时，包括等待空闲连接和新建连接",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+REDIS_COMMAND_DURATION = Histogram(
+    "redis_command_duration_seconds",
+    "Redis 命令耗时，管道整体记为 PIPELINE",
+    ["command"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1),
+)
+CELERY_TASK_DURATION = Histogram(
+    "celery_task_duration_seconds",
+    "Celery 任务耗时",
+    ["task", "state"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300),
+)
+SOCKETIO_EVENTS = Counter("socketio_events_total", "收到的 Socket.IO 事件数", ["event"])
+
+
+# ---------- HTTP ----------
+
+
+def _start_timer():
+    g.metrics_start = time.perf_counter()
+
+
+def _observe_request(response):
+    start = g.pop("metrics_start", None)
+    if start is not None:
+        HTTP_REQUEST_DURATION.labels(
+            request.method,
+            request.blueprint or "",
+            request.endpoint or "unknown",
+            response.status_code,
+        ).observe(time.perf_counter() - start)
+    return response
+
+
+# ---------- 数据库连接池 ----------
+
+
+class InstrumentedQueuePool(QueuePool):
+    """记录取得连接的耗时和溢出连接的使用次数"""
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - start)
+            if self.overflow() > 0:
+                DB_POOL_OVERFLOW_CHECKOUTS.inc()
+
+
+@event.listens_for(InstrumentedQueuePool, "checkout")
+def _pool_checkout(dbapi_connection, connection_record, connection_proxy):
+    DB_POOL_CHECKOUTS.inc()
+    DB_POOL_CHECKED_OUT.inc()
+
+
+@event.listens_for(InstrumentedQueuePool, "checkin")
+def _pool_checkin(dbapi_connection, connection_record):
+    DB_POOL_CHECKED_OUT.dec()
+
+
+# ---------- Redis ----------
+
+
+class InstrumentedPipeline(Pipeline):
+    def execute(self, raise_on_error=True):
+        start = time.perf_counter()
+        try:
+            return super().execute(raise_on_error)
+        finally:
+            REDIS_COMMAND_DURATION.labels("PIPELINE").observe(
+                time.perf_counter() - start
+            )
+
+
+class InstrumentedRedis(StrictRedis):
+    """记录每条命令耗时的 Redis 客户端，作为 FlaskRedis 的 provider"""
+
+    def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            return super().execute_command(*args, **options)
+        finally:
+            REDIS_COMMAND_DURATION.labels(str(args[0]).upper()).observe(
+                time.perf_counter() - start
+            )
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return InstrumentedPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint
+        )
+
+
+# ---------- Celery ----------
+
+_task_started = {}
+
+
+@task_prerun.connect
+def _task_prerun(task_id=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def _task_postrun(task_id=None, task=None, state=None, **kwargs):
+    start = _task_started.pop(task_id, None)
+    if start is not None and task is not None:
+        CELERY_TASK_DURATION.labels(task.name, state or "UNKNOWN").observe(
+            time.perf_counter() - start
+        )
+
+
+# ---------- Socket.IO ----------
+
+
+def count_event(event_name):
+    """统计 Socket.IO 事件处理次数"""
+
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(*args):
+            SOCKETIO_EVENTS.labels(event_name).inc()
+            return handler(*args)
+
+        return wrapper
+
+    return decorator
+
+
+# ---------- /metrics ----------
+
+
+class RedisStateCollector:
+    """抓取时从 Redis 读取的全局状态"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def collect(self):
+        from . import redis
+        from .websocket import WSConnectionManager
+
+        celery_app = self.app.extensions["celery"]
+        queue = celery_app.conf.task_default_queue
+        broker = Redis.from_url(celery_app.conf.broker_url)
+        try:
+            length = broker.llen(queue)
+        finally:
+            broker.close()
+        queue_length = GaugeMetricFamily(
+            "celery_queue_length", "Celery 队列中等待执行的任务数", labels=["queue"]
+        )
+        queue_length.add_metric([queue], length)
+        yield queue_length
+
+        sockets = GaugeMetricFamily(
+            "socketio_connected_sockets",
+            "各 websocket worker 的连接数",
+            labels=["worker"],
+        )
+        counts = WSConnectionManager(redis).worker_socket_counts(
+            self.app.config["WS_WORKER_TIMEOUT"]
+        )
+        for worker_id, count in counts.items():
+            sockets.add_metric([worker_id], count)
+        yield sockets
+
+
+def _allowed(remote_addr):
+    """ProxyFix 已取得真实客户端地址，经反向代理转发的外部请求不在内网网段内"""
+    try:
+        address = ipaddress.ip_address(remote_addr or "")
+    except ValueError:
+        return False
+    return any(
+        address in ipaddress.ip_network(network)
+        for network in current_app.config["METRICS_ALLOWED_NETWORKS"]
+    )
+
+
+def metrics():
+    if not _allowed(request.remote_addr):
+        abort(403)
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    state = CollectorRegistry()
+    state.register(RedisStateCollector(current_app._get_current_object()))
+    return Response(
+        generate_latest(registry) + generate_latest(state),
+        mimetype=CONTENT_TYPE_LATEST,
+    )
+
+
+def init_pool(app):
+    """使用记录指标的连接池，需在 db.init_app 之前调用"""
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "poolclass": InstrumentedQueuePool,
+        **app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}),
+    }
+
+
+def init_app(app):
+    """替换连接池并注册请求计时和 /metrics，需在 db.init_app 之前调用"""
+    init_pool(app)
+    app.before_request(_start_timer)
+    app.after_request(_observe_request)
+    app.add_url_rule("/metrics", "metrics", metrics)
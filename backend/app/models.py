@@ -1,18 +1,25 @@
 import logging
 import random
 import re
-from datetime import timedelta
+import time
+from collections import Counter
+from datetime import datetime, timedelta
 from enum import Enum
+from uuid import uuid4
 
 from flask import current_app
 from flask_jwt_extended import create_access_token, current_user
-from sqlalchemy import and_, event, func
+from redis.exceptions import ResponseError
+from sqlalchemy import and_, case, event, func, null, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased, joinedload, load_only
 from sqlalchemy.orm.attributes import flag_modified
 from werkzeug.security import check_password_hash, generate_password_hash
 
-from . import db, jwt, redis
+from . import cache, db, jwt, redis
 from .exceptions import ValidationError
 from .utils.common import get_avatars_url
+from .utils.lru_cache import LRUCache
 from .utils.time_util import DateUtils
 
 
@@ -88,6 +95,10 @@ class Role(db.Model):
 
 class Follow(db.Model):
     __tablename__ = "follows"
+    __table_args__ = (
+        # 按被关注者分批遍历粉丝（写扩散、通知），主键以 follower_id 开头用不上
+        db.Index("ix_follows_followed_follower", "followed_id", "follower_id"),
+    )
     # 同时设置follower_id，followed_id为主键，保证同一对用户只能存在一条关系
     # 关注者id
     follower_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
@@ -107,12 +118,28 @@ class NotificationType(Enum):
 
 class Notification(db.Model):
     __tablename__ = "notifications"
+    __table_args__ = (
+        # 统计未读数、按时间列出用户的通知
+        db.Index(
+            "ix_notifications_receiver_read_created",
+            "receiver_id",
+            "is_read",
+            "created_at",
+        ),
+        # 按最近更新时间列出用户的通知
+        db.Index(
+            "ix_notifications_receiver_updated", "receiver_id", "updated_at", "id"
+        ),
+    )
     id = db.Column(db.Integer, primary_key=True)
     # 通知类型
     type = db.Column(db.Enum(NotificationType))
     # 是否已读
     is_read = db.Column(db.Boolean, default=False)
+    # 创建时间，聚合窗口从该时间开始计算，合并时不变
     created_at = db.Column(db.DateTime, default=DateUtils.now_time)
+    # 最近一次合并的时间，列表按该时间排序
+    updated_at = db.Column(db.DateTime, default=DateUtils.now_time)
 
     # 接收者（文章作者）
     receiver_id = db.Column(db.Integer, db.ForeignKey("users.id"))
@@ -126,15 +153,27 @@ class Notification(db.Model):
     comment_id = db.Column(
         db.Integer, db.ForeignKey("comments.id", ondelete="SET NULL"), nullable=True
     )
+    # 聚合通知：参与人数及最近的参与者 [{id, username, nickname, image}]，最新的在前
+    actor_count = db.Column(db.Integer, default=1)
+    latest_actors = db.Column(db.JSON, nullable=True)
+    # 新文章聚合通知包含的文章id，最新的在前
+    post_ids = db.Column(db.JSON, nullable=True)
+    # 聚合窗口内的通知为 {接收者}:{类型}:{文章}:{评论}，窗口结束后置空；
+    # 唯一约束保证同一目标同时只有一条可合并的通知
+    open_key = db.Column(db.String(64), unique=True, index=True, nullable=True)
+
+    # 聚合通知保留的最近参与者数量
+    LATEST_ACTORS_LEN = 3
+    # 新文章聚合通知保留的文章id数量
+    POST_IDS_LEN = 20
 
     def to_json(self):
+        time = self.updated_at or self.created_at
         data = {
             "id": self.id,
             "type": self.type.value,
             "image": get_avatars_url(self.trigger_user.image),
-            "time": self.created_at
-            if isinstance(self.created_at, str)
-            else DateUtils.datetime_to_str(self.created_at),
+            "time": time if isinstance(time, str) else DateUtils.datetime_to_str(time),
             "triggerNickName": self.trigger_user.nickname,
             "triggerUsername": self.trigger_user.username,
             "triggerId": self.trigger_user_id,
@@ -142,9 +181,82 @@ class Notification(db.Model):
             "postId": self.post_id,
             "commentId": self.comment_id,
             "isRead": self.is_read,
+            "actorCount": self.actor_count or 1,
+            "latestActors": self.latest_actors or [],
+            "postIds": self.post_ids or [],
         }
         return data
 
+    @staticmethod
+    def aggregate_key(receiver_id, notification_type, post_id=None, comment_id=None):
+        return (
+            f"{receiver_id}:{notification_type.name}:{post_id or 0}:{comment_id or 0}"
+        )
+
+    @staticmethod
+    def merge_post_id(post_ids, post_id):
+        """新文章聚合通知加入一篇文章，返回最新在前的文章id列表"""
+        post_ids = [item for item in post_ids or [] if item != post_id]
+        return [post_id] + post_ids[: Notification.POST_IDS_LEN - 1]
+
+    @staticmethod
+    def merge_actor(latest_actors, actor_count, actor):
+        """聚合一个新的参与者，actor 为 {id, username, nickname, image}
+
+        参与人数按最近参与者去重，较早参与过的用户再次触发时会重复计数
+
+        Returns:
+            (最近参与者, 参与人数)
+        """
+        latest_actors = latest_actors or []
+        actors = [item for item in latest_actors if item["id"] != actor["id"]]
+        if len(actors) == len(latest_actors):
+            actor_count = (actor_count or 1) + 1
+        return [actor] + actors[: Notification.LATEST_ACTORS_LEN - 1], actor_count
+
+    # 未读数缓存的过期时间（秒），过期后从数据库重新统计，修正可能的误差
+    UNREAD_TTL = 60 * 60 * 24
+
+    @staticmethod
+    def unread_key(user_id):
+        return f"notifications:unread:{user_id}"
+
+    @staticmethod
+    def unread_count(user_id):
+        """用户的未读通知数，优先取 Redis 中的计数"""
+        key = Notification.unread_key(user_id)
+        count = redis.get(key)
+        if count is None:
+            count = Notification.query.filter_by(
+                receiver_id=user_id, is_read=False
+            ).count()
+            redis.set(key, count, ex=Notification.UNREAD_TTL)
+        return max(int(count), 0)
+
+    @staticmethod
+    def adjust_unread(deltas):
+        """调整未读计数
+
+        Args:
+            deltas: {user_id: 变化量}，只调整已缓存的计数，未缓存的下次读取时统计
+        """
+        deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        pipe = redis.pipeline(transaction=False)
+        for user_id in deltas:
+            pipe.exists(Notification.unread_key(user_id))
+        exists = pipe.execute()
+        for (user_id, delta), exist in zip(deltas.items(), exists):
+            if exist:
+                pipe.incrby(Notification.unread_key(user_id), delta)
+        pipe.execute()
+
+
+# 本进程内各用户最近一次记录活跃时间的时刻（time.monotonic），用于合并重复记录
+_last_ping = {}
+_LAST_PING_MAX_SIZE = 10000
+
 
 class User(db.Model):
     __tablename__ = "users"
@@ -166,6 +278,15 @@ class User(db.Model):
     last_seen = db.Column(db.DateTime(), default=DateUtils.now_time)
     # 用户图像
     image = db.Column(db.String(255))
+    # 计数字段，随文章/点赞/关注写入同步维护，定期由 reconcile_counters 校正
+    # 文章数（含已逻辑删除）
+    post_count = db.Column(db.Integer, default=0)
+    # 粉丝数（不含自己）
+    followers_count = db.Column(db.Integer, default=0)
+    # 关注数（不含自己）
+    followed_count = db.Column(db.Integer, default=0)
+    # 获赞数（文章+评论）
+    praised_count = db.Column(db.Integer, default=0)
     role_id = db.Column(db.Integer, db.ForeignKey("roles.id"))
     social_account = db.Column(
         db.JSON,
@@ -264,10 +385,75 @@ class User(db.Model):
                 self.role = Role.query.filter_by(default=True).first()
         self.follow(self)
 
+    # 最近活跃时间先写入 Redis 哈希 {user_id: unix_timestamp}，由定时任务批量落库
+    LAST_SEEN_KEY = "users:last_seen"
+    LAST_SEEN_FLUSHING_KEY = "users:last_seen:flushing"
+    # 每条 UPDATE 语句更新的用户数
+    LAST_SEEN_FLUSH_BATCH = 500
+
     def ping(self):
-        self.last_seen = DateUtils.now_time()
-        db.session.add(self)
+        """记录最近活跃时间
+
+        同一进程内 LAST_SEEN_TOLERANCE 秒内的重复调用直接忽略，
+        其余写入 Redis，由 flush_last_seen 定时批量更新到数据库
+        """
+        now = time.monotonic()
+        last = _last_ping.get(self.id)
+        if last is not None and now - last < current_app.config["LAST_SEEN_TOLERANCE"]:
+            return
+        if len(_last_ping) >= _LAST_PING_MAX_SIZE:
+            _last_ping.clear()
+        _last_ping[self.id] = now
+        redis.hset(User.LAST_SEEN_KEY, self.id, int(time.time()))
+
+    @staticmethod
+    def _last_seen_from_timestamp(timestamp):
+        """unix时间戳转为与 DateUtils.now_time 一致的上海时间"""
+        return datetime.fromtimestamp(int(timestamp), DateUtils.Shanghai_tz).replace(
+            tzinfo=None
+        )
+
+    @staticmethod
+    def flush_last_seen():
+        """将 Redis 中缓冲的最近活跃时间批量更新到数据库
+
+        先将缓冲重命名为处理中的 key，新的记录写入新的缓冲，互不影响；
+        处理中途失败时 key 保留，下次优先处理
+
+        Returns:
+            更新的用户数
+        """
+        if not redis.exists(User.LAST_SEEN_FLUSHING_KEY):
+            try:
+                redis.rename(User.LAST_SEEN_KEY, User.LAST_SEEN_FLUSHING_KEY)
+            except ResponseError:
+                # 缓冲为空
+                return 0
+
+        pending = redis.hgetall(User.LAST_SEEN_FLUSHING_KEY)
+        items = [
+            (int(user_id), User._last_seen_from_timestamp(timestamp))
+            for user_id, timestamp in pending.items()
+        ]
+        for i in range(0, len(items), User.LAST_SEEN_FLUSH_BATCH):
+            values = dict(items[i : i + User.LAST_SEEN_FLUSH_BATCH])
+            db.session.execute(
+                update(User)
+                .where(User.id.in_(values))
+                .values(last_seen=case(values, value=User.id))
+                .execution_options(synchronize_session=False)
+            )
         db.session.commit()
+        redis.delete(User.LAST_SEEN_FLUSHING_KEY)
+        return len(items)
+
+    @property
+    def current_last_seen(self):
+        """最近活跃时间，优先取 Redis 中尚未落库的记录"""
+        timestamp = redis.hget(User.LAST_SEEN_KEY, self.id)
+        if timestamp:
+            return User._last_seen_from_timestamp(timestamp)
+        return self.last_seen
 
     def can(self, perm):
         return self.role is not None and self.role.has_permission(perm)
@@ -323,6 +509,7 @@ class User(db.Model):
             # 角色设置管理员
             if self.email == current_app.config["FLASKY_ADMIN"]:
                 self.role = Role.query.filter_by(name="Administrator").first()
+                User.invalidate_profile(self.id)
                 logging.info(f"设置用户 {self.username} 为管理员")
             db.session.add(self)
             redis.delete(email)
@@ -380,12 +567,28 @@ class User(db.Model):
         m = Message(sender=self, receiver=user, content=content)
         db.session.add(m)
 
-    def to_json(self):
-        post_praises = Praise.query.join(Post).filter(Post.author_id == self.id).count()
-        comment_praises = (
-            Praise.query.join(Comment).filter(Comment.author_id == self.id).count()
-        )
-        total_praises = post_praises + comment_praises
+    # 资料文档缓存时间（秒），写路径会主动失效，这里只是兜底
+    PROFILE_CACHE_TIMEOUT = 60 * 30
+
+    @staticmethod
+    def profile_cache_key(user_id):
+        return f"user_profile:{user_id}"
+
+    @staticmethod
+    def invalidate_profile(user_id):
+        """用户的兴趣图片、标签、角色变更后调用，清除缓存的资料文档"""
+        cache.delete(User.profile_cache_key(user_id))
+
+    def profile_document(self):
+        """与访问者无关、且不在 users 表上的资料：兴趣图片、标签、角色
+
+        按用户 id 缓存，避免每次读取资料都查询 images、tags、roles 三张表
+        """
+        key = User.profile_cache_key(self.id)
+        document = cache.get(key)
+        if document is not None:
+            return document
+
         interest_images = (
             Image.query.filter(
                 and_(
@@ -397,12 +600,50 @@ class User(db.Model):
             .all()
         )
         interest = {"movies": [], "books": []}
-        if interest_images:
-            for image in interest_images:
-                if image.type == ImageType.MOVIE:
-                    interest["movies"].append(image.to_json())
-                elif image.type == ImageType.BOOK:
-                    interest["books"].append(image.to_json())
+        for image in interest_images:
+            if image.type == ImageType.MOVIE:
+                interest["movies"].append(image.to_json())
+            elif image.type == ImageType.BOOK:
+                interest["books"].append(image.to_json())
+        document = {
+            "admin": self.is_administrator(),
+            "roleId": self.role.id,
+            "interest": interest,
+            "tags": [tag.name for tag in self.tags],
+        }
+        cache.set(key, document, timeout=User.PROFILE_CACHE_TIMEOUT)
+        return document
+
+    def follow_flags(self, user):
+        """一次查询得到双向关注关系
+
+        Returns:
+            (user 是否关注了 self, self 是否关注了 user)
+        """
+        if not user or not user.id:
+            return False, False
+        follower_ids = {
+            follower_id
+            for follower_id, in db.session.query(Follow.follower_id).filter(
+                or_(
+                    and_(Follow.follower_id == user.id, Follow.followed_id == self.id),
+                    and_(Follow.follower_id == self.id, Follow.followed_id == user.id),
+                )
+            )
+        }
+        return user.id in follower_ids, self.id in follower_ids
+
+    def to_json(self):
+        """用户资料
+
+        由三部分组成：
+        - users 表字段和计数字段，直接取自已加载的行
+        - profile_document：缓存的兴趣图片、标签、角色
+        - 当前访问者的关注关系，一次查询
+        """
+        document = self.profile_document()
+        last_seen = self.current_last_seen
+        is_followed_by, is_following = self.follow_flags(current_user)
         json_user = {
             # 后端接口
             # 'url': url_for('api.get_user', id=self.id),
@@ -416,36 +657,32 @@ class User(db.Model):
             "member_since": self.member_since
             if isinstance(self.member_since, str)
             else DateUtils.datetime_to_str(self.member_since),
-            "last_seen": self.last_seen
-            if isinstance(self.last_seen, str)
-            else DateUtils.datetime_to_str(self.last_seen),
+            "last_seen": last_seen
+            if isinstance(last_seen, str)
+            else DateUtils.datetime_to_str(last_seen),
             "image": get_avatars_url(self.image),
-            "admin": self.is_administrator(),
+            "admin": document["admin"],
             "email": self.email,
-            "roleId": self.role.id,
+            "roleId": document["roleId"],
             "confirmed": self.confirmed,
             # 'posts_url': url_for('api.get_user_posts', id=self.id),
             # 'followed_posts_url': url_for('api.get_user_followed_posts',
             #                               id=self.id),
-            "post_count": self.posts.count(),
+            "post_count": self.post_count or 0,
             # 粉丝
-            "followers_count": self.followers.count() - 1,
+            "followers_count": self.followers_count or 0,
             # 关注
-            "followed_count": self.followed.count() - 1,
+            "followed_count": self.followed_count or 0,
             # 获赞数量(文章+评论获赞)
-            "praised_count": total_praises,
+            "praised_count": self.praised_count or 0,
             # 是否被当前用户关注
-            "is_followed_by_current_user": self.is_followed_by(current_user)
-            if current_user
-            else False,
+            "is_followed_by_current_user": is_followed_by,
             # 是否关注了当前用户
-            "is_following_current_user": self.is_following(current_user)
-            if current_user
-            else False,
-            "interest": interest,
+            "is_following_current_user": is_following,
+            "interest": document["interest"],
             "social_account": self.social_account,
             "music": self.music,
-            "tags": [tag.name for tag in self.tags],
+            "tags": document["tags"],
         }
         return json_user
 
@@ -466,10 +703,102 @@ def user_identify_lookup(user):
     return user.id
 
 
+class Principal:
+    """JWT 身份对应的轻量用户，作为 current_user
+
+    只包含鉴权和展示常用的字段，按用户 id 缓存在进程内。
+    访问其余属性（关系、方法、未缓存的字段）或对属性赋值时，
+    才加载完整的 User 并代理给它，修改由调用方提交
+    """
+
+    __slots__ = ("_data", "_user")
+
+    # 进程内缓存：{user_id: (版本号, 字段)}
+    _cache = LRUCache(maxsize=4096, ttl=300)
+
+    def __init__(self, data):
+        object.__setattr__(self, "_data", data)
+        object.__setattr__(self, "_user", None)
+
+    @staticmethod
+    def version_key(user_id):
+        return f"principal_version:{user_id}"
+
+    @staticmethod
+    def clear_cache():
+        Principal._cache.clear()
+
+    @staticmethod
+    def bump_version(user_id):
+        """用户名、昵称、头像、角色变更后调用，使各进程缓存的身份失效"""
+        redis.incr(Principal.version_key(user_id))
+
+    @staticmethod
+    def load(user_id):
+        """按 id 加载身份，缓存有效时不查询数据库"""
+        user_id = int(user_id)
+        version = redis.get(Principal.version_key(user_id)) or "0"
+        cached = Principal._cache.get(user_id)
+        if cached is not None and cached[0] == version:
+            return Principal(cached[1])
+
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        data = {
+            "id": user.id,
+            "username": user.username,
+            "nickname": user.nickname,
+            "image": user.image,
+            "role_id": user.role_id,
+            "permissions": user.role.permissions if user.role else 0,
+        }
+        Principal._cache.set(user_id, (version, data))
+        principal = Principal(data)
+        object.__setattr__(principal, "_user", user)
+        return principal
+
+    @property
+    def user(self):
+        """完整的 User，首次访问时加载"""
+        if self._user is None:
+            object.__setattr__(self, "_user", db.session.get(User, self._data["id"]))
+        return self._user
+
+    def __getattr__(self, name):
+        if self._user is None and name in self._data:
+            return self._data[name]
+        return getattr(self.user, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.user, name, value)
+
+    def __eq__(self, other):
+        if isinstance(other, (Principal, User)):
+            return self.id == other.id
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return "<Principal %r>" % self.username
+
+    def can(self, perm):
+        if self._user is not None:
+            return self._user.can(perm)
+        return self._data["permissions"] & perm == perm
+
+    def is_administrator(self):
+        return self.can(Permission.ADMIN)
+
+    def ping(self):
+        User.ping(self)
+
+
 @jwt.user_lookup_loader
 def user_lookup_callback(_jwt_header, jwt_data):
-    identity = jwt_data["sub"]
-    return User.query.filter_by(id=identity).one_or_none()
+    return Principal.load(jwt_data["sub"])
 
 
 class PostType(Enum):
@@ -481,6 +810,10 @@ class PostType(Enum):
 
 class Post(db.Model):
     __tablename__ = "posts"
+    __table_args__ = (
+        # 文章列表按 (timestamp, id) 倒序游标分页
+        db.Index("ix_posts_deleted_timestamp_id", "deleted", "timestamp", "id"),
+    )
     id = db.Column(db.Integer, primary_key=True)
 
     # title = db.Column(db.String(200))
@@ -504,10 +837,10 @@ class Post(db.Model):
     # cover = db.Column(db.String(255))
     # # 浏览量
     # view_count = db.Column(db.Integer, default=0)
-    # # 点赞数
-    # like_count = db.Column(db.Integer, default=0)
-    # # 评论数
-    # comment_count = db.Column(db.Integer, default=0)
+    # 点赞数
+    like_count = db.Column(db.Integer, default=0)
+    # 评论数
+    comment_count = db.Column(db.Integer, default=0)
 
     # 发布时间
     timestamp = db.Column(db.DateTime, index=True, default=DateUtils.now_time)
@@ -625,40 +958,6 @@ class Post(db.Model):
 
         return images_dict
 
-    @staticmethod
-    def _query_comment_counts(post_ids):
-        """
-        批量查询文章评论数量
-        返回文章ID到评论数的映射字典
-        """
-        comments_count_query = (
-            db.session.query(
-                Comment.post_id, func.count(Comment.id).label("comment_count")
-            )
-            .filter(Comment.post_id.in_(post_ids))
-            .group_by(Comment.post_id)
-            .all()
-        )
-
-        return {post_id: count for post_id, count in comments_count_query}
-
-    @staticmethod
-    def _query_praise_counts(post_ids):
-        """
-        批量查询文章点赞数量
-        返回文章ID到点赞数的映射字典
-        """
-        praise_count_query = (
-            db.session.query(
-                Praise.post_id, func.count(Praise.id).label("praise_count")
-            )
-            .filter(Praise.post_id.in_(post_ids))
-            .group_by(Praise.post_id)
-            .all()
-        )
-
-        return {post_id: count for post_id, count in praise_count_query}
-
     @staticmethod
     def _query_user_praised(post_ids):
         """
@@ -678,9 +977,7 @@ class Post(db.Model):
         return {post_id: True for post_id, in user_praised_query}
 
     @staticmethod
-    def _build_extra_data(
-        posts, images_dict, comment_counts, praise_counts, user_praised
-    ):
+    def _build_extra_data(posts, images_dict, user_praised):
         """
         为每篇文章构建预填充的extra_data
         返回文章ID到extra_data的映射字典
@@ -695,8 +992,8 @@ class Post(db.Model):
                     "id": post.author.id,
                 },
                 "images": images_dict.get(post.id, []),
-                "comment_count": comment_counts.get(post.id, 0),
-                "praise_num": praise_counts.get(post.id, 0),
+                "comment_count": post.comment_count or 0,
+                "praise_num": post.like_count or 0,
                 "has_praised": user_praised.get(post.id, False),
             }
 
@@ -719,26 +1016,109 @@ class Post(db.Model):
         # 1. 批量查询图片数据
         images_dict = Post._query_post_images(post_ids)
 
-        # 2. 批量查询评论数量
-        comment_counts = Post._query_comment_counts(post_ids)
-
-        # 3. 批量查询点赞数量
-        praise_counts = Post._query_praise_counts(post_ids)
-
-        # 4. 批量查询用户点赞状态
+        # 2. 批量查询用户点赞状态（评论数、点赞数直接读取计数字段）
         user_praised = Post._query_user_praised(post_ids)
 
-        # 5. 构建extra_data映射
-        extra_data_map = Post._build_extra_data(
-            posts, images_dict, comment_counts, praise_counts, user_praised
-        )
+        # 3. 构建extra_data映射
+        extra_data_map = Post._build_extra_data(posts, images_dict, user_praised)
 
-        # 6. 批量转换为JSON
+        # 4. 批量转换为JSON
         return [
             post.to_json(extra_data=extra_data_map[post.id], is_list=is_list)
             for post in posts
         ]
 
+    # 列表卡片缓存时间（秒），内容、图片、作者资料变更时主动失效
+    CARD_CACHE_TIMEOUT = 60 * 10
+    # 卡片结构变化时递增，使旧格式的缓存失效
+    CARD_VERSION = 1
+
+    @staticmethod
+    def card_cache_key(post_id):
+        return f"post_card:v{Post.CARD_VERSION}:{post_id}"
+
+    @staticmethod
+    def invalidate_cards(post_ids):
+        """清除文章的列表卡片缓存"""
+        if post_ids:
+            cache.delete_many(*[Post.card_cache_key(post_id) for post_id in post_ids])
+
+    @staticmethod
+    def _query_feed_state(post_ids):
+        """
+        一次查询文章的实时计数及当前用户的点赞状态
+        返回文章ID到 (点赞数, 评论数, 是否点赞) 的映射，已删除的文章不包含在内
+        """
+        current_user_id = current_user.id if current_user else None
+        query = db.session.query(
+            Post.id,
+            Post.like_count,
+            Post.comment_count,
+            Praise.id if current_user_id else null(),
+        ).filter(Post.id.in_(post_ids), Post.deleted.is_(False))
+        if current_user_id:
+            query = query.outerjoin(
+                Praise,
+                and_(Praise.post_id == Post.id, Praise.author_id == current_user_id),
+            )
+
+        return {
+            post_id: (like_count or 0, comment_count or 0, praise_id is not None)
+            for post_id, like_count, comment_count, praise_id in query
+        }
+
+    @staticmethod
+    def feed_cards(post_ids):
+        """
+        按id顺序获取文章列表卡片
+        与访问者无关的部分（作者、摘要、图片）按文章id缓存，
+        点赞数、评论数和当前用户的点赞状态每次实时查询后覆盖
+        """
+        if not post_ids:
+            return []
+
+        keys = [Post.card_cache_key(post_id) for post_id in post_ids]
+        cards = dict(zip(post_ids, cache.get_many(*keys)))
+        missing = [post_id for post_id, card in cards.items() if card is None]
+        if missing:
+            posts = (
+                Post.query.options(
+                    joinedload(Post.author).load_only(
+                        User.id, User.username, User.nickname, User.image
+                    )
+                )
+                .filter(Post.id.in_(missing))
+                .all()
+            )
+            images_dict = Post._query_post_images(missing)
+            extra_data_map = Post._build_extra_data(posts, images_dict, {})
+            built = {
+                post.id: post.to_json(extra_data=extra_data_map[post.id], is_list=True)
+                for post in posts
+            }
+            cache.set_many(
+                {Post.card_cache_key(post_id): card for post_id, card in built.items()},
+                timeout=Post.CARD_CACHE_TIMEOUT,
+            )
+            cards.update(built)
+
+        state = Post._query_feed_state(post_ids)
+        result = []
+        for post_id in post_ids:
+            card = cards.get(post_id)
+            if card is None or post_id not in state:
+                continue
+            like_count, comment_count, has_praised = state[post_id]
+            result.append(
+                dict(
+                    card,
+                    praise_num=like_count,
+                    comment_count=comment_count,
+                    has_praised=has_praised,
+                )
+            )
+        return result
+
     @staticmethod
     def from_json(json_post):
         content = json_post.get("content")
@@ -784,6 +1164,16 @@ class Post(db.Model):
 
 class Comment(db.Model):
     __tablename__ = "comments"
+    __table_args__ = (
+        # 文章根评论按 (timestamp, id) 倒序游标分页
+        db.Index(
+            "ix_comments_post_root_timestamp_id",
+            "post_id",
+            "root_comment_id",
+            "timestamp",
+            "id",
+        ),
+    )
     id = db.Column(db.Integer, primary_key=True)
     body = db.Column(db.Text)
     timestamp = db.Column(db.DateTime, index=True, default=DateUtils.now_time)
@@ -825,27 +1215,143 @@ class Comment(db.Model):
     praise = db.relationship(
         "Praise", backref="comment", lazy="dynamic", passive_deletes=True
     )
+    # 点赞数
+    like_count = db.Column(db.Integer, default=0)
 
-    def to_json(self):
+    def to_json(self, author=None):
+        """
+        author: 预先批量查询的作者，为空时通过关系加载
+        """
+        author = author or self.author
         j = {
             "id": self.id,
             "parentId": self.root_comment_id,
             "directParentId": self.direct_parent_id,
-            "uid": self.author.id,
+            "uid": author.id,
             "content": self.body if not self.disabled else "<p><i>此评论已被版主禁用</i></p>",
-            "likes": self.praise.count(),
+            "likes": self.like_count or 0,
             "createTime": DateUtils.datetime_to_str(self.timestamp),
             "user": {
-                "username": self.author.nickname
-                if self.author.nickname
-                else self.author.username,
-                "avatar": get_avatars_url(self.author.image),
+                "username": author.nickname if author.nickname else author.username,
+                "avatar": get_avatars_url(author.image),
                 # 'address': self.author.location,
-                "homeLink": f"/user/{self.author.username}",
+                "homeLink": f"/user/{author.username}",
             },
         }
         return j
 
+    @staticmethod
+    def _query_authors(comments):
+        """
+        批量查询评论作者
+        返回用户ID到用户的映射字典
+        """
+        author_ids = {comment.author_id for comment in comments}
+        if not author_ids:
+            return {}
+        users = (
+            User.query.options(
+                load_only(User.id, User.username, User.nickname, User.image)
+            )
+            .filter(User.id.in_(author_ids))
+            .all()
+        )
+        return {user.id: user for user in users}
+
+    @staticmethod
+    def _query_first_replies(root_ids, per_page):
+        """
+        一次查询所有根评论的第一页回复及回复总数（窗口函数）
+        返回根评论ID到 (回复列表, 回复总数) 的映射字典
+        """
+        partition = Comment.root_comment_id
+        numbered = (
+            db.select(
+                Comment,
+                func.row_number()
+                .over(
+                    partition_by=partition,
+                    order_by=(Comment.timestamp.desc(), Comment.id.desc()),
+                )
+                .label("rn"),
+                func.count().over(partition_by=partition).label("total"),
+            )
+            .where(Comment.root_comment_id.in_(root_ids))
+            .subquery()
+        )
+        reply = aliased(Comment, numbered)
+        rows = db.session.execute(
+            db.select(reply, numbered.c.total)
+            .where(numbered.c.rn <= per_page)
+            .order_by(numbered.c.root_comment_id, numbered.c.rn)
+        ).all()
+
+        replies = {}
+        for comment, total in rows:
+            replies.setdefault(comment.root_comment_id, ([], total))[0].append(comment)
+        return replies
+
+    @staticmethod
+    def _query_liked_ids(comment_ids):
+        """批量查询当前用户点赞过的评论id"""
+        current_user_id = current_user.id if current_user else None
+        if not current_user_id or not comment_ids:
+            return set()
+        return set(
+            db.session.scalars(
+                db.select(Praise.comment_id).where(
+                    Praise.author_id == current_user_id,
+                    Praise.comment_id.in_(comment_ids),
+                )
+            )
+        )
+
+    @staticmethod
+    def batch_to_json(comments):
+        """批量序列化评论，作者一次查询"""
+        authors = Comment._query_authors(comments)
+        return [
+            comment.to_json(author=authors.get(comment.author_id))
+            for comment in comments
+        ]
+
+    @staticmethod
+    def load_threads(root_comments, reply_per_page):
+        """
+        批量加载评论串：每个根评论的第一页回复及回复总数、所有作者、当前用户已点赞的评论id
+        不论根评论多少，固定 3 次查询
+
+        返回 (评论列表, 已点赞评论id列表)，评论格式为根评论附加
+        "reply": {"list": [...], "total": int}
+        """
+        if not root_comments:
+            return [], []
+
+        replies = Comment._query_first_replies(
+            [comment.id for comment in root_comments], reply_per_page
+        )
+        comments = list(root_comments)
+        for reply_list, _ in replies.values():
+            comments.extend(reply_list)
+        authors = Comment._query_authors(comments)
+        liked_ids = Comment._query_liked_ids([comment.id for comment in comments])
+
+        result = []
+        for root_comment in root_comments:
+            reply_list, reply_total = replies.get(root_comment.id, ([], 0))
+            comment_data = root_comment.to_json(
+                author=authors.get(root_comment.author_id)
+            )
+            comment_data["reply"] = {
+                "list": [
+                    reply.to_json(author=authors.get(reply.author_id))
+                    for reply in reply_list
+                ],
+                "total": reply_total,
+            }
+            result.append(comment_data)
+        return result, sorted(liked_ids)
+
     @staticmethod
     def from_json(json_comment):
         body = json_comment.get("body")
@@ -872,6 +1378,7 @@ class Praise(db.Model):
 
 class Log(db.Model):
     __tablename__ = "log"
+    __table_args__ = (db.Index("ix_log_operate_time_id", "operate_time", "id"),)
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), index=True)
     ip = db.Column(db.String(100))
@@ -907,16 +1414,167 @@ class Log(db.Model):
         }
         return json_log
 
+    # 每次删除的日志数
+    PURGE_BATCH = 1000
+
+    @staticmethod
+    def purge_before(cutoff):
+        """分批删除 cutoff 之前的日志，沿 operate_time 索引按范围查找
+
+        Returns:
+            删除的日志数
+        """
+        deleted = 0
+        while True:
+            ids = db.session.scalars(
+                select(Log.id)
+                .where(Log.operate_time < cutoff)
+                .order_by(Log.operate_time, Log.id)
+                .limit(Log.PURGE_BATCH)
+            ).all()
+            if not ids:
+                return deleted
+            deleted += Log.query.filter(Log.id.in_(ids)).delete(
+                synchronize_session=False
+            )
+            db.session.commit()
+
+
+class LogRollup(db.Model):
+    """访客日志按小时、按天的汇总，日志入库时增量累加
+
+    维度 all 只有一个空值，为该时段的总访问量；
+    其余维度的空值（如查不到地理位置）记为空字符串
+    """
+
+    __tablename__ = "log_rollups"
+    period = db.Column(db.String(8), primary_key=True)
+    bucket = db.Column(db.DateTime, primary_key=True)
+    dimension = db.Column(db.String(16), primary_key=True)
+    value = db.Column(db.String(50), primary_key=True)
+    visits = db.Column(db.Integer, default=0)
+
+    HOUR = "hour"
+    DAY = "day"
+    PERIODS = (HOUR, DAY)
+    DIMENSIONS = ("country", "browser", "os", "device")
+
+    @staticmethod
+    def bucket_of(period, operate_time):
+        """日志时间所在的时段起点"""
+        bucket = operate_time.replace(minute=0, second=0, microsecond=0)
+        if period == LogRollup.DAY:
+            bucket = bucket.replace(hour=0)
+        return bucket
+
+    @staticmethod
+    def record_logs(connection, rows):
+        """累加新写入的日志
+
+        Args:
+            rows: 日志字段字典，需包含 operate_time 和各维度字段
+        """
+        counts = Counter()
+        for row in rows:
+            for period in LogRollup.PERIODS:
+                bucket = LogRollup.bucket_of(period, row["operate_time"])
+                counts[(period, bucket, "all", "")] += 1
+                for dimension in LogRollup.DIMENSIONS:
+                    counts[(period, bucket, dimension, row.get(dimension) or "")] += 1
+
+        table = LogRollup.__table__
+        for (period, bucket, dimension, value), visits in counts.items():
+            where = (
+                (table.c.period == period)
+                & (table.c.bucket == bucket)
+                & (table.c.dimension == dimension)
+                & (table.c.value == value)
+            )
+            update_stmt = (
+                table.update().where(where).values(visits=table.c.visits + visits)
+            )
+            if connection.execute(update_stmt).rowcount:
+                continue
+            try:
+                with connection.begin_nested():
+                    connection.execute(
+                        table.insert().values(
+                            period=period,
+                            bucket=bucket,
+                            dimension=dimension,
+                            value=value,
+                            visits=visits,
+                        )
+                    )
+            except IntegrityError:
+                # 并发写入时另一批日志已创建该行
+                connection.execute(update_stmt)
+
+    @staticmethod
+    def purge_before(period, cutoff):
+        """删除 cutoff 之前的汇总"""
+        deleted = LogRollup.query.filter(
+            LogRollup.period == period, LogRollup.bucket < cutoff
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+
+    @staticmethod
+    def timeline(period, start):
+        """start 之后每个时段的访问量"""
+        rows = (
+            LogRollup.query.with_entities(LogRollup.bucket, LogRollup.visits)
+            .filter_by(period=period, dimension="all")
+            .filter(LogRollup.bucket >= start)
+            .order_by(LogRollup.bucket)
+            .all()
+        )
+        return [
+            {"bucket": DateUtils.datetime_to_str(bucket), "visits": visits}
+            for bucket, visits in rows
+        ]
+
+    @staticmethod
+    def top_values(period, start, dimension, limit):
+        """start 之后某个维度访问量最多的取值"""
+        visits = func.sum(LogRollup.visits).label("visits")
+        rows = (
+            db.session.query(LogRollup.value, visits)
+            .filter_by(period=period, dimension=dimension)
+            .filter(LogRollup.bucket >= start)
+            .group_by(LogRollup.value)
+            .order_by(visits.desc(), LogRollup.value)
+            .limit(limit)
+            .all()
+        )
+        return [{"value": value, "visits": int(total)} for value, total in rows]
+
 
 class Message(db.Model):
     __tablename__ = "messages"
+    __table_args__ = (
+        # 聊天记录按会话、id 倒序分页，标记已读也按会话定位
+        db.Index("ix_messages_conversation_id", "conversation_id", "id"),
+    )
     id = db.Column(db.Integer, primary_key=True)
     sender_id = db.Column(db.Integer, db.ForeignKey("users.id"))
     receiver_id = db.Column(db.Integer, db.ForeignKey("users.id"))
+    # 会话标识，由双方用户id组成，见 conversation_key
+    conversation_id = db.Column(db.String(32))
+    # 服务端生成的消息标识，入库前即返回给发送方
+    uuid = db.Column(
+        db.String(32), unique=True, index=True, default=lambda: uuid4().hex
+    )
     content = db.Column(db.Text)
     timestamp = db.Column(db.DateTime, default=DateUtils.now_time)
     is_read = db.Column(db.Boolean, default=False)
 
+    @staticmethod
+    def conversation_key(user_id, other_user_id):
+        """两个用户之间的会话标识：较小id_较大id"""
+        low, high = sorted((int(user_id), int(other_user_id)))
+        return f"{low}_{high}"
+
     def to_json(self):
         # j = {
         #     'id': self.id,
@@ -939,10 +1597,139 @@ class Message(db.Model):
             else DateUtils.datetime_to_str(self.timestamp),
             "sender_id": self.sender_id,
             "is_read": self.is_read,
+            "uuid": self.uuid,
         }
         return j
 
 
+class Conversation(db.Model):
+    """会话摘要，每个会话双方各一行，随消息写入更新
+
+    user_id 的会话列表按 last_message_id 倒序即按最近消息排序
+    """
+
+    __tablename__ = "conversations"
+    __table_args__ = (
+        db.Index("ix_conversations_user_last_message", "user_id", "last_message_id"),
+    )
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    # 会话的另一方
+    peer_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    last_message_id = db.Column(db.Integer)
+    last_sender_id = db.Column(db.Integer)
+    last_content = db.Column(db.String(100))
+    last_message_at = db.Column(db.DateTime)
+    # user_id 收到的未读消息数
+    unread_count = db.Column(db.Integer, default=0)
+
+    peer = db.relationship("User", foreign_keys=[peer_id])
+
+    # 会话列表中最后一条消息的预览长度
+    PREVIEW_LEN = 100
+
+    def to_json(self):
+        return {
+            "peer": {
+                "id": self.peer.id,
+                "username": self.peer.username,
+                "nickname": self.peer.nickname,
+                "image": get_avatars_url(self.peer.image),
+            },
+            "lastMessage": {
+                "id": self.last_message_id,
+                "senderId": self.last_sender_id,
+                "content": self.last_content,
+                "time": self.last_message_at
+                if isinstance(self.last_message_at, str)
+                else DateUtils.datetime_to_str(self.last_message_at),
+            },
+            "unreadCount": self.unread_count or 0,
+        }
+
+    @staticmethod
+    def record_messages(connection, messages):
+        """消息写入后更新双方的会话摘要，接收方未读数累加（已读消息不计）
+
+        Args:
+            messages: 已写入的消息，按 id 升序
+        """
+        # (user_id, peer_id) -> [最后一条消息, 新增未读数]
+        sides = {}
+        for message in messages:
+            sides.setdefault((message.sender_id, message.receiver_id), [None, 0])
+            sides[(message.sender_id, message.receiver_id)][0] = message
+            if message.receiver_id == message.sender_id:
+                continue
+            side = sides.setdefault((message.receiver_id, message.sender_id), [None, 0])
+            side[0] = message
+            side[1] += 0 if message.is_read else 1
+
+        table = Conversation.__table__
+        for (user_id, peer_id), (message, unread) in sides.items():
+            values = {
+                "last_message_id": message.id,
+                "last_sender_id": message.sender_id,
+                "last_content": (message.content or "")[: Conversation.PREVIEW_LEN],
+                "last_message_at": message.timestamp,
+            }
+            where = (table.c.user_id == user_id) & (table.c.peer_id == peer_id)
+            update_stmt = (
+                table.update()
+                .where(where)
+                .values(
+                    unread_count=func.coalesce(table.c.unread_count, 0) + unread,
+                    **values,
+                )
+            )
+            if connection.execute(update_stmt).rowcount:
+                continue
+            try:
+                with connection.begin_nested():
+                    connection.execute(
+                        table.insert().values(
+                            user_id=user_id,
+                            peer_id=peer_id,
+                            unread_count=unread,
+                            **values,
+                        )
+                    )
+            except IntegrityError:
+                # 并发写入时另一条消息已创建该行
+                connection.execute(update_stmt)
+
+    @staticmethod
+    def mark_read(user_id, peer_id, message_ids=None):
+        """将 peer_id 发给 user_id 的消息标记为已读，并重新统计未读数
+
+        Args:
+            message_ids: 只标记这些消息，为空时标记整个会话
+
+        Returns:
+            标记为已读的消息数
+        """
+        query = Message.query.filter(
+            Message.conversation_id == Message.conversation_key(user_id, peer_id),
+            Message.receiver_id == user_id,
+            Message.is_read.is_(False),
+        )
+        if message_ids is not None:
+            query = query.filter(Message.id.in_(message_ids))
+        updated = query.update({"is_read": True}, synchronize_session=False)
+        unread = (
+            0
+            if message_ids is None
+            else Message.query.filter(
+                Message.conversation_id == Message.conversation_key(user_id, peer_id),
+                Message.receiver_id == user_id,
+                Message.is_read.is_(False),
+            ).count()
+        )
+        Conversation.query.filter_by(user_id=user_id, peer_id=peer_id).update(
+            {"unread_count": unread}, synchronize_session=False
+        )
+        return updated
+
+
 class ImageType(Enum):
     MOVIE = "电影"
     BOOK = "书籍"
@@ -994,12 +1781,221 @@ class Tag(db.Model):
 @event.listens_for(Tag, "before_delete")
 def delete_tag_cleanup(mapper, connection, target):
     """删除Tag前，清理中间表中所有关联记录"""
-    # 删除中间表中该tag_id对应的所有记录
     connection.execute(user_tag.delete().where(user_tag.c.tag_id == target.id))
 
 
+@event.listens_for(db.session, "before_flush")
+def collect_deleted_tag_users(session, flush_context, instances):
+    """记下被删除标签的用户，提交后清除其资料缓存
+
+    flush 时 ORM 会先删除 users 反向关系的中间表记录，before_delete 中已查不到，
+    因此在 flush 之前用 .all() 取出
+    """
+    tag_ids = [obj.id for obj in session.deleted if isinstance(obj, Tag)]
+    if not tag_ids:
+        return
+    user_ids = (
+        session.execute(
+            select(user_tag.c.user_id).where(user_tag.c.tag_id.in_(tag_ids))
+        )
+        .scalars()
+        .all()
+    )
+    session.info.setdefault("stale_profiles", set()).update(user_ids)
+
+
 user_tag = db.Table(
     "user_tag",
     db.Column("user_id", db.Integer, db.ForeignKey("users.id")),
     db.Column("tag_id", db.Integer, db.ForeignKey("tag.id")),
 )
+
+
+# ---------------------------- 计数字段维护 ----------------------------
+# 计数字段在写入所在的 flush 中用 UPDATE col = col + n 原子更新，与业务数据同事务提交。
+# 不触发 ORM 事件的写入（批量删除、数据库级联删除）会造成偏差，由 reconcile_counters 修正。
+def _incr(connection, model, ident, column, delta):
+    """对 model 中 id=ident 的行执行 column = column + delta
+
+    ident 可以是主键值，也可以是返回主键的 select
+    """
+    if ident is None or not delta:
+        return
+    table = model.__table__
+    if not isinstance(ident, int):
+        ident = ident.scalar_subquery()
+    connection.execute(
+        table.update()
+        .where(table.c.id == ident)
+        .values({column: func.coalesce(table.c[column], 0) + delta})
+    )
+
+
+def _praise_changed(connection, target, delta):
+    if target.post_id:
+        _incr(connection, Post, target.post_id, "like_count", delta)
+        author_id = select(Post.author_id).where(Post.id == target.post_id)
+        _incr(connection, User, author_id, "praised_count", delta)
+    if target.comment_id:
+        _incr(connection, Comment, target.comment_id, "like_count", delta)
+        author_id = select(Comment.author_id).where(Comment.id == target.comment_id)
+        _incr(connection, User, author_id, "praised_count", delta)
+
+
+@event.listens_for(Praise, "after_insert")
+def praise_after_insert(mapper, connection, target):
+    _praise_changed(connection, target, 1)
+
+
+@event.listens_for(Praise, "after_delete")
+def praise_after_delete(mapper, connection, target):
+    _praise_changed(connection, target, -1)
+
+
+@event.listens_for(Comment, "after_insert")
+def comment_after_insert(mapper, connection, target):
+    _incr(connection, Post, target.post_id, "comment_count", 1)
+
+
+@event.listens_for(Comment, "after_delete")
+def comment_after_delete(mapper, connection, target):
+    _incr(connection, Post, target.post_id, "comment_count", -1)
+    # 评论的点赞由数据库级联删除，同步扣减评论作者的获赞数
+    _incr(
+        connection, User, target.author_id, "praised_count", -(target.like_count or 0)
+    )
+
+
+@event.listens_for(Message, "before_insert")
+def message_before_insert(mapper, connection, target):
+    target.conversation_id = Message.conversation_key(
+        target.sender_id, target.receiver_id
+    )
+
+
+@event.listens_for(Message, "after_insert")
+def message_after_insert(mapper, connection, target):
+    Conversation.record_messages(connection, [target])
+
+
+@event.listens_for(Post, "after_insert")
+def post_after_insert(mapper, connection, target):
+    _incr(connection, User, target.author_id, "post_count", 1)
+
+
+def _follow_changed(connection, target, delta):
+    # 自己关注自己不计数
+    if target.follower_id == target.followed_id:
+        return
+    _incr(connection, User, target.follower_id, "followed_count", delta)
+    _incr(connection, User, target.followed_id, "followers_count", delta)
+
+
+@event.listens_for(Follow, "after_insert")
+def follow_after_insert(mapper, connection, target):
+    _follow_changed(connection, target, 1)
+
+
+@event.listens_for(Follow, "after_delete")
+def follow_after_delete(mapper, connection, target):
+    _follow_changed(connection, target, -1)
+
+
+def reconcile_counters(user_ids=None, post_ids=None):
+    """按实际数据重新计算计数字段
+
+    Args:
+        user_ids: 只校正这些用户，None 表示全部用户
+        post_ids: 只校正这些文章及其评论，None 表示全部文章
+    """
+
+    def count(column, *criteria):
+        return select(func.count(column)).where(*criteria).scalar_subquery()
+
+    def praises_received(foreign_key, model):
+        return (
+            select(func.count(Praise.id))
+            .join(model, foreign_key == model.id)
+            .where(model.author_id == User.id)
+            .scalar_subquery()
+        )
+
+    statements = []
+    if post_ids is None or post_ids:
+        posts = update(Post).values(
+            like_count=count(Praise.id, Praise.post_id == Post.id),
+            comment_count=count(Comment.id, Comment.post_id == Post.id),
+        )
+        comments = update(Comment).values(
+            like_count=count(Praise.id, Praise.comment_id == Comment.id)
+        )
+        if post_ids is not None:
+            posts = posts.where(Post.id.in_(post_ids))
+            comments = comments.where(Comment.post_id.in_(post_ids))
+        statements += [posts, comments]
+    if user_ids is None or user_ids:
+        users = update(User).values(
+            post_count=count(Post.id, Post.author_id == User.id),
+            followers_count=count(
+                Follow.follower_id,
+                Follow.followed_id == User.id,
+                Follow.follower_id != User.id,
+            ),
+            followed_count=count(
+                Follow.followed_id,
+                Follow.follower_id == User.id,
+                Follow.followed_id != User.id,
+            ),
+            praised_count=praises_received(Praise.post_id, Post)
+            + praises_received(Praise.comment_id, Comment),
+        )
+        if user_ids is not None:
+            users = users.where(User.id.in_(user_ids))
+        statements.append(users)
+
+    for stmt in statements:
+        db.session.execute(stmt.execution_options(synchronize_session=False))
+    db.session.commit()
+
+
+# ---------------------------- 身份及文章卡片缓存失效 ----------------------------
+
+
+# flush 中只记下需要失效的缓存，提交后再清除：若在提交前清除，并发请求可能读到
+# 未提交的旧数据并按新版本重新缓存；回滚时不清除
+@event.listens_for(User, "after_update")
+def user_after_update(mapper, connection, target):
+    """用户名、昵称、头像或角色变更后，清除缓存的身份及该用户文章的列表卡片"""
+    state = db.inspect(target)
+    changed = {
+        name
+        for name in ("username", "nickname", "image", "role", "role_id")
+        if state.attrs[name].history.has_changes()
+    }
+    if not changed:
+        return
+    info = state.session.info
+    info.setdefault("stale_principals", set()).add(target.id)
+    if changed.isdisjoint({"username", "nickname", "image"}):
+        return
+    post_ids = (
+        connection.execute(select(Post.id).where(Post.author_id == target.id))
+        .scalars()
+        .all()
+    )
+    info.setdefault("stale_cards", set()).update(post_ids)
+
+
+@event.listens_for(db.session, "after_commit")
+def invalidate_after_commit(session):
+    for user_id in session.info.pop("stale_principals", ()):
+        Principal.bump_version(user_id)
+    Post.invalidate_cards(list(session.info.pop("stale_cards", ())))
+    for user_id in session.info.pop("stale_profiles", ()):
+        User.invalidate_profile(user_id)
+
+
+@event.listens_for(db.session, "after_rollback")
+def discard_after_rollback(session):
+    for key in ("stale_principals", "stale_cards", "stale_profiles"):
+        session.info.pop(key, None)
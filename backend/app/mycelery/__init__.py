@@ -32,6 +32,26 @@ def celery_init_app(app) -> Celery:
             # 测试用，1分钟执行一次
             # "schedule": timedelta(minutes=1.0),
         },
+        "reconcile_counter_task": {
+            "task": "app.mycelery.tasks.reconcile_counter_fields",
+            "schedule": timedelta(days=1),
+        },
+        "flush_last_seen_task": {
+            "task": "app.mycelery.tasks.flush_last_seen",
+            "schedule": timedelta(seconds=app.config["LAST_SEEN_FLUSH_INTERVAL"]),
+        },
+        "expire_presence_task": {
+            "task": "app.mycelery.tasks.expire_presence",
+            "schedule": timedelta(seconds=app.config["PRESENCE_EXPIRE_INTERVAL"]),
+        },
+        "flush_visitor_logs_task": {
+            "task": "app.mycelery.log_task.flush_visitor_logs",
+            "schedule": timedelta(seconds=app.config["LOG_FLUSH_INTERVAL"]),
+        },
+        "purge_visitor_logs_task": {
+            "task": "app.mycelery.log_task.purge_visitor_logs",
+            "schedule": timedelta(days=1),
+        },
     }
 
     celery_app.set_default()
@@ -1,57 +1,239 @@
+import hashlib
+import json
 import logging
 import os
+import socket
+import time
+from datetime import datetime, timedelta
 
-import requests
 from celery import shared_task
+from flask import current_app
+from redis.exceptions import ResponseError
+from user_agents import parse
 
-from .. import db
-from ..models import Log
+from .. import db, redis
+from ..models import Log, LogRollup
+from ..utils import geoip
+from ..utils.lru_cache import LRUCache
+from ..utils.pagination import invalidate_count
 from ..utils.time_util import DateUtils
 
+# 待入库的访客日志先写入 Redis 列表 [json, ...]，由定时任务批量入库
+LOG_BUFFER_KEY = "log:buffer"
+LOG_FLUSHING_KEY = "log:buffer:flushing"
+# 无法入库的日志移入死信列表，只保留最近 LOG_DEAD_MAX_LEN 条供排查
+LOG_DEAD_KEY = "log:buffer:dead"
+LOG_DEAD_MAX_LEN = 1000
+# 每条 INSERT 语句写入的日志数
+LOG_FLUSH_BATCH = 500
+# 缓冲中 user-agent 的最大长度
+USER_AGENT_MAX_LEN = 512
 
-@shared_task(ignore_result=False)
-def log_visitor(is_register, client_ip, user_agent):
-    # 用户身份信息
-    client_info = get_client_info(client_ip)
-    client_info.update(user_agent)
+# 解析过的 user-agent：{摘要: 浏览器、系统、设备}，常见的 UA 只有几百种
+_ua_cache = LRUCache(maxsize=1024)
+# 所有进程 UA 缓存的命中、未命中次数之和，每次落库后累加本进程的增量，供管理接口查看
+UA_CACHE_STATS_KEY = "log:ua_cache:stats"
+# 各进程 UA 缓存的条数：{主机名:进程号: 条数}，读取时求和；一天内没有落库的进程随整个哈希过期
+UA_CACHE_SIZES_KEY = "log:ua_cache:sizes"
+UA_CACHE_SIZES_TTL = 24 * 60 * 60
+# 本进程已累加到 Redis 的命中、未命中次数
+_ua_cache_reported = {"hits": 0, "misses": 0}
 
-    # 构建查询条件
-    log_filter = {"username": client_info.get("username")}
-    if not is_register:
-        log_filter = {"ip": client_info.get("ip")}
 
-    # 获取最近访问记录
-    last_visit = (
-        Log.query.filter_by(**log_filter).order_by(Log.operate_time.desc()).first()
-    )
+def visit_key(is_register, username, client_ip):
+    if is_register:
+        return f"log:visit:user:{username}"
+    return f"log:visit:ip:{client_ip}"
+
+
+def parse_user_agent(user_agent):
+    """解析 user-agent，结果按其摘要缓存在进程内"""
+    if not user_agent:
+        return {
+            "browser": "",
+            "browser_version": "",
+            "os": "",
+            "os_version": "",
+            "device": "",
+        }
+    key = hashlib.md5(user_agent.encode()).hexdigest()
+    ua = _ua_cache.get(key)
+    if ua is None:
+        u = parse(user_agent)
+        ua = {
+            "browser": u.browser.family,
+            "browser_version": u.browser.version_string,
+            "os": u.os.family,
+            "os_version": u.os.version_string,
+            "device": u.device.family,
+        }
+        _ua_cache.set(key, ua)
+    return ua
+
 
-    # 判断访问间隔
-    now = DateUtils.now_time()
-    should_log = not last_visit or DateUtils.datetime_diff(
-        now, DateUtils.datetime_to_str(last_visit.operate_time), 5
+def report_ua_cache_stats():
+    """
+    把上次上报以来本进程的命中、未命中次数用 HINCRBY 累加到 Redis，
+    多个进程落库时不会互相覆盖
+    """
+    current = {"hits": _ua_cache.hits, "misses": _ua_cache.misses}
+    pipe = redis.pipeline()
+    for field, value in current.items():
+        reported = _ua_cache_reported[field]
+        # 缓存被清空时计数从 0 重新开始
+        delta = value - reported if value >= reported else value
+        if delta:
+            pipe.hincrby(UA_CACHE_STATS_KEY, field, delta)
+    pipe.hset(UA_CACHE_STATS_KEY, "maxsize", _ua_cache.maxsize)
+    pipe.hset(
+        UA_CACHE_SIZES_KEY, f"{socket.gethostname()}:{os.getpid()}", len(_ua_cache)
     )
+    pipe.expire(UA_CACHE_SIZES_KEY, UA_CACHE_SIZES_TTL)
+    pipe.execute()
+    _ua_cache_reported.update(current)
+
+
+def log_visitor(is_register, client_ip, visitor, user_agent):
+    """记录访客
+
+    同一访客（登录用户按用户名，游客按 IP）LOG_VISIT_INTERVAL 秒内只记录一次，
+    写入 Redis 缓冲后立即返回，user-agent 解析、地理位置查询和入库
+    由 flush_visitor_logs 完成
+
+    Returns:
+        是否记录
+    """
+    key = visit_key(is_register, visitor.get("username"), client_ip)
+    if not redis.set(key, 1, nx=True, ex=current_app.config["LOG_VISIT_INTERVAL"]):
+        return False
+    row = {
+        **visitor,
+        "ip": client_ip,
+        "user_agent": (user_agent or "")[:USER_AGENT_MAX_LEN],
+        "operate_time": int(time.time()),
+    }
+    redis.rpush(LOG_BUFFER_KEY, json.dumps(row, ensure_ascii=False))
+    return True
+
+
+def _log_row(data):
+    row = json.loads(data)
+    row.update(parse_user_agent(row.pop("user_agent")))
+    row["country"], row["city"] = geoip.lookup(row["ip"])
+    row["operate_time"] = datetime.fromtimestamp(
+        row["operate_time"], DateUtils.Shanghai_tz
+    ).replace(tzinfo=None)
+    # 按列宽截断，严格模式下超长的值会使整批写入失败
+    columns = Log.__table__.columns
+    for name, value in row.items():
+        length = getattr(columns[name].type, "length", None)
+        if length and isinstance(value, str):
+            row[name] = value[:length]
+    return row
+
+
+def _insert_logs(rows):
+    db.session.execute(db.insert(Log), rows)
+    LogRollup.record_logs(db.session.connection(), rows)
+    db.session.commit()
+
 
-    # 记录日志
-    if should_log:
-        db.session.add(Log(**client_info))
-        db.session.commit()
-        logging.info("访客已记录日志")
+def _flush_chunk(chunk):
+    """写入一段缓冲，返回写入数和无法写入的原始数据
 
+    整段写入失败时逐条重试，找出无法写入的日志
+    """
+    rows, dead = [], []
+    for data in chunk:
+        try:
+            rows.append((data, _log_row(data)))
+        except Exception as e:
+            logging.error(f"访客日志格式错误: {str(e)}, 数据: {data}")
+            dead.append(data)
+    if not rows:
+        return 0, dead
+
+    try:
+        _insert_logs([row for _, row in rows])
+        return len(rows), dead
+    except Exception as e:
+        db.session.rollback()
+        logging.warning(f"批量写入访客日志失败，逐条重试: {str(e)}")
 
-def get_client_info(client_ip):
-    # 获取用户地理位置
-    if os.environ.get("FLASK_DEBUG", None):
-        country = None
-        city = None
-    else:
+    written = 0
+    for data, row in rows:
         try:
-            r = requests.get(f"https://ipapi.co/{client_ip}/json/")
-            local_data = r.json()
-            country = local_data.get("country_name")
-            city = local_data.get("city")
-        except Exception:
-            country = None
-            city = None
-
-    user_info = {"ip": client_ip, "country": country, "city": city}
-    return user_info
+            _insert_logs([row])
+            written += 1
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"访客日志无法入库: {str(e)}, 数据: {data}")
+            dead.append(data)
+    return written, dead
+
+
+def flush_log_buffer():
+    """将 Redis 中缓冲的访客日志批量写入数据库
+
+    与最近活跃时间的落库方式相同：先将缓冲重命名为处理中的 key，
+    处理中途失败时 key 保留，下次优先处理。按段写入，每段提交后从处理中的
+    key 移除，无法写入的日志移入死信列表，不会阻塞后续日志
+
+    按小时、按天的汇总与日志在同一事务中累加
+
+    Returns:
+        写入的日志数
+    """
+    if not redis.exists(LOG_FLUSHING_KEY):
+        try:
+            redis.rename(LOG_BUFFER_KEY, LOG_FLUSHING_KEY)
+        except ResponseError:
+            # 缓冲为空
+            return 0
+
+    total = 0
+    while True:
+        chunk = redis.lrange(LOG_FLUSHING_KEY, 0, LOG_FLUSH_BATCH - 1)
+        if not chunk:
+            break
+        written, dead = _flush_chunk(chunk)
+        total += written
+        pipe = redis.pipeline()
+        if dead:
+            pipe.rpush(LOG_DEAD_KEY, *dead)
+            pipe.ltrim(LOG_DEAD_KEY, -LOG_DEAD_MAX_LEN, -1)
+        pipe.ltrim(LOG_FLUSHING_KEY, len(chunk), -1)
+        pipe.execute()
+    redis.delete(LOG_FLUSHING_KEY)
+    report_ua_cache_stats()
+    return total
+
+
+@shared_task(ignore_result=True)
+def flush_visitor_logs():
+    """定期将缓冲的访客日志批量写入数据库"""
+    try:
+        count = flush_log_buffer()
+        if count:
+            logging.info(f"Celery: 访客日志入库，共 {count} 条")
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Celery: 访客日志入库失败: {str(e)}", exc_info=True)
+
+
+@shared_task(ignore_result=True)
+def purge_visitor_logs():
+    """定期删除超过保留天数的访客日志和按小时的汇总"""
+    try:
+        now = datetime.now(DateUtils.Shanghai_tz).replace(tzinfo=None)
+        config = current_app.config
+        count = Log.purge_before(now - timedelta(days=config["LOG_RETENTION_DAYS"]))
+        invalidate_count("logs")
+        rollups = LogRollup.purge_before(
+            LogRollup.HOUR,
+            now - timedelta(days=config["LOG_HOURLY_ROLLUP_RETENTION_DAYS"]),
+        )
+        logging.info(f"Celery: 清理访客日志 {count} 条，按小时的汇总 {rollups} 条")
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Celery: 清理访客日志失败: {str(e)}", exc_info=True)
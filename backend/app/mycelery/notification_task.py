@@ -1,17 +1,18 @@
 import logging
-import os
+from collections import Counter
+from datetime import datetime, timedelta
 
 from celery import shared_task
-from flask_socketio import SocketIO
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 
-from .. import db
-from ..models import Notification, NotificationType
-
-# github工作流上redis容器不使用密码
-redis_pass = "" if os.getenv("FLASK_CONFIG") == "testing" else ":1234@"
-socketio = SocketIO(
-    message_queue=f"redis://{redis_pass}{os.getenv('REDIS_HOST') or '127.0.0.1'}:6379/4"
-)
+from .. import db, redis
+from ..models import Follow, Notification, NotificationType, User
+from ..utils.common import get_avatars_url
+from ..utils.time_util import DateUtils
+from ..websocket import SocketSessionService, WSConnectionManager
+from ..websocket.emitter import get_emitter
 
 
 def _create_and_emit_notifications(notifications):
@@ -25,41 +26,271 @@ def _create_and_emit_notifications(notifications):
     # 批量推送通知
     notification_data = [notification.to_json() for notification in notifications]
     for i, notification in enumerate(notifications):
-        socketio.emit(
+        get_emitter().emit(
             "new_notification",
             notification_data[i],
             to=str(notification.receiver_id),
         )
 
     db.session.commit()
+    Notification.adjust_unread(
+        Counter(notification.receiver_id for notification in notifications)
+    )
+
+
+# 并发的首个事件同时新建通知时，唯一约束冲突后重试的次数
+AGGREGATE_ATTEMPTS = 3
+
+
+def _open_notifications(keys):
+    """按 open_key 查询仍可合并的通知，返回 {接收者: 行}"""
+    query = db.select(
+        Notification.id,
+        Notification.receiver_id,
+        Notification.is_read,
+        Notification.actor_count,
+        Notification.latest_actors,
+        Notification.post_ids,
+    ).where(Notification.open_key.in_(keys))
+    return {row.receiver_id: row for row in db.session.execute(query)}
+
+
+def _aggregate_notifications(
+    receiver_ids, notification_type, actor_id, post_id=None, comment_id=None
+):
+    """按 (接收者, 类型, 文章/评论) 聚合通知
+
+    窗口从通知创建时开始计算，窗口内已有同类通知时原地更新：参与人数加一、
+    最新参与者前置、重新置为未读、更新 updated_at，推送经过防抖合并；
+    窗口结束后的事件新建一条通知并立即推送。
+    新文章通知不区分文章，同一窗口内关注的人发布的新文章合并为一条，文章id记在 post_ids。
+    新建和更新都是批量语句，推送数据只序列化一次触发者信息
+
+    Returns:
+        处理的接收者数
+    """
+    receiver_ids = [
+        receiver_id for receiver_id in receiver_ids if receiver_id != actor_id
+    ]
+    if not receiver_ids:
+        return 0
+
+    actor = db.session.get(User, actor_id)
+    actor_data = {
+        "id": actor.id,
+        "username": actor.username,
+        "nickname": actor.nickname,
+        "image": get_avatars_url(actor.image),
+    }
+    for attempt in range(AGGREGATE_ATTEMPTS):
+        try:
+            now, existing, created, unread_deltas = _merge_or_create(
+                receiver_ids,
+                notification_type,
+                actor_id,
+                actor_data,
+                post_id,
+                comment_id,
+            )
+            break
+        except IntegrityError:
+            # 另一个事件已为部分接收者新建了通知，重新查询后合并到该通知
+            db.session.rollback()
+            if attempt == AGGREGATE_ATTEMPTS - 1:
+                raise
+    Notification.adjust_unread(unread_deltas)
+
+    # 新建的通知立即推送，各接收者只有 id 不同
+    payload = {
+        "type": notification_type.value,
+        "image": actor_data["image"],
+        "time": now if isinstance(now, str) else DateUtils.datetime_to_str(now),
+        "triggerNickName": actor_data["nickname"],
+        "triggerUsername": actor_data["username"],
+        "triggerId": actor_id,
+        "content": "",
+        "postId": post_id,
+        "commentId": comment_id,
+        "isRead": False,
+        "actorCount": 1,
+        "latestActors": [actor_data],
+        "postIds": [post_id] if notification_type == NotificationType.NewPost else [],
+    }
+    for receiver_id, row in created.items():
+        get_emitter().emit(
+            "new_notification", {**payload, "id": row.id}, to=str(receiver_id)
+        )
+
+    debounce = current_app.config["NOTIFICATION_EMIT_DEBOUNCE"]
+    for row in existing.values():
+        # 防抖：窗口内只安排一次推送，推送时发送最新状态
+        if redis.set(_emit_pending_key(row.id), 1, nx=True, ex=debounce):
+            emit_aggregated_notification.apply_async((row.id,), countdown=debounce)
+    return len(receiver_ids)
+
+
+def _merge_or_create(
+    receiver_ids, notification_type, actor_id, actor_data, post_id, comment_id
+):
+    """在一个事务中合并或新建通知并提交
+
+    Returns:
+        (当前时间, 合并的通知, 新建的通知, 未读数变化)
+    """
+    is_new_post = notification_type == NotificationType.NewPost
+    keys = {
+        receiver_id: Notification.aggregate_key(
+            receiver_id,
+            notification_type,
+            None if is_new_post else post_id,
+            comment_id,
+        )
+        for receiver_id in receiver_ids
+    }
+    now = DateUtils.now_time()
+    window_start = datetime.now(DateUtils.Shanghai_tz).replace(tzinfo=None) - timedelta(
+        seconds=current_app.config["NOTIFICATION_AGGREGATE_WINDOW"]
+    )
+    # 关闭窗口已结束的通知，之后的事件新建通知
+    db.session.execute(
+        db.update(Notification)
+        .where(
+            Notification.open_key.in_(keys.values()),
+            Notification.created_at < window_start,
+        )
+        .values(open_key=None)
+    )
+
+    existing = _open_notifications(list(keys.values()))
+    updates = []
+    unread_deltas = Counter()
+    for row in existing.values():
+        latest_actors, actor_count = Notification.merge_actor(
+            row.latest_actors, row.actor_count, actor_data
+        )
+        update = {
+            "id": row.id,
+            "trigger_user_id": actor_id,
+            "actor_count": actor_count,
+            "latest_actors": latest_actors,
+            "is_read": False,
+            "updated_at": now,
+        }
+        if is_new_post:
+            update["post_ids"] = Notification.merge_post_id(row.post_ids, post_id)
+        updates.append(update)
+        if row.is_read:
+            unread_deltas[row.receiver_id] += 1
+    new_receiver_ids = [
+        receiver_id for receiver_id in receiver_ids if receiver_id not in existing
+    ]
+
+    if updates:
+        db.session.execute(db.update(Notification), updates)
+    if new_receiver_ids:
+        db.session.execute(
+            db.insert(Notification),
+            [
+                {
+                    "receiver_id": receiver_id,
+                    "trigger_user_id": actor_id,
+                    "post_id": post_id,
+                    "comment_id": comment_id,
+                    "type": notification_type,
+                    "is_read": False,
+                    "created_at": now,
+                    "updated_at": now,
+                    "actor_count": 1,
+                    "latest_actors": [actor_data],
+                    "post_ids": [post_id] if is_new_post else None,
+                    "open_key": keys[receiver_id],
+                }
+                for receiver_id in new_receiver_ids
+            ],
+        )
+        unread_deltas.update(new_receiver_ids)
+        # 批量插入拿不到自增id，按 open_key 查回
+        created = _open_notifications([keys[i] for i in new_receiver_ids])
+    else:
+        created = {}
+    db.session.commit()
+    return now, existing, created, unread_deltas
+
+
+def _emit_pending_key(notification_id):
+    return f"notification:emit_pending:{notification_id}"
 
 
 @shared_task(ignore_result=True)
-def create_new_post_notifications(post_id, author_id, follower_ids):
+def emit_aggregated_notification(notification_id):
+    """推送聚合后的通知"""
+    redis.delete(_emit_pending_key(notification_id))
+    notification = db.session.get(
+        Notification, notification_id, options=[joinedload(Notification.trigger_user)]
+    )
+    if notification is None:
+        return
+    get_emitter().emit(
+        "new_notification",
+        notification.to_json(),
+        to=str(notification.receiver_id),
+    )
+
+
+def fan_out_progress_key(post_id):
+    return f"notification:fan_out:{post_id}"
+
+
+@shared_task(bind=True, ignore_result=True, max_retries=3, default_retry_delay=10)
+def create_new_post_notifications(self, post_id, author_id, after_id=0):
     """创建新文章通知并推送给粉丝
 
+    按粉丝id分批处理，每批单独提交。某一批失败时从上一批之后重试，
+    进度记录在 Redis 哈希 notification:fan_out:{post_id} 中
+
     Args:
         post_id: 文章ID
         author_id: 作者ID
-        follower_ids: 粉丝ID列表
+        after_id: 从该粉丝ID之后开始处理，重试时使用
     """
+    chunk_size = current_app.config["NOTIFICATION_FAN_OUT_CHUNK"]
+    progress_key = fan_out_progress_key(post_id)
     try:
-        notifications = [
-            Notification(
-                receiver_id=follower_id,
-                trigger_user_id=author_id,
-                post_id=post_id,
-                type=NotificationType.NewPost,
+        while True:
+            follower_ids = db.session.scalars(
+                db.select(Follow.follower_id)
+                .where(
+                    Follow.followed_id == author_id,
+                    Follow.follower_id != author_id,
+                    Follow.follower_id > after_id,
+                )
+                .order_by(Follow.follower_id)
+                .limit(chunk_size)
+            ).all()
+            if not follower_ids:
+                break
+            sent = _aggregate_notifications(
+                follower_ids, NotificationType.NewPost, author_id, post_id=post_id
             )
-            for follower_id in follower_ids
-        ]
+            after_id = follower_ids[-1]
 
-        _create_and_emit_notifications(notifications)
-        logging.info(f"新文章通知任务完成: post_id={post_id}, 粉丝数={len(follower_ids)}")
+            pipe = redis.pipeline(transaction=False)
+            pipe.hset(progress_key, "after_id", after_id)
+            pipe.hincrby(progress_key, "chunks", 1)
+            pipe.hincrby(progress_key, "sent", sent)
+            pipe.expire(progress_key, 60 * 60 * 24)
+            pipe.execute()
+
+        redis.hset(progress_key, "done", 1)
+        logging.info(f"新文章通知任务完成: post_id={post_id}, 进度={redis.hgetall(progress_key)}")
 
     except Exception as e:
         db.session.rollback()
-        logging.error(f"新文章通知任务失败: {str(e)}", exc_info=True)
+        logging.error(
+            f"新文章通知任务失败: post_id={post_id}, after_id={after_id}, {str(e)}",
+            exc_info=True,
+        )
+        raise self.retry(exc=e, args=(post_id, author_id, after_id))
 
 
 @shared_task(ignore_result=True)
@@ -108,15 +339,13 @@ def create_like_notifications(post_id, comment_id, liker_id, receiver_id):
         if receiver_id is None:
             return
 
-        notification = Notification(
-            receiver_id=receiver_id,
-            trigger_user_id=liker_id,
+        _aggregate_notifications(
+            [receiver_id],
+            NotificationType.LIKE,
+            liker_id,
             post_id=post_id,
             comment_id=comment_id,
-            type=NotificationType.LIKE,
         )
-
-        _create_and_emit_notifications([notification])
         logging.info(f"点赞通知任务完成: post_id={post_id}, comment_id={comment_id}")
 
     except Exception as e:
@@ -140,3 +369,16 @@ def create_chat_notifications(receiver_id, sender_id, message_id):
     except Exception as e:
         db.session.rollback()
         logging.error(f"私信通知任务失败: {str(e)}", exc_info=True)
+
+
+@shared_task(ignore_result=True)
+def revoke_user_sockets(user_id):
+    """吊销用户已签发 token 的 websocket 身份，并强制断开已建立的连接
+
+    连接可能在任一 websocket 进程上，断开请求通过消息队列广播
+    """
+    SocketSessionService(redis).revoke_user(user_id)
+    sids = WSConnectionManager(redis).get_bound_sockets(user_id)
+    for sid in sids:
+        get_emitter().server.disconnect(sid, namespace="/")
+    logging.info(f"已吊销用户 {user_id} 的websocket连接: {len(sids)} 个")
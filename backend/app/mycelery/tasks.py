@@ -2,12 +2,13 @@ import logging
 import os
 
 from celery import shared_task
-from flask import render_template
+from flask import current_app, render_template
 from flask_mail import Message
 
-from .. import db, mail
+from .. import db, mail, redis
 from ..main.uploads import del_qiniu_image
-from ..models import Image, ImageType, Post
+from ..models import Image, ImageType, Post, User, reconcile_counters
+from ..websocket import UserPresenceService, WSConnectionManager
 
 
 @shared_task(ignore_result=False)
@@ -34,7 +35,9 @@ def hard_delete_post():
             logging.info("Celery: 没有需要删除的文章")
             return
 
-        post_ids = [p.id for p in posts_query.with_entities(Post.id).all()]
+        rows = posts_query.with_entities(Post.id, Post.author_id).all()
+        post_ids = [row.id for row in rows]
+        author_ids = {row.author_id for row in rows}
         logging.info(f"Celery: 开始删除文章，共 {post_count} 篇")
 
         # 删除相关图片
@@ -46,10 +49,60 @@ def hard_delete_post():
 
         logging.info(f"Celery: 批量删除完成，文章 {post_delete_result} 篇, 图片 {image_count} 张")
 
+        # 批量删除不触发计数事件，校正作者的计数字段
+        reconcile_counters(user_ids=list(author_ids), post_ids=[])
+
     except Exception as e:
         _handle_delete_error(e)
 
 
+@shared_task(ignore_result=True)
+def reconcile_counter_fields():
+    """定期校正文章、评论、用户的计数字段"""
+    try:
+        reconcile_counters()
+        logging.info("Celery: 计数字段校正完成")
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Celery: 计数字段校正失败: {str(e)}", exc_info=True)
+
+
+@shared_task(ignore_result=True)
+def flush_last_seen():
+    """定期将缓冲的最近活跃时间批量写入数据库"""
+    try:
+        count = User.flush_last_seen()
+        if count:
+            logging.info(f"Celery: 最近活跃时间落库，共 {count} 个用户")
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Celery: 最近活跃时间落库失败: {str(e)}", exc_info=True)
+
+
+@shared_task(ignore_result=True)
+def expire_presence():
+    """定期将超时未活跃的用户标记为离线，并清理已退出的 websocket worker 遗留的连接"""
+    try:
+        presence = UserPresenceService(redis)
+        user_ids = presence.expire_inactive(
+            current_app.config["PRESENCE_EXPIRE_INTERVAL"]
+        )
+        if user_ids is None:
+            return
+        if user_ids:
+            logging.info(f"Celery: 超时离线用户 {len(user_ids)} 个")
+
+        orphaned = WSConnectionManager(redis).reap_dead_workers(
+            current_app.config["WS_WORKER_TIMEOUT"]
+        )
+        for user_id in orphaned:
+            presence.mark_user_offline(user_id)
+        if orphaned:
+            logging.info(f"Celery: 清理已退出worker的用户连接 {len(orphaned)} 个")
+    except Exception as e:
+        logging.error(f"Celery: 清理在线状态失败: {str(e)}", exc_info=True)
+
+
 def _delete_post_images(post_ids):
     """删除文章相关图片"""
     images = (
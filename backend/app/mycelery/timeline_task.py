@@ -0,0 +1,30 @@
+import logging
+
+from celery import shared_task
+
+from ..timeline import timeline
+
+
+@shared_task(ignore_result=True)
+def fan_out_post(post_id, author_id):
+    """将新文章写入粉丝的时间线
+
+    Args:
+        post_id: 文章ID
+        author_id: 作者ID
+    """
+    try:
+        count = timeline.fan_out(post_id, author_id)
+        logging.info(f"时间线写扩散完成: post_id={post_id}, 粉丝数={count}")
+    except Exception as e:
+        logging.error(f"时间线写扩散失败: {str(e)}", exc_info=True)
+
+
+@shared_task(ignore_result=True)
+def remove_post_from_timelines(post_id, author_id):
+    """从粉丝的时间线中移除已删除的文章"""
+    try:
+        timeline.remove_post(post_id, author_id)
+        logging.info(f"时间线移除文章完成: post_id={post_id}")
+    except Exception as e:
+        logging.error(f"时间线移除文章失败: {str(e)}", exc_info=True)
@@ -0,0 +1,209 @@
+"""
+关注文章流（home timeline）
+
+写扩散 + 读合并：
+- 普通作者发布文章时，文章id写入每个粉丝的时间线 ZSET（异步任务分批执行）
+- 粉丝数达到 PULL_THRESHOLD 的作者不做写扩散，读取时从数据库拉取其最新文章并合并
+
+结构设计:
+Key: timeline:{user_id}  ->  { post_id: post_id }
+Type: ZSET
+文章id随发布时间递增，直接作为分数，按分数倒序即为按发布时间倒序。
+成员 0 为占位，表示时间线已构建（关注的人没有文章时 key 也存在）。
+时间线最多保留 MAX_LEN 篇，超出部分回退到数据库查询；
+一段时间未读取的时间线自动过期，下次读取时重建，写扩散只写入已存在的时间线
+"""
+import heapq
+
+from sqlalchemy import and_
+
+from . import db, redis
+from .models import Follow, Post, User
+from .utils.pagination import invalidate_count
+
+# 时间线占位成员
+PLACEHOLDER = 0
+
+
+class TimelineService:
+    # 每个时间线最多保留的文章数
+    MAX_LEN = 800
+    # 粉丝数达到该值的作者改为读取时拉取
+    PULL_THRESHOLD = 5000
+    # 时间线过期时间（秒）
+    TTL = 60 * 60 * 24 * 7
+    # 新关注时回填的文章数
+    BACKFILL_LEN = 50
+    # 写扩散时每批处理的粉丝数
+    FAN_OUT_BATCH = 500
+
+    def __init__(self, redis):
+        self.redis = redis
+
+    @staticmethod
+    def key(user_id):
+        return f"timeline:{user_id}"
+
+    # ---------- 写入 ----------
+
+    def rebuild(self, user_id):
+        """从数据库重建时间线，包含所有关注作者（含大V）的最新文章"""
+        post_ids = db.session.scalars(
+            db.select(Post.id)
+            .join(Follow, Follow.followed_id == Post.author_id)
+            .where(Follow.follower_id == user_id, Post.deleted.is_(False))
+            .order_by(Post.id.desc())
+            .limit(self.MAX_LEN)
+        ).all()
+        key = self.key(user_id)
+        pipe = self.redis.pipeline()
+        pipe.delete(key)
+        pipe.zadd(key, {PLACEHOLDER: PLACEHOLDER, **{i: i for i in post_ids}})
+        pipe.expire(key, self.TTL)
+        pipe.execute()
+
+    def _add_to_existing(self, user_ids, post_ids):
+        """将文章写入已存在的时间线并截断，不存在的时间线等读取时再重建"""
+        user_ids = list(user_ids)
+        if not user_ids or not post_ids:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.exists(self.key(user_id))
+        exists = pipe.execute()
+
+        mapping = {i: i for i in post_ids}
+        for user_id, exist in zip(user_ids, exists):
+            if not exist:
+                continue
+            key = self.key(user_id)
+            pipe.zadd(key, mapping)
+            # 保留分数最大的 MAX_LEN 篇及占位成员
+            pipe.zremrangebyrank(key, 1, -(self.MAX_LEN + 1))
+        pipe.execute()
+
+    def is_pulled_author(self, author_id):
+        followers_count = db.session.scalar(
+            db.select(User.followers_count).where(User.id == author_id)
+        )
+        return (followers_count or 0) >= self.PULL_THRESHOLD
+
+    def fan_out(self, post_id, author_id):
+        """将新文章写入作者粉丝（含自己）的时间线
+
+        Returns:
+            写入的粉丝数，大V作者返回 0
+        """
+        if self.is_pulled_author(author_id):
+            # 大V只写入自己的时间线，粉丝读取时拉取
+            self._add_to_existing([author_id], [post_id])
+            return 0
+
+        count = 0
+        for follower_ids in self._follower_batches(author_id):
+            self._add_to_existing(follower_ids, [post_id])
+            count += len(follower_ids)
+        return count
+
+    def _follower_batches(self, author_id):
+        """按 follower_id 游标分批取出作者的粉丝（含自己），每批 FAN_OUT_BATCH 个"""
+        last_id = 0
+        while True:
+            follower_ids = db.session.scalars(
+                db.select(Follow.follower_id)
+                .where(Follow.followed_id == author_id, Follow.follower_id > last_id)
+                .order_by(Follow.follower_id)
+                .limit(self.FAN_OUT_BATCH)
+            ).all()
+            if not follower_ids:
+                return
+            yield follower_ids
+            last_id = follower_ids[-1]
+
+    def remove_post(self, post_id, author_id):
+        """文章删除后从粉丝时间线中移除，与写扩散一样分批处理"""
+        for follower_ids in self._follower_batches(author_id):
+            pipe = self.redis.pipeline(transaction=False)
+            for follower_id in follower_ids:
+                pipe.zrem(self.key(follower_id), post_id)
+            pipe.execute()
+
+    def on_follow(self, follower_id, followed_id):
+        """关注后回填被关注者的最新文章"""
+        invalidate_count(f"posts:followed:{follower_id}")
+        if self.is_pulled_author(followed_id):
+            return
+        post_ids = db.session.scalars(
+            db.select(Post.id)
+            .where(Post.author_id == followed_id, Post.deleted.is_(False))
+            .order_by(Post.id.desc())
+            .limit(self.BACKFILL_LEN)
+        ).all()
+        self._add_to_existing([follower_id], post_ids)
+
+    def on_unfollow(self, follower_id, followed_id):
+        """取消关注后丢弃时间线，下次读取时重建"""
+        invalidate_count(f"posts:followed:{follower_id}")
+        self.redis.delete(self.key(follower_id))
+
+    # ---------- 读取 ----------
+
+    def _pulled_author_ids(self, user_id):
+        """当前用户关注的大V"""
+        return db.session.scalars(
+            db.select(User.id)
+            .join(Follow, Follow.followed_id == User.id)
+            .where(
+                and_(
+                    Follow.follower_id == user_id,
+                    Follow.followed_id != user_id,
+                    User.followers_count >= self.PULL_THRESHOLD,
+                )
+            )
+        ).all()
+
+    def _pull(self, author_ids, before_id, limit):
+        if not author_ids:
+            return []
+        query = db.select(Post.id).where(
+            Post.author_id.in_(author_ids), Post.deleted.is_(False)
+        )
+        if before_id:
+            query = query.where(Post.id < before_id)
+        return db.session.scalars(query.order_by(Post.id.desc()).limit(limit)).all()
+
+    def read(self, user_id, before_id=None, limit=20):
+        """读取 before_id 之前（不含）的最多 limit 篇文章id，按发布时间倒序
+
+        Returns:
+            文章id列表；超出时间线保留范围时返回 None，由调用方回退到数据库查询
+        """
+        key = self.key(user_id)
+        if not self.redis.exists(key):
+            self.rebuild(user_id)
+
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zcard(key)
+        pipe.zrevrangebyscore(
+            key,
+            f"({before_id}" if before_id else "+inf",
+            f"({PLACEHOLDER}",
+            start=0,
+            num=limit,
+        )
+        pipe.expire(key, self.TTL)
+        size, pushed, _ = pipe.execute()
+        pushed = [int(i) for i in pushed]
+        # 时间线已满且本页取不够时，更早的文章可能已被截断
+        if len(pushed) < limit and size > self.MAX_LEN:
+            return None
+
+        pulled = self._pull(self._pulled_author_ids(user_id), before_id, limit)
+        merged = []
+        for post_id in heapq.merge(pushed, pulled, reverse=True):
+            if not merged or merged[-1] != post_id:
+                merged.append(post_id)
+        return merged[:limit]
+
+
+timeline = TimelineService(redis)
@@ -0,0 +1,31 @@
+"""
+文章流页缓存的版本号
+
+每页文章id的缓存键中带有所属文章流的版本号。文章发布、删除时只递增受影响
+文章流的版本号，旧版本的页缓存不再被命中，随过期时间自然淘汰
+
+关注文章流由时间线（app/timeline.py）提供，不使用页缓存
+"""
+from .. import redis
+
+ALL_FEED = "all"
+
+
+def _version_key(feed):
+    return f"feed_version:{feed}"
+
+
+def feed_version(feed):
+    """文章流当前版本号"""
+    return redis.get(_version_key(feed)) or "0"
+
+
+def bump_feeds(feeds):
+    """递增一组文章流的版本号，使其页缓存失效"""
+    feeds = list(feeds)
+    if not feeds:
+        return
+    pipe = redis.pipeline(transaction=False)
+    for feed in feeds:
+        pipe.incr(_version_key(feed))
+    pipe.execute()
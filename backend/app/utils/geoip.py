@@ -0,0 +1,55 @@
+import logging
+import os
+
+from flask import current_app
+
+from .lru_cache import LRUCache
+
+# 离线 IP 库（MaxMind DB 格式，如 GeoLite2-City），按 GEOIP_DATABASE 配置的路径
+# 以内存映射方式打开，同一进程只打开一次
+_reader = None
+_opened = False
+# 热点 IP 的查询结果：{ip: (国家, 城市)}
+_cache = LRUCache(maxsize=4096)
+
+
+def _get_reader():
+    """打开 IP 库，文件不存在时返回 None，不再查询地理位置"""
+    global _reader, _opened
+    if not _opened:
+        _opened = True
+        path = current_app.config["GEOIP_DATABASE"]
+        if path and os.path.exists(path):
+            import maxminddb
+
+            _reader = maxminddb.open_database(path, maxminddb.MODE_MMAP)
+        else:
+            logging.warning(f"IP库不存在: {path}，访客日志不记录地理位置")
+    return _reader
+
+
+def _name(record, field):
+    names = (record.get(field) or {}).get("names") or {}
+    return names.get(current_app.config["GEOIP_LOCALE"]) or names.get("en")
+
+
+def lookup(ip: str) -> tuple[str | None, str | None]:
+    """
+    查询 IP 所在的国家、城市，查不到的部分为 None
+    """
+    location = _cache.get(ip)
+    if location is not None:
+        return location
+
+    location = (None, None)
+    reader = _get_reader()
+    if reader is not None:
+        try:
+            record = reader.get(ip)
+        except ValueError:
+            # 不是合法的 IP 地址
+            record = None
+        if record:
+            location = (_name(record, "country"), _name(record, "city"))
+    _cache.set(ip, location)
+    return location
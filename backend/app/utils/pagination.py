@@ -0,0 +1,83 @@
+"""
+游标（keyset）分页工具
+
+按 (时间, id) 倒序翻页，游标为上一页最后一条记录的 (时间, id)，
+下一页通过 WHERE (时间, id) < 游标 定位，无需 OFFSET 和 COUNT(*)
+"""
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+from .. import cache
+from ..exceptions import ValidationError
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def encode_cursor(timestamp, ident):
+    """将 (时间, id) 编码为不透明的游标字符串"""
+    if isinstance(timestamp, datetime):
+        timestamp = timestamp.strftime(TIME_FORMAT)
+    raw = json.dumps([timestamp, ident], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """解析游标，返回 (datetime, id)"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, ident = json.loads(raw)
+        return datetime.strptime(timestamp, TIME_FORMAT), int(ident)
+    except (ValueError, TypeError):
+        raise ValidationError(f"无效的游标: {cursor}")
+
+
+def keyset_paginate(query, time_column, id_column, cursor, per_page):
+    """游标分页
+
+    Args:
+        query: 已添加过滤条件的查询
+        time_column: 排序时间列，如 Post.timestamp
+        id_column: 主键列，如 Post.id
+        cursor: 上一页返回的游标，为空表示第一页
+        per_page: 每页数量
+
+    Returns:
+        (items, next_cursor)，没有下一页时 next_cursor 为 None
+    """
+    if cursor:
+        timestamp, ident = decode_cursor(cursor)
+        query = query.filter(
+            or_(
+                time_column < timestamp,
+                and_(time_column == timestamp, id_column < ident),
+            )
+        )
+    items = (
+        query.order_by(time_column.desc(), id_column.desc()).limit(per_page + 1).all()
+    )
+    if len(items) <= per_page:
+        return items, None
+
+    items = items[:per_page]
+    last = items[-1]
+    return items, encode_cursor(
+        getattr(last, time_column.key), getattr(last, id_column.key)
+    )
+
+
+def cached_count(key, query, timeout=60):
+    """缓存的总数，用于游标分页和大表分页，允许 timeout 秒内的误差"""
+    cache_key = f"count:{key}"
+    total = cache.get(cache_key)
+    if total is None:
+        total = query.order_by(None).count()
+        cache.set(cache_key, total, timeout=timeout)
+    return total
+
+
+def invalidate_count(key):
+    """数据批量变更后清除缓存的总数"""
+    cache.delete(f"count:{key}")
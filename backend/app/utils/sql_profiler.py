@@ -0,0 +1,216 @@
+import re
+import time
+
+from flask import g, has_app_context
+
+# 请求总耗时直方图的桶上界（毫秒），最后一个桶为超出上界的请求
+BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+# 慢查询指纹最多保留的 SQL 长度
+FINGERPRINT_LEN = 1000
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\?|:\w+")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_SPACES = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    """
+    归一化 SQL：字面量、参数占位符统一为 ?，IN 列表合并为一项，空白合并
+    """
+    sql = _STRING.sub("?", statement)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _IN_LIST.sub("IN (?)", sql)
+    return _SPACES.sub(" ", sql).strip()[:FINGERPRINT_LEN]
+
+
+class RequestProfile:
+    """单个请求的 SQL 记录
+
+    每条语句只保存引用和耗时；参数只在抽样时保存
+    """
+
+    __slots__ = ("start", "sampled", "queries", "sql_time", "statements")
+
+    def __init__(self, sampled: bool):
+        self.start = time.perf_counter()
+        self.sampled = sampled
+        self.queries = 0
+        self.sql_time = 0.0
+        self.statements = []
+
+    def add(self, statement, parameters, duration):
+        self.queries += 1
+        self.sql_time += duration
+        self.statements.append(
+            (statement, parameters if self.sampled else None, duration)
+        )
+
+    @property
+    def total_time(self) -> float:
+        return time.perf_counter() - self.start
+
+
+def start_request(sampled: bool):
+    g.sql_profile = RequestProfile(sampled)
+
+
+def current_profile() -> RequestProfile | None:
+    if not has_app_context():
+        return None
+    return g.get("sql_profile")
+
+
+def finish_request() -> RequestProfile | None:
+    return g.pop("sql_profile", None)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._sql_profile_start = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = current_profile()
+    start = getattr(context, "_sql_profile_start", None)
+    if profile is None or start is None:
+        return
+    profile.add(statement, parameters, time.perf_counter() - start)
+
+
+class SqlProfiler:
+    """
+    按接口汇总请求的 SQL 次数与耗时，归并慢查询
+
+    结构设计:
+    Key: sqlprof:endpoints  ->  { endpoint1, endpoint2, ... }
+    Type: SET
+
+    Key: sqlprof:endpoint:{endpoint}
+         ->  { requests, queries, sql_time, total_time, le:{上界毫秒}: 次数, le:inf: 次数 }
+    Type: HASH
+    时间单位为秒；le:* 为请求总耗时落在各个桶内的次数（不累计），用于估算分位数
+
+    Key: sqlprof:slow:time   ->  { 归一化 SQL: 总耗时（秒） }
+    Key: sqlprof:slow:count  ->  { 归一化 SQL: 次数 }
+    Type: ZSET
+    """
+
+    ENDPOINTS_KEY = "sqlprof:endpoints"
+    SLOW_TIME_KEY = "sqlprof:slow:time"
+    SLOW_COUNT_KEY = "sqlprof:slow:count"
+
+    def __init__(self, redis):
+        self.redis = redis
+
+    @staticmethod
+    def endpoint_key(endpoint: str) -> str:
+        return f"sqlprof:endpoint:{endpoint}"
+
+    @staticmethod
+    def bucket_field(total_time: float) -> str:
+        ms = total_time * 1000
+        for bound in BUCKETS:
+            if ms <= bound:
+                return f"le:{bound}"
+        return "le:inf"
+
+    # ---------- 写入 ----------
+
+    def record_request(
+        self,
+        endpoint: str,
+        profile: RequestProfile,
+        total_time: float,
+        slow_threshold: float,
+    ):
+        """
+        累加一次请求，耗时超过 slow_threshold 的语句按指纹归并
+        """
+        key = self.endpoint_key(endpoint)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.sadd(self.ENDPOINTS_KEY, endpoint)
+        pipe.hincrby(key, "requests", 1)
+        pipe.hincrby(key, "queries", profile.queries)
+        pipe.hincrbyfloat(key, "sql_time", profile.sql_time)
+        pipe.hincrbyfloat(key, "total_time", total_time)
+        pipe.hincrby(key, self.bucket_field(total_time), 1)
+        for statement, _, duration in profile.statements:
+            if duration >= slow_threshold:
+                sql = fingerprint(statement)
+                pipe.zincrby(self.SLOW_TIME_KEY, duration, sql)
+                pipe.zincrby(self.SLOW_COUNT_KEY, 1, sql)
+        pipe.execute()
+
+    def reset(self):
+        endpoints = self.redis.smembers(self.ENDPOINTS_KEY)
+        self.redis.delete(
+            self.ENDPOINTS_KEY,
+            self.SLOW_TIME_KEY,
+            self.SLOW_COUNT_KEY,
+            *(self.endpoint_key(endpoint) for endpoint in endpoints),
+        )
+
+    # ---------- 查询 ----------
+
+    @staticmethod
+    def percentile(histogram: dict, count: int, p: float) -> int | None:
+        """
+        按直方图估算分位数，返回所在桶的上界（毫秒），超出所有桶时为 None
+        """
+        seen = 0
+        for bound in BUCKETS:
+            seen += histogram.get(f"le:{bound}", 0)
+            if seen >= count * p:
+                return bound
+        return None
+
+    def endpoint_stats(self) -> list[dict]:
+        """
+        各接口的平均 SQL 次数、SQL 耗时、总耗时（毫秒）与总耗时分位数
+        按累计总耗时从高到低排序
+        """
+        endpoints = sorted(self.redis.smembers(self.ENDPOINTS_KEY))
+        pipe = self.redis.pipeline(transaction=False)
+        for endpoint in endpoints:
+            pipe.hgetall(self.endpoint_key(endpoint))
+        stats = []
+        for endpoint, data in zip(endpoints, pipe.execute()):
+            requests = int(data.get("requests", 0))
+            if not requests:
+                continue
+            histogram = {k: int(v) for k, v in data.items() if k.startswith("le:")}
+            total_time = float(data.get("total_time", 0))
+            stats.append(
+                {
+                    "endpoint": endpoint,
+                    "requests": requests,
+                    "avgQueries": round(int(data.get("queries", 0)) / requests, 2),
+                    "avgSqlTime": round(
+                        float(data.get("sql_time", 0)) * 1000 / requests, 2
+                    ),
+                    "avgTotalTime": round(total_time * 1000 / requests, 2),
+                    "p50": self.percentile(histogram, requests, 0.5),
+                    "p95": self.percentile(histogram, requests, 0.95),
+                    "p99": self.percentile(histogram, requests, 0.99),
+                }
+            )
+        stats.sort(
+            key=lambda item: item["avgTotalTime"] * item["requests"], reverse=True
+        )
+        return stats
+
+    def slow_queries(self, limit: int) -> list[dict]:
+        """
+        累计耗时最多的慢查询
+        """
+        rows = self.redis.zrevrange(self.SLOW_TIME_KEY, 0, limit - 1, withscores=True)
+        if not rows:
+            return []
+        counts = self.redis.zmscore(self.SLOW_COUNT_KEY, [sql for sql, _ in rows])
+        return [
+            {"sql": sql, "count": int(count or 0), "totalTime": round(total * 1000, 2)}
+            for (sql, total), count in zip(rows, counts)
+        ]
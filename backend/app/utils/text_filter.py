@@ -1,100 +1,143 @@
+import logging
 import os
+import threading
+import time
 
+KEYWORDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "keywords")
 
-class DFAFilter:
-    """Filter Messages from keywords
 
-    Use DFA to keep algorithm perform constantly
+class KeywordMatcher:
+    """敏感词过滤器（Aho-Corasick 自动机）
+
+    构建完成后只读，可在线程间共享：
+    - _goto:    状态 -> {字符: 下一状态}
+    - _fail:    状态 -> 失配跳转状态
+    - _out_len: 状态 -> 以该状态结尾的最长敏感词长度（含失配链），0 表示无命中
+
+    过滤时对文本只扫描一遍，时间复杂度 O(len(message))
 
     hello **** baby
     """
 
-    def __init__(self):
-        self.keyword_chains = {}
-        self.delimit = "\x00"
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        full_path = os.path.join(current_dir, "keywords")
-        self.parse(full_path)
-
-    def add(self, keyword):
-        # if not isinstance(keyword, unicode):
-        #     keyword = keyword.decode('utf-8')
-        keyword = keyword.lower()
-        chars = keyword.strip()
-        if not chars:
-            return
-        level = self.keyword_chains
-        for i in range(len(chars)):
-            if chars[i] in level:
-                level = level[chars[i]]
-            else:
-                if not isinstance(level, dict):
-                    break
-                for j in range(i, len(chars)):
-                    level[chars[j]] = {}
-                    last_level, last_char = level, chars[j]
-                    level = level[chars[j]]
-                last_level[last_char] = {self.delimit: 0}
-                break
-        if i == len(chars) - 1:
-            level[self.delimit] = 0
-
-    def parse(self, path):
-        print("path", path)
+    def __init__(self, keywords):
+        goto = [{}]
+        out_len = [0]
+        for keyword in keywords:
+            chars = keyword.strip().lower()
+            if not chars:
+                continue
+            state = 0
+            for char in chars:
+                nxt = goto[state].get(char)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][char] = nxt
+                    goto.append({})
+                    out_len.append(0)
+                state = nxt
+            out_len[state] = max(out_len[state], len(chars))
+
+        # 广度优先计算失配指针，并沿失配链合并命中长度
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        for state in queue:
+            for char, nxt in goto[state].items():
+                f = fail[state]
+                while f and char not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(char, 0)
+                out_len[nxt] = max(out_len[nxt], out_len[fail[nxt]])
+                queue.append(nxt)
+
+        self._goto = tuple(goto)
+        self._fail = tuple(fail)
+        self._out_len = tuple(out_len)
+
+    @classmethod
+    def from_file(cls, path):
         with open(path, encoding="utf-8") as f:
-            for keyword in f:
-                self.add(keyword.strip())
+            return cls(f)
 
-    def filter(self, message, repl="*"):
-        # if not isinstance(message, unicode):
-        #     message = message.decode('utf-8')
-        message = message.lower()
-        ret = []
-        start = 0
-        while start < len(message):
-            level = self.keyword_chains
-            step_ins = 0
-            for char in message[start:]:
-                if char in level:
-                    step_ins += 1
-                    if self.delimit not in level[char]:
-                        level = level[char]
-                    else:
-                        ret.append(repl * step_ins)
-                        start += step_ins - 1
-                        break
-                else:
-                    ret.append(message[start])
-                    break
-            else:
-                ret.append(message[start])
-            start += 1
+    def __len__(self):
+        return len(self._goto)
 
+    def filter(self, message, repl="*"):
+        """将message中命中的敏感词逐字替换为repl，其余字符保持原样"""
+        if not message:
+            return message
+        lowered = message.lower()
+        # 个别字符小写后长度会变化，此时以小写文本为准，保证下标一一对应
+        if len(lowered) != len(message):
+            message = lowered
+
+        goto, fail, out_len = self._goto, self._fail, self._out_len
+        # ends[i]：以下标i结尾的最长敏感词长度
+        ends = [0] * len(lowered)
+        hit = False
+        state = 0
+        for i, char in enumerate(lowered):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out_len[state]:
+                ends[i] = out_len[state]
+                hit = True
+        if not hit:
+            return message
+
+        # 从右向左扫描，low为已知命中区间的最小起点
+        ret = list(message)
+        low = len(ret)
+        for i in range(len(ret) - 1, -1, -1):
+            if ends[i]:
+                low = min(low, i - ends[i] + 1)
+            if low <= i:
+                ret[i] = repl
         return "".join(ret)
 
+    def filter_many(self, messages, repl="*"):
+        """批量过滤"""
+        return [self.filter(message, repl) for message in messages]
 
-gfw = DFAFilter()
 
+_matcher = None
+_matcher_mtime = None
+_last_check = 0.0
+_lock = threading.Lock()
+# 检查敏感词文件是否变更的最小间隔（秒）
+RELOAD_CHECK_INTERVAL = 30
 
-def first_character():
-    gfw = DFAFilter()
-    gfw.add("1989年")
-    assert gfw.filter("1989", "*") == "1989"
 
+def get_keyword_filter():
+    """获取进程内共享的敏感词过滤器
 
-if __name__ == "__main__":
-    # gfw = NaiveFilter()
-    # gfw = BSFilter()
-    gfw = DFAFilter()
-    gfw.parse("keywords")
-    import time
-
-    t = time.time()
-    # print(gfw.filter("法轮功 我操操操", "*"))
-    # print( gfw.filter("针孔摄像机 我操操操", "*"))
-    # print( gfw.filter("售假人民币 我操操操", "*"))
-    # print( gfw.filter("传世私服 我操操操", "*"))
-
-    print(gfw.filter("shabi", "*"))
-    print(time.time() - t)
-    first_character()
+    首次调用时构建，之后每隔 RELOAD_CHECK_INTERVAL 秒检查一次敏感词文件，
+    文件修改时间变化则重新构建（构建期间其他线程继续使用旧的过滤器）
+    """
+    global _matcher, _matcher_mtime, _last_check
+
+    now = time.monotonic()
+    if _matcher is not None and now - _last_check < RELOAD_CHECK_INTERVAL:
+        return _matcher
+
+    with _lock:
+        if _matcher is not None and now - _last_check < RELOAD_CHECK_INTERVAL:
+            return _matcher
+        _last_check = now
+        try:
+            mtime = os.stat(KEYWORDS_PATH).st_mtime
+        except OSError:
+            logging.error(f"敏感词文件不存在: {KEYWORDS_PATH}")
+            if _matcher is None:
+                _matcher = KeywordMatcher([])
+            return _matcher
+
+        if _matcher is None or mtime != _matcher_mtime:
+            start = time.perf_counter()
+            _matcher = KeywordMatcher.from_file(KEYWORDS_PATH)
+            _matcher_mtime = mtime
+            logging.info(
+                f"敏感词过滤器已构建: 状态数={len(_matcher)}, "
+                f"耗时={time.perf_counter() - start:.3f}s"
+            )
+    return _matcher
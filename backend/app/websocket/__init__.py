@@ -1,10 +1,13 @@
 from .connection import WSConnectionManager
 from .conversation import ConversationStateService
+from .delivery import OfflineDeliveryService
 from .presence import UserPresenceService
+from .session import SocketSession, SocketSessionService
 
 
 def init_ws_services(redis):
     connection = WSConnectionManager(redis)
     presence = UserPresenceService(redis)
     conversation = ConversationStateService(redis)
-    return connection, presence, conversation
+    sessions = SocketSessionService(redis)
+    return connection, presence, conversation, sessions
@@ -1,3 +1,6 @@
+import time
+
+
 class WSConnectionManager:
     """
     管理 socket <-> user_id 的绑定关系
@@ -10,10 +13,24 @@ class WSConnectionManager:
     Key: socket:{sid}   ->  user_id
     Type: STRING
     用于通过 sid 快速反查 user
+
+    多进程部署时每个 websocket 进程是一个 worker:
+    Key: ws:workers  ->  { worker_id: last_heartbeat }
+    Type: ZSET
+    Key: ws:worker:{worker_id}:sockets  ->  { sid1, sid2, ... }
+    Type: SET
+    进程异常退出时来不及解绑，心跳超时后由 reap_dead_workers 清理其连接
     """
 
-    def __init__(self, redis):
+    WORKERS_KEY = "ws:workers"
+
+    def __init__(self, redis, worker_id: str | None = None):
         self.redis = redis
+        self.worker_id = worker_id
+
+    @staticmethod
+    def worker_sockets_key(worker_id: str) -> str:
+        return f"ws:worker:{worker_id}:sockets"
 
     def bind_socket_to_user(self, user_id: int, sid: str):
         """
@@ -22,6 +39,8 @@ class WSConnectionManager:
         pipe = self.redis.pipeline()
         pipe.sadd(f"user:{user_id}:sockets", sid)
         pipe.set(f"socket:{sid}", user_id)
+        if self.worker_id:
+            pipe.sadd(self.worker_sockets_key(self.worker_id), sid)
         pipe.execute()
 
     def unbind_socket(self, sid: str) -> int | None:
@@ -37,6 +56,8 @@ class WSConnectionManager:
         pipe = self.redis.pipeline()
         pipe.srem(f"user:{user_id}:sockets", sid)
         pipe.delete(f"socket:{sid}")
+        if self.worker_id:
+            pipe.srem(self.worker_sockets_key(self.worker_id), sid)
         pipe.execute()
         return user_id
 
@@ -45,3 +66,60 @@ class WSConnectionManager:
         查询用户当前绑定的所有 socket
         """
         return self.redis.smembers(f"user:{user_id}:sockets") or set()
+
+    def connected_users(self, user_ids) -> set[int]:
+        """
+        批量查询有 socket 连接的用户
+        """
+        user_ids = list(dict.fromkeys(int(user_id) for user_id in user_ids))
+        pipe = self.redis.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.scard(f"user:{user_id}:sockets")
+        return {user_id for user_id, count in zip(user_ids, pipe.execute()) if count}
+
+    # ---------- Worker ----------
+
+    def heartbeat(self):
+        """
+        记录当前 worker 存活
+        """
+        self.redis.zadd(self.WORKERS_KEY, {self.worker_id: int(time.time())})
+
+    def list_workers(self, timeout: int) -> list[str]:
+        """
+        心跳未超时的 worker
+        """
+        return self.redis.zrangebyscore(
+            self.WORKERS_KEY, int(time.time()) - timeout, "+inf"
+        )
+
+    def worker_socket_counts(self, timeout: int) -> dict[str, int]:
+        """
+        心跳未超时的各 worker 的连接数
+        """
+        workers = self.list_workers(timeout)
+        pipe = self.redis.pipeline(transaction=False)
+        for worker_id in workers:
+            pipe.scard(self.worker_sockets_key(worker_id))
+        return dict(zip(workers, pipe.execute()))
+
+    def reap_dead_workers(self, timeout: int) -> set[int]:
+        """
+        清理心跳超时的 worker 遗留的连接
+        返回因此不再有任何连接的用户 ID
+        """
+        dead = self.redis.zrangebyscore(
+            self.WORKERS_KEY, "-inf", f"({int(time.time()) - timeout}"
+        )
+        affected = set()
+        for worker_id in dead:
+            key = self.worker_sockets_key(worker_id)
+            for sid in self.redis.smembers(key):
+                user_id = self.unbind_socket(sid)
+                if user_id:
+                    affected.add(user_id)
+            pipe = self.redis.pipeline()
+            pipe.delete(key)
+            pipe.zrem(self.WORKERS_KEY, worker_id)
+            pipe.execute()
+        return affected - self.connected_users(affected)
@@ -9,7 +9,8 @@ class ConversationStateService:
 
     typing:{user_id}:{user_id}    -> 1
     Type: STRING
-    只表示“最近有真实输入”
+    只表示“最近有真实输入”，连续输入时只刷新过期时间，
+    key 从无到有时才算开始输入
     """
 
     ACTIVE_CHAT_TTL = 60 * 5  # 5 分钟
@@ -41,13 +42,47 @@ class ConversationStateService:
         value = self.redis.get(f"user:{user_id}:active_chat")
         return int(value) if value else None
 
+    def get_active_chats(self, user_ids) -> dict[int, int | None]:
+        """
+        批量获取当前聊天对象
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids:
+            return {}
+        values = self.redis.mget(
+            [f"user:{user_id}:active_chat" for user_id in user_ids]
+        )
+        return {
+            user_id: int(value) if value else None
+            for user_id, value in zip(user_ids, values)
+        }
+
     # ---------- Typing ----------
 
-    def mark_typing(self, user_id: int, target_user_id: int):
+    def mark_typing(self, user_id: int, target_user_id: int) -> bool:
         """
         标记 user 正在给 target_user 输入
+        返回是否从未输入变为正在输入
+        """
+        key = f"typing:{user_id}:{target_user_id}"
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.set(key, 1, ex=self.TYPING_TTL, nx=True)
+        pipe.expire(key, self.TYPING_TTL)
+        started, _ = pipe.execute()
+        return bool(started)
+
+    def typing_ttl(self, user_id: int, target_user_id: int) -> float:
+        """
+        输入状态的剩余时间（秒），已停止输入时返回 0
+        """
+        ttl = self.redis.pttl(f"typing:{user_id}:{target_user_id}")
+        return max(ttl, 0) / 1000
+
+    def clear_typing(self, user_id: int, target_user_id: int):
+        """
+        清除输入状态（消息已发出）
         """
-        self.redis.set(f"typing:{user_id}:{target_user_id}", 1, ex=self.TYPING_TTL)
+        self.redis.delete(f"typing:{user_id}:{target_user_id}")
 
     def is_typing(self, user_id: int, target_user_id: int) -> bool:
         """
@@ -0,0 +1,67 @@
+import json
+
+
+class OfflineDeliveryService:
+    """
+    离线消息待投递队列
+
+    接收方离线时，消息写入后追加到其待投递流；重新连接时一次读出
+    上次确认之后的全部消息推送给客户端，客户端确认后裁剪，
+    不需要再分页查询聊天记录
+
+    结构设计:
+    Key: delivery:{user_id}  ->  [ {message: json}, ... ]
+    Type: STREAM
+    最多保留 MAX_LEN 条，一段时间无新消息后过期，
+    过期或被截断时客户端仍可通过聊天记录接口补齐
+    """
+
+    MAX_LEN = 500
+    TTL = 60 * 60 * 24 * 7
+
+    def __init__(self, redis):
+        self.redis = redis
+
+    @staticmethod
+    def key(user_id: int) -> str:
+        return f"delivery:{user_id}"
+
+    def enqueue(self, messages: list[tuple[int, dict]]):
+        """
+        追加待投递消息，messages 为 [(接收者ID, 消息数据), ...]
+        """
+        if not messages:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        for receiver_id, data in messages:
+            key = self.key(receiver_id)
+            pipe.xadd(
+                key,
+                {"message": json.dumps(data, ensure_ascii=False)},
+                maxlen=self.MAX_LEN,
+                approximate=True,
+            )
+            pipe.expire(key, self.TTL)
+        pipe.execute()
+
+    def pending(self, user_id: int) -> list[dict]:
+        """
+        未确认的待投递消息，每条带有流中的 deliveryId
+        """
+        entries = self.redis.xrange(self.key(user_id), count=self.MAX_LEN)
+        return [
+            {**json.loads(fields["message"]), "deliveryId": entry_id}
+            for entry_id, fields in entries
+        ]
+
+    def ack(self, user_id: int, delivery_id: str):
+        """
+        确认 delivery_id 及之前的消息已送达，从流中移除
+        """
+        ms, _, seq = delivery_id.partition("-")
+        if not ms.isdigit() or not (seq or "0").isdigit():
+            return
+        # MINID 保留大于等于该 id 的条目，这里从下一条开始保留
+        self.redis.xtrim(
+            self.key(user_id), minid=f"{ms}-{int(seq or 0) + 1}", approximate=False
+        )
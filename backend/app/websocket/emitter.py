@@ -0,0 +1,17 @@
+from flask import current_app
+from flask_socketio import SocketIO
+
+_emitter = None
+
+
+def get_emitter() -> SocketIO:
+    """
+    进程内共享的 Socket.IO 发送端
+
+    Celery 任务、web 进程不持有 websocket 连接，通过消息队列
+    （SOCKETIO_MESSAGE_QUEUE）把事件交给所有 websocket worker 发送
+    """
+    global _emitter
+    if _emitter is None:
+        _emitter = SocketIO(message_queue=current_app.config["SOCKETIO_MESSAGE_QUEUE"])
+    return _emitter
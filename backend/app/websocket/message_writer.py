@@ -0,0 +1,176 @@
+import logging
+import time
+from uuid import uuid4
+
+import eventlet
+from eventlet.queue import Empty, Full, LightQueue
+
+from .. import db
+from ..models import Conversation, Message
+from ..mycelery.notification_task import create_chat_notifications
+from ..utils.time_util import DateUtils
+
+
+class MessageWriter:
+    """
+    聊天消息批量写入
+
+    send_message 事件只把消息放入有界队列并立即返回服务端生成的 uuid
+    （message_accepted），由单个写入协程攒批（最多 batch_size 条或等待
+    flush_interval 秒）后一次多行 INSERT 入库，再推送给接收方，
+    并向发送方确认（message_sent）。
+
+    - 队列满时拒绝写入（背压），由调用方通知发送方稍后重试
+    - 只有一个写入协程，队列先进先出，同一会话的消息按发送顺序入库，id 递增
+    - 每批只占用一次数据库连接，不再每条消息一个协程各占一个连接
+    """
+
+    def __init__(self, app, socketio, conversation, connection, delivery):
+        self.app = app
+        self.socketio = socketio
+        self.conversation = conversation
+        self.connection = connection
+        self.delivery = delivery
+        self.batch_size = app.config["CHAT_WRITE_BATCH_SIZE"]
+        self.flush_interval = app.config["CHAT_WRITE_FLUSH_INTERVAL"]
+        self.queue = LightQueue(app.config["CHAT_WRITE_QUEUE_SIZE"])
+        self._writer = None
+
+    def start(self):
+        if self._writer is None:
+            self._writer = eventlet.spawn(self._run)
+
+    def submit(self, sender_id, receiver_id, content, sid, client_id=None):
+        """
+        放入写入队列，返回消息 uuid；队列已满时返回 None
+
+        client_id 为前端生成的临时 id，原样带回 message_sent / message_failed，
+        供前端找到对应的待发送消息
+        """
+        item = {
+            "uuid": uuid4().hex,
+            "client_id": client_id,
+            "sender_id": sender_id,
+            "receiver_id": receiver_id,
+            "content": content,
+            "timestamp": DateUtils.now_time(),
+            "sid": sid,
+        }
+        try:
+            self.queue.put_nowait(item)
+        except Full:
+            return None
+        return item["uuid"]
+
+    # ---------- 写入协程 ----------
+
+    def _next_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=timeout))
+            except Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self.flush(batch)
+            except Exception as e:
+                logging.error(f"批量写入消息失败: {str(e)}", exc_info=True)
+
+    def flush(self, batch):
+        """写入一批消息并推送
+
+        只有入库失败时才通知发送方 message_failed；入库后推送失败不影响已保存的消息
+        """
+        with self.app.app_context():
+            try:
+                messages = self._insert(batch)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                for item in batch:
+                    self.socketio.emit(
+                        "message_failed",
+                        {"uuid": item["uuid"], "client_id": item["client_id"]},
+                        room=item["sid"],
+                    )
+                raise
+            logging.info(f"批量写入消息 {len(messages)} 条")
+            self._dispatch(batch, messages)
+
+    def _insert(self, batch):
+        # 接收者正在看该聊天时消息直接已读
+        active_chats = self.conversation.get_active_chats(
+            item["receiver_id"] for item in batch
+        )
+        rows = [
+            {
+                "uuid": item["uuid"],
+                "sender_id": item["sender_id"],
+                "receiver_id": item["receiver_id"],
+                "conversation_id": Message.conversation_key(
+                    item["sender_id"], item["receiver_id"]
+                ),
+                "content": item["content"],
+                "timestamp": item["timestamp"],
+                "is_read": active_chats.get(item["receiver_id"]) == item["sender_id"],
+            }
+            for item in batch
+        ]
+        db.session.execute(db.insert(Message), rows)
+
+        # 多行 INSERT 拿不到自增id，按 uuid 查回
+        messages = (
+            Message.query.filter(Message.uuid.in_([row["uuid"] for row in rows]))
+            .order_by(Message.id)
+            .all()
+        )
+        Conversation.record_messages(db.session.connection(), messages)
+        return messages
+
+    def _dispatch(self, batch, messages):
+        items = {item["uuid"]: item for item in batch}
+        try:
+            connected = self.connection.connected_users(
+                message.receiver_id for message in messages
+            )
+        except Exception as e:
+            logging.error(f"查询接收方连接失败: {str(e)}", exc_info=True)
+            connected = set()
+        offline = []
+        for message in messages:
+            data = message.to_json()
+            try:
+                if message.is_read:
+                    self.socketio.emit("new_message", data, to=str(message.receiver_id))
+                else:
+                    # 接收方离线，重新连接时补发
+                    if message.receiver_id not in connected:
+                        offline.append((message.receiver_id, data))
+                    # 异步生成通知（Celery任务）
+                    create_chat_notifications.delay(
+                        message.receiver_id, message.sender_id, message.id
+                    )
+            except Exception as e:
+                logging.error(f"推送消息 {message.uuid} 失败: {str(e)}", exc_info=True)
+            try:
+                item = items[message.uuid]
+                self.socketio.emit(
+                    "message_sent",
+                    {**data, "client_id": item["client_id"]},
+                    room=item["sid"],
+                )
+            except Exception as e:
+                logging.error(f"确认消息 {message.uuid} 失败: {str(e)}", exc_info=True)
+        try:
+            self.delivery.enqueue(offline)
+        except Exception as e:
+            logging.error(f"写入离线待投递消息失败: {str(e)}", exc_info=True)
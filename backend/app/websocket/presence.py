@@ -6,49 +6,61 @@ class UserPresenceService:
     管理用户在线状态与活跃信息
 
     结构设计:
-    Key: online:users  ->    { user_id1, user_id2, ... }
-    Type: SET
-    是否在线的唯一判断
+    Key: presence:last_active  ->  { user_id: last_active }
+    Type: ZSET
+    分数为最后活跃时间（unix_timestamp），是否在线的唯一判断：
+    INACTIVE_TIMEOUT 内活跃过的用户视为在线
 
-
-    Key: user:{user_id}:status  ->
-    Type: HASH
-    Fields:
-    - online       -> 0 / 1
-    - last_active  -> unix_timestamp
+    超时用户由 expire_inactive 按分数区间批量移除，
+    多个进程同时执行时只有抢到 presence:expire:leader 的一个执行
     """
 
+    KEY = "presence:last_active"
+    LEADER_KEY = "presence:expire:leader"
+    # 超过该时间（秒）未活跃视为离线
+    INACTIVE_TIMEOUT = 60
+
     def __init__(self, redis):
         self.redis = redis
 
+    def _online_since(self) -> int:
+        return int(time.time()) - self.INACTIVE_TIMEOUT
+
     # ---------- 状态变更（明确副作用） ----------
 
     def mark_user_online(self, user_id: int):
         """
         将用户标记为在线
         """
-        pipe = self.redis.pipeline()
-        pipe.sadd("online:users", user_id)
-        pipe.hset(
-            f"user:{user_id}:status",
-            mapping={"online": 1, "last_active": int(time.time())},
-        )
-        pipe.execute()
+        self.redis.zadd(self.KEY, {user_id: int(time.time())})
 
     def mark_user_offline(self, user_id: int):
         """
         将用户标记为离线
         """
-        pipe = self.redis.pipeline()
-        pipe.srem("online:users", user_id)
-        pipe.hset(f"user:{user_id}:status", "online", 0)
-        pipe.execute()
+        self.redis.zrem(self.KEY, user_id)
 
     def update_last_active(self, user_id: int):
         """
-        更新用户最后活跃时间
+        更新用户最后活跃时间，超时离线的用户重新上线
         """
-        self.redis.hset(f"user:{user_id}:status", "last_active", int(time.time()))
+        self.redis.zadd(self.KEY, {user_id: int(time.time())})
+
+    def expire_inactive(self, interval: int) -> list[int] | None:
+        """
+        移除超时未活跃的用户
+        interval 为执行间隔（秒），同一间隔内只有一个进程执行
+
+        返回被移除的用户 ID，未抢到执行权时返回 None
+        """
+        if not self.redis.set(self.LEADER_KEY, 1, nx=True, ex=interval):
+            return None
+        cutoff = f"({self._online_since()}"
+        pipe = self.redis.pipeline()
+        pipe.zrangebyscore(self.KEY, "-inf", cutoff)
+        pipe.zremrangebyscore(self.KEY, "-inf", cutoff)
+        user_ids, _ = pipe.execute()
+        return [int(user_id) for user_id in user_ids]
 
     # ---------- 查询（无副作用） ----------
 
@@ -56,22 +68,30 @@ class UserPresenceService:
         """
         判断用户是否在线
         """
-        return self.redis.sismember("online:users", user_id)
+        last_active = self.redis.zscore(self.KEY, user_id)
+        return last_active is not None and last_active >= self._online_since()
 
     def list_online_users(self) -> set[int]:
         """
         获取所有在线用户 ID
         """
-        return {int(user_id) for user_id in self.redis.smembers("online:users")}
+        user_ids = self.redis.zrangebyscore(self.KEY, self._online_since(), "+inf")
+        return {int(user_id) for user_id in user_ids}
 
     def count_online_users(self) -> int:
         """
         获取在线用户数量
         """
-        return self.redis.scard("online:users")
+        return self.redis.zcount(self.KEY, self._online_since(), "+inf")
 
     def get_user_presence(self, user_id: int) -> dict:
         """
         获取用户在线相关状态
         """
-        return self.redis.hgetall(f"user:{user_id}:status") or {}
+        last_active = self.redis.zscore(self.KEY, user_id)
+        if last_active is None:
+            return {"online": 0}
+        return {
+            "online": int(last_active >= self._online_since()),
+            "last_active": int(last_active),
+        }
@@ -0,0 +1,79 @@
+import time
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class SocketSession:
+    """连接建立时验证得到的用户身份"""
+
+    user_id: int
+    username: str
+    # token 签发时间、过期时间（unix_timestamp），过期时间为 None 表示不过期
+    issued_at: int
+    expires_at: int | None = None
+
+    def is_expired(self, now: float | None = None) -> bool:
+        if self.expires_at is None:
+            return False
+        return (now or time.time()) >= self.expires_at
+
+
+class SocketSessionService:
+    """
+    管理 websocket 连接的身份
+
+    连接时验证一次 token 并查询用户，之后的事件直接读取本进程内的会话，
+    不再解析 token、查询数据库
+
+    结构设计:
+    本进程内: { sid: SocketSession }
+
+    Key: ws:revoked:{user_id}  ->  unix_timestamp
+    Type: STRING
+    该时刻之前签发的 token 不能再建立连接；吊销时已建立的连接由
+    notification_task.revoke_user_sockets 通过消息队列强制断开
+    """
+
+    # 吊销记录保留时间，超过后旧 token 可以重新连接
+    REVOKED_TTL = 60 * 60 * 24 * 30
+
+    def __init__(self, redis):
+        self.redis = redis
+        self._sessions = {}
+
+    @staticmethod
+    def revoked_key(user_id: int) -> str:
+        return f"ws:revoked:{user_id}"
+
+    def revoke_user(self, user_id: int):
+        """
+        吊销用户此前签发的 token
+        """
+        self.redis.set(self.revoked_key(user_id), int(time.time()), ex=self.REVOKED_TTL)
+
+    def is_revoked(self, session: SocketSession) -> bool:
+        revoked_at = self.redis.get(self.revoked_key(session.user_id))
+        return revoked_at is not None and session.issued_at <= int(revoked_at)
+
+    # ---------- 会话 ----------
+
+    def open(self, sid: str, session: SocketSession):
+        """
+        保存连接的身份
+        """
+        self._sessions[sid] = session
+
+    def get(self, sid: str) -> SocketSession | None:
+        """
+        获取连接的身份，不存在或 token 已过期时返回 None
+        """
+        session = self._sessions.get(sid)
+        if session is None or session.is_expired():
+            return None
+        return session
+
+    def close(self, sid: str) -> SocketSession | None:
+        """
+        移除连接的身份
+        """
+        return self._sessions.pop(sid, None)
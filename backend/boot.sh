@@ -15,6 +15,11 @@ while true; do
     sleep 5
 done
 
+# Prometheus 多进程指标目录，各进程的指标写入该目录，由 /metrics 汇总
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
 # 启动 Celery worker 和 beat
 celery -A app.make_celery worker --loglevel INFO -P eventlet --logfile=logs/celery_worker.log &
 CELERY_WORKER_PID=$!
@@ -30,7 +35,8 @@ MAIN_APP_PID=$!
 sleep 3
 
 # WebSocket 服务
-gunicorn -b :5001 -w 1 --worker-class eventlet --access-logfile - --error-logfile - flasky_socketio:app &
+# 仅使用 websocket 传输，无需粘性会话；进程间推送经由 SOCKETIO_MESSAGE_QUEUE
+gunicorn -b :5001 -w ${WS_WORKERS:-1} --worker-class eventlet --access-logfile - --error-logfile - flasky_socketio:app &
 WEBSOCKET_PID=$!
 
 # 等待任意子进程退出
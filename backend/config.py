@@ -26,9 +26,18 @@ class Config:
     SSL_REDIRECT = False
 
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_RECORD_QUERIES = True
+    # flask_sqlalchemy 记录每个请求的全部语句，由 SQL 统计（api/hook.py）代替
+    SQLALCHEMY_RECORD_QUERIES = (
+        os.environ.get("SQLALCHEMY_RECORD_QUERIES", "false").lower() == "true"
+    )
     SQLALCHEMY_ENGINE_OPTIONS = {"pool_size": 6, "max_overflow": 8}
 
+    # 聊天消息写入队列长度，队满时拒绝发送
+    CHAT_WRITE_QUEUE_SIZE = 1000
+    # 聊天消息每批最多写入条数、攒批等待时间（秒）
+    CHAT_WRITE_BATCH_SIZE = 100
+    CHAT_WRITE_FLUSH_INTERVAL = 0.01
+
     FLASKY_POSTS_PER_PAGE = 10
     FLASKY_FOLLOWERS_PER_PAGE = 15
     # 评论分页大小
@@ -38,8 +47,48 @@ class Config:
     FLASKY_LOG_PER_PAGE = 15
     # 聊天记录分页大小
     FLASKY_CHAT_PER_PAGE = 15
+    # 会话列表分页大小
+    FLASKY_CONVERSATIONS_PER_PAGE = 20
+    # 通知分页大小
+    FLASKY_NOTIFICATIONS_PER_PAGE = 50
+    # 点赞、新文章通知的聚合时间窗口（秒），窗口内同类通知合并为一条
+    NOTIFICATION_AGGREGATE_WINDOW = 60 * 60
+    # 聚合通知更新后的推送防抖时间（秒）
+    NOTIFICATION_EMIT_DEBOUNCE = 5
+    # 新文章通知每批处理的粉丝数
+    NOTIFICATION_FAN_OUT_CHUNK = 1000
 
     FLASKY_SLOW_DB_QUERY_TIME = 0.5
+    # 记录请求全部语句的抽样比例；总耗时（秒）超过 SQL_PROFILE_SLOW_REQUEST 的请求也记录
+    SQL_PROFILE_SAMPLE_RATE = float(os.environ.get("SQL_PROFILE_SAMPLE_RATE", "0.01"))
+    SQL_PROFILE_SLOW_REQUEST = 1.0
+    # 允许抓取 /metrics 的网段，逗号分隔，默认本机和内网
+    METRICS_ALLOWED_NETWORKS = os.environ.get(
+        "METRICS_ALLOWED_NETWORKS",
+        "127.0.0.0/8,::1/128,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16",
+    ).split(",")
+
+    # 最近活跃时间允许的误差（秒）：同一进程内该时间内的重复请求不再记录
+    LAST_SEEN_TOLERANCE = 60
+    # 最近活跃时间从 Redis 批量写入数据库的间隔（秒）
+    LAST_SEEN_FLUSH_INTERVAL = 60
+    # 清理超时在线用户的间隔（秒）
+    PRESENCE_EXPIRE_INTERVAL = 30
+    # websocket worker 心跳间隔（秒），超过 WS_WORKER_TIMEOUT 未心跳视为已退出
+    WS_WORKER_HEARTBEAT = 10
+    WS_WORKER_TIMEOUT = 60
+    # 同一访客该时间（秒）内重复访问首页只记录一次日志
+    LOG_VISIT_INTERVAL = 300
+    # 访客日志从 Redis 批量写入数据库的间隔（秒）
+    LOG_FLUSH_INTERVAL = 5
+    # 访客日志保留天数，按小时的汇总保留天数，按天的汇总一直保留
+    LOG_RETENTION_DAYS = 30
+    LOG_HOURLY_ROLLUP_RETENTION_DAYS = 90
+    # 离线 IP 库（MaxMind DB 格式），文件不存在时不记录访客地理位置
+    GEOIP_DATABASE = os.getenv("GEOIP_DATABASE") or os.path.join(
+        basedir, "data", "GeoLite2-City.mmdb"
+    )
+    GEOIP_LOCALE = "en"
 
     # github工作流上redis容器不使用密码
     redis_pass = "" if os.getenv("FLASK_CONFIG") == "testing" else ":1234@"
@@ -91,6 +140,8 @@ class TestingConfig(Config):
     DEBUG = True
     # 关掉flask_limiter限流
     RATELIMIT_ENABLED = False
+    # 每次请求都记录最近活跃时间
+    LAST_SEEN_TOLERANCE = 0
     # mysql
     SQLALCHEMY_DATABASE_URI = (
         os.environ.get("TEST_DATABASE_URL")
@@ -0,0 +1,9 @@
+import os
+
+
+def child_exit(server, worker):
+    # 多进程指标：移除已退出 worker 的 livesum 指标
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
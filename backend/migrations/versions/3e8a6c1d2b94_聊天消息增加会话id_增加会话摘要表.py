@@ -0,0 +1,100 @@
+"""聊天消息增加会话id，增加会话摘要表
+
+Revision ID: 3e8a6c1d2b94
+Revises: 7b3d9e4a1f60
+Create Date: 2026-10-18 15:21:08.604713
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = "3e8a6c1d2b94"
+down_revision = "7b3d9e4a1f60"
+
+import sqlalchemy as sa
+from alembic import op
+
+
+def upgrade():
+    op.add_column(
+        "messages", sa.Column("conversation_id", sa.String(length=32), nullable=True)
+    )
+    # 会话id：较小用户id_较大用户id
+    op.execute("""
+        UPDATE messages SET conversation_id = CASE
+            WHEN sender_id < receiver_id THEN CONCAT(sender_id, '_', receiver_id)
+            ELSE CONCAT(receiver_id, '_', sender_id)
+        END
+        WHERE sender_id IS NOT NULL AND receiver_id IS NOT NULL
+    """)
+    op.create_index(
+        "ix_messages_conversation_id",
+        "messages",
+        ["conversation_id", "id"],
+        unique=False,
+    )
+    op.drop_index("ix_messages_sender_receiver_timestamp_id", table_name="messages")
+
+    op.create_table(
+        "conversations",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("peer_id", sa.Integer(), nullable=False),
+        sa.Column("last_message_id", sa.Integer(), nullable=True),
+        sa.Column("last_sender_id", sa.Integer(), nullable=True),
+        sa.Column("last_content", sa.String(length=100), nullable=True),
+        sa.Column("last_message_at", sa.DateTime(), nullable=True),
+        sa.Column("unread_count", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["peer_id"], ["users.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("user_id", "peer_id"),
+    )
+    op.create_index(
+        "ix_conversations_user_last_message",
+        "conversations",
+        ["user_id", "last_message_id"],
+        unique=False,
+    )
+
+    # 按现有消息回填会话摘要：双方各一行，未读数只统计收到的消息
+    op.execute("""
+        INSERT INTO conversations (user_id, peer_id, last_message_id, unread_count)
+        SELECT user_id, peer_id, MAX(id), SUM(unread) FROM (
+            SELECT sender_id AS user_id, receiver_id AS peer_id, id, 0 AS unread
+            FROM messages
+            WHERE sender_id IS NOT NULL AND receiver_id IS NOT NULL
+            UNION ALL
+            SELECT receiver_id, sender_id, id,
+                CASE WHEN is_read THEN 0 ELSE 1 END
+            FROM messages
+            WHERE sender_id IS NOT NULL AND receiver_id IS NOT NULL
+                AND receiver_id != sender_id
+        ) AS sides
+        GROUP BY user_id, peer_id
+    """)
+    op.execute("""
+        UPDATE conversations SET
+            last_sender_id = (
+                SELECT sender_id FROM messages
+                WHERE messages.id = conversations.last_message_id
+            ),
+            last_content = (
+                SELECT SUBSTRING(content, 1, 100) FROM messages
+                WHERE messages.id = conversations.last_message_id
+            ),
+            last_message_at = (
+                SELECT timestamp FROM messages
+                WHERE messages.id = conversations.last_message_id
+            )
+    """)
+
+
+def downgrade():
+    op.drop_index("ix_conversations_user_last_message", table_name="conversations")
+    op.drop_table("conversations")
+    op.create_index(
+        "ix_messages_sender_receiver_timestamp_id",
+        "messages",
+        ["sender_id", "receiver_id", "timestamp", "id"],
+        unique=False,
+    )
+    op.drop_index("ix_messages_conversation_id", table_name="messages")
+    op.drop_column("messages", "conversation_id")
@@ -0,0 +1,50 @@
+"""增加访客日志汇总表
+
+Revision ID: 4f2a8c6d1e73
+Revises: 9d41f7b0c3e5
+Create Date: 2026-10-18 17:02:31.518264
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = "4f2a8c6d1e73"
+down_revision = "9d41f7b0c3e5"
+
+import sqlalchemy as sa
+from alembic import op
+
+
+def upgrade():
+    op.create_table(
+        "log_rollups",
+        sa.Column("period", sa.String(length=8), nullable=False),
+        sa.Column("bucket", sa.DateTime(), nullable=False),
+        sa.Column("dimension", sa.String(length=16), nullable=False),
+        sa.Column("value", sa.String(length=50), nullable=False),
+        sa.Column("visits", sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint("period", "bucket", "dimension", "value"),
+    )
+
+    # 按现有日志回填汇总
+    bucket_formats = {"hour": "%Y-%m-%d %H:00:00", "day": "%Y-%m-%d 00:00:00"}
+    dimensions = {
+        "all": "''",
+        "country": "COALESCE(country, '')",
+        "browser": "COALESCE(browser, '')",
+        "os": "COALESCE(os, '')",
+        "device": "COALESCE(device, '')",
+    }
+    for period, bucket_format in bucket_formats.items():
+        for dimension, value in dimensions.items():
+            op.execute(f"""
+                INSERT INTO log_rollups (period, bucket, dimension, value, visits)
+                SELECT '{period}', DATE_FORMAT(operate_time, '{bucket_format}'),
+                    '{dimension}', {value}, COUNT(*)
+                FROM log
+                WHERE operate_time IS NOT NULL
+                GROUP BY DATE_FORMAT(operate_time, '{bucket_format}'), {value}
+            """)
+
+
+def downgrade():
+    op.drop_table("log_rollups")
@@ -0,0 +1,26 @@
+"""通知表增加接收者、已读状态、时间联合索引
+
+Revision ID: 5c1e8f2d9a37
+Revises: a2679c45ac98
+Create Date: 2026-10-18 13:26:09.318402
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = "5c1e8f2d9a37"
+down_revision = "a2679c45ac98"
+
+from alembic import op
+
+
+def upgrade():
+    op.create_index(
+        "ix_notifications_receiver_read_created",
+        "notifications",
+        ["receiver_id", "is_read", "created_at"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index("ix_notifications_receiver_read_created", table_name="notifications")
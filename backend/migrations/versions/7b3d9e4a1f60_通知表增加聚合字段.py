@@ -0,0 +1,28 @@
+"""通知表增加聚合字段
+
+Revision ID: 7b3d9e4a1f60
+Revises: 5c1e8f2d9a37
+Create Date: 2026-10-18 14:02:51.736204
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = "7b3d9e4a1f60"
+down_revision = "5c1e8f2d9a37"
+
+import sqlalchemy as sa
+from alembic import op
+
+
+def upgrade():
+    with op.batch_alter_table("notifications", schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column("actor_count", sa.Integer(), nullable=True, server_default="1")
+        )
+        batch_op.add_column(sa.Column("latest_actors", sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("notifications", schema=None) as batch_op:
+        batch_op.drop_column("latest_actors")
+        batch_op.drop_column("actor_count")
@@ -0,0 +1,26 @@
+"""关注表增加被关注者、关注者联合索引
+
+Revision ID: 7b3e9d2a5c14
+Revises: 4f2a8c6d1e73
+Create Date: 2026-10-18 21:14:52.603117
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = "7b3e9d2a5c14"
+down_revision = "4f2a8c6d1e73"
+
+from alembic import op
+
+
+def upgrade():
+    op.create_index(
+        "ix_follows_followed_follower",
+        "follows",
+        ["followed_id", "follower_id"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index("ix_follows_followed_follower", table_name="follows")
@@ -0,0 +1,24 @@
+"""聊天消息增加uuid
+
+Revision ID: 9d41f7b0c3e5
+Revises: 3e8a6c1d2b94
+Create Date: 2026-10-18 16:07:44.190382
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = "9d41f7b0c3e5"
+down_revision = "3e8a6c1d2b94"
+
+import sqlalchemy as sa
+from alembic import op
+
+
+def upgrade():
+    op.add_column("messages", sa.Column("uuid", sa.String(length=32), nullable=True))
+    op.create_index("ix_messages_uuid", "messages", ["uuid"], unique=True)
+
+
+def downgrade():
+    op.drop_index("ix_messages_uuid", table_name="messages")
+    op.drop_column("messages", "uuid")
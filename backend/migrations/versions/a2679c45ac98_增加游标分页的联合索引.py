@@ -0,0 +1,44 @@
+"""增加游标分页的联合索引
+
+Revision ID: a2679c45ac98
+Revises: aaab650db486
+Create Date: 2026-10-18 11:03:47.582914
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = "a2679c45ac98"
+down_revision = "aaab650db486"
+
+from alembic import op
+
+
+def upgrade():
+    op.create_index(
+        "ix_posts_deleted_timestamp_id",
+        "posts",
+        ["deleted", "timestamp", "id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_comments_post_root_timestamp_id",
+        "comments",
+        ["post_id", "root_comment_id", "timestamp", "id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_messages_sender_receiver_timestamp_id",
+        "messages",
+        ["sender_id", "receiver_id", "timestamp", "id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_log_operate_time_id", "log", ["operate_time", "id"], unique=False
+    )
+
+
+def downgrade():
+    op.drop_index("ix_log_operate_time_id", table_name="log")
+    op.drop_index("ix_messages_sender_receiver_timestamp_id", table_name="messages")
+    op.drop_index("ix_comments_post_root_timestamp_id", table_name="comments")
+    op.drop_index("ix_posts_deleted_timestamp_id", table_name="posts")
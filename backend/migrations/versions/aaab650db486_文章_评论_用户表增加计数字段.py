@@ -0,0 +1,83 @@
+"""文章、评论、用户表增加计数字段
+
+Revision ID: aaab650db486
+Revises: 834d2f86ae28
+Create Date: 2026-10-18 10:12:31.215437
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = "aaab650db486"
+down_revision = "834d2f86ae28"
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column(
+        "posts", sa.Column("like_count", sa.Integer(), server_default="0", nullable=True)
+    )
+    op.add_column(
+        "posts",
+        sa.Column("comment_count", sa.Integer(), server_default="0", nullable=True),
+    )
+    op.add_column(
+        "comments",
+        sa.Column("like_count", sa.Integer(), server_default="0", nullable=True),
+    )
+    op.add_column(
+        "users", sa.Column("post_count", sa.Integer(), server_default="0", nullable=True)
+    )
+    op.add_column(
+        "users",
+        sa.Column("followers_count", sa.Integer(), server_default="0", nullable=True),
+    )
+    op.add_column(
+        "users",
+        sa.Column("followed_count", sa.Integer(), server_default="0", nullable=True),
+    )
+    op.add_column(
+        "users",
+        sa.Column("praised_count", sa.Integer(), server_default="0", nullable=True),
+    )
+
+    # 按现有数据回填
+    op.execute("""
+        UPDATE posts SET
+            like_count = (SELECT COUNT(*) FROM praise WHERE praise.post_id = posts.id),
+            comment_count = (SELECT COUNT(*) FROM comments WHERE comments.post_id = posts.id)
+    """)
+    op.execute("""
+        UPDATE comments SET
+            like_count = (SELECT COUNT(*) FROM praise WHERE praise.comment_id = comments.id)
+    """)
+    op.execute("""
+        UPDATE users SET
+            post_count = (SELECT COUNT(*) FROM posts WHERE posts.author_id = users.id),
+            followers_count = (
+                SELECT COUNT(*) FROM follows
+                WHERE follows.followed_id = users.id AND follows.follower_id != users.id
+            ),
+            followed_count = (
+                SELECT COUNT(*) FROM follows
+                WHERE follows.follower_id = users.id AND follows.followed_id != users.id
+            ),
+            praised_count = (
+                SELECT COUNT(*) FROM praise JOIN posts ON praise.post_id = posts.id
+                WHERE posts.author_id = users.id
+            ) + (
+                SELECT COUNT(*) FROM praise JOIN comments ON praise.comment_id = comments.id
+                WHERE comments.author_id = users.id
+            )
+    """)
+
+
+def downgrade():
+    op.drop_column("users", "praised_count")
+    op.drop_column("users", "followed_count")
+    op.drop_column("users", "followers_count")
+    op.drop_column("users", "post_count")
+    op.drop_column("comments", "like_count")
+    op.drop_column("posts", "comment_count")
+    op.drop_column("posts", "like_count")
@@ -0,0 +1,39 @@
+"""通知表增加更新时间、新文章id列表和聚合键
+
+Revision ID: c5a1e7f3b920
+Revises: 7b3e9d2a5c14
+Create Date: 2026-10-18 22:03:17.482906
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = "c5a1e7f3b920"
+down_revision = "7b3e9d2a5c14"
+
+import sqlalchemy as sa
+from alembic import op
+
+
+def upgrade():
+    with op.batch_alter_table("notifications", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("updated_at", sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column("post_ids", sa.JSON(), nullable=True))
+        batch_op.add_column(sa.Column("open_key", sa.String(length=64), nullable=True))
+        batch_op.create_index("ix_notifications_open_key", ["open_key"], unique=True)
+        batch_op.create_index(
+            "ix_notifications_receiver_updated",
+            ["receiver_id", "updated_at", "id"],
+            unique=False,
+        )
+
+    # 已有通知的更新时间取创建时间；不回填聚合键，之后的事件新建通知
+    op.execute("UPDATE notifications SET updated_at = created_at")
+
+
+def downgrade():
+    with op.batch_alter_table("notifications", schema=None) as batch_op:
+        batch_op.drop_index("ix_notifications_receiver_updated")
+        batch_op.drop_index("ix_notifications_open_key")
+        batch_op.drop_column("open_key")
+        batch_op.drop_column("post_ids")
+        batch_op.drop_column("updated_at")
@@ -1,6 +1,6 @@
 import pytest
-from app import create_app, db
-from app.models import Role
+from app import cache, create_app, db, redis
+from app.models import Principal, Role
 
 
 @pytest.fixture
@@ -15,6 +15,10 @@ def app():
     with app.app_context():
         db.create_all()
         Role.insert_roles()
+        # 每个测试的数据库都是新建的，id 会复用，清掉上个测试留下的缓存和时间线
+        cache.clear()
+        redis.flushdb()
+        Principal.clear_cache()
         yield app
         db.session.remove()
         db.drop_all()
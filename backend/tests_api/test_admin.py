@@ -0,0 +1,48 @@
+from app import db
+from app.models import Role, User
+from app.utils.sql_profiler import fingerprint
+
+
+class TestAdminCase:
+    pre_fix = "/api/v1"
+
+    def login_admin(self, auth):
+        admin = auth()
+        admin.register_admin()
+        user = User.query.filter_by(username="admin").first()
+        user.role = Role.query.filter_by(name="Administrator").first()
+        db.session.commit()
+        admin.login("admin", "admin")
+        return admin
+
+    def test_sql_fingerprint(self):
+        """测试慢查询指纹：字面量、占位符、IN 列表归一化"""
+        assert fingerprint(
+            "SELECT * FROM users\n WHERE id IN (%(id_1)s, %(id_2)s) AND name = 'a'"
+        ) == fingerprint("SELECT * FROM users WHERE id IN (3) AND name = 'bob'")
+        assert fingerprint("SELECT 1 LIMIT 10") == "SELECT ? LIMIT ?"
+
+    def test_sql_profile(self, app, client, auth):
+        """测试按接口汇总 SQL 统计，慢查询按指纹归并"""
+        app.config["SQL_PROFILE_SAMPLE_RATE"] = 1
+        app.config["FLASKY_SLOW_DB_QUERY_TIME"] = 0
+        admin = self.login_admin(auth)
+        client.delete(self.pre_fix + "/admin/sql-profile", headers=admin.get_headers())
+        for _ in range(3):
+            client.get(self.pre_fix + "/posts?page=2")
+
+        r = client.get(self.pre_fix + "/admin/sql-profile", headers=admin.get_headers())
+        assert r.json.get("code") == 200
+        data = r.json.get("data")
+        posts = next(e for e in data["endpoints"] if e["endpoint"] == "api.post_group")
+        assert posts["requests"] == 3
+        assert posts["avgQueries"] > 0
+        assert posts["p50"] is not None
+        assert data["slowQueries"]
+        assert all(q["count"] >= 1 for q in data["slowQueries"])
+
+        client.delete(self.pre_fix + "/admin/sql-profile", headers=admin.get_headers())
+        r = client.get(self.pre_fix + "/admin/sql-profile", headers=admin.get_headers())
+        assert all(
+            e["endpoint"] != "api.post_group" for e in r.json["data"]["endpoints"]
+        )
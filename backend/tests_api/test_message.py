@@ -0,0 +1,177 @@
+import pytest
+from app import db
+from app.models import Conversation, Message
+
+
+class TestMessageCase:
+    """测试聊天记录和会话摘要"""
+
+    pre_fix = "/api/v1"
+
+    def test_history_and_conversation_summary(self, client, auth):
+        """测试聊天记录按会话查询，会话摘要随消息更新"""
+        auth_a = auth()
+        auth_a.register(username="alice", password="password")
+        auth_a.login(username="alice", password="password")
+        auth_b = auth()
+        auth_b.register(username="bob", password="password")
+        auth_b.login(username="bob", password="password")
+        auth_c = auth()
+        auth_c.register(username="carol", password="password")
+
+        db.session.add_all(
+            [
+                Message(sender_id=1, receiver_id=2, content="你好"),
+                Message(sender_id=2, receiver_id=1, content="你好呀"),
+                Message(sender_id=1, receiver_id=2, content="在吗"),
+                Message(sender_id=1, receiver_id=3, content="别的会话"),
+            ]
+        )
+        db.session.commit()
+        assert Message.query.first().conversation_id == "1_2"
+
+        bob = db.session.get(Conversation, (2, 1))
+        assert bob.unread_count == 2
+        assert bob.last_content == "在吗"
+        assert db.session.get(Conversation, (1, 2)).unread_count == 1
+
+        r = client.get(
+            self.pre_fix + "/conversations/1/messages?cursor=",
+            headers=auth_b.get_headers(),
+        )
+        data = r.get_json()
+        assert [m.get("content") for m in data.get("data")] == ["在吗", "你好呀", "你好"]
+
+        # 标记部分消息已读，会话未读数重新统计
+        r = client.post(
+            self.pre_fix + "/conversations/1/messages",
+            headers=auth_b.get_headers(),
+            json={"ids": [1]},
+        )
+        assert r.get_json().get("code") == 200
+        db.session.expire_all()
+        assert db.session.get(Conversation, (2, 1)).unread_count == 1
+
+        Conversation.mark_read(2, 1)
+        db.session.commit()
+        assert db.session.get(Conversation, (2, 1)).unread_count == 0
+        assert Message.query.filter_by(receiver_id=2, is_read=False).count() == 0
+
+    def test_conversation_list(self, app, client, auth):
+        """测试会话列表按最近消息排序并分页"""
+        app.config["FLASKY_CONVERSATIONS_PER_PAGE"] = 1
+        auth_a = auth()
+        auth_a.register(username="alice", password="password")
+        auth_a.login(username="alice", password="password")
+        for username in ["bob", "carol"]:
+            auth().register(username=username, password="password")
+
+        db.session.add_all(
+            [
+                Message(sender_id=2, receiver_id=1, content="来自bob"),
+                Message(sender_id=3, receiver_id=1, content="来自carol"),
+                Message(sender_id=1, receiver_id=2, content="回复bob"),
+            ]
+        )
+        db.session.commit()
+
+        r = client.get(self.pre_fix + "/conversations", headers=auth_a.get_headers())
+        data = r.get_json()
+        first = data.get("data")[0]
+        assert first.get("peer").get("username") == "bob"
+        assert first.get("lastMessage").get("content") == "回复bob"
+        assert first.get("unreadCount") == 1
+
+        r = client.get(
+            self.pre_fix + f"/conversations?cursor={data.get('next_cursor')}",
+            headers=auth_a.get_headers(),
+        )
+        data = r.get_json()
+        assert [c.get("peer").get("username") for c in data.get("data")] == ["carol"]
+        assert data.get("next_cursor") is None
+
+    def test_message_writer_batch(self, app, client, auth, monkeypatch):
+        """测试消息批量写入：按提交顺序入库，更新会话摘要并确认发送方"""
+        from app import redis
+        from app.websocket import (
+            ConversationStateService,
+            OfflineDeliveryService,
+            WSConnectionManager,
+        )
+        from app.websocket.message_writer import MessageWriter
+
+        class Recorder:
+            def __init__(self):
+                self.events = []
+
+            def emit(self, event, data, **kwargs):
+                self.events.append((event, data, kwargs))
+
+        for username in ["alice", "bob"]:
+            auth().register(username=username, password="password")
+        app.config["CHAT_WRITE_QUEUE_SIZE"] = 2
+        socketio = Recorder()
+        conversation = ConversationStateService(redis)
+        delivery = OfflineDeliveryService(redis)
+        writer = MessageWriter(
+            app, socketio, conversation, WSConnectionManager(redis), delivery
+        )
+
+        first = writer.submit(1, 2, "第一条", "sid-a", "c1")
+        second = writer.submit(1, 2, "第二条", "sid-a", "c2")
+        # 队列已满
+        assert writer.submit(1, 2, "第三条", "sid-a") is None
+
+        writer.flush(writer._next_batch())
+        messages = Message.query.order_by(Message.id).all()
+        assert [m.uuid for m in messages] == [first, second]
+        assert [m.conversation_id for m in messages] == ["1_2", "1_2"]
+        assert db.session.get(Conversation, (2, 1)).unread_count == 2
+        sent = [e[1] for e in socketio.events if e[0] == "message_sent"]
+        assert [(m["uuid"], m["client_id"]) for m in sent] == [
+            (first, "c1"),
+            (second, "c2"),
+        ]
+
+        # 接收方离线，消息进入待投递队列，确认后移除
+        pending = delivery.pending(2)
+        assert [m["uuid"] for m in pending] == [first, second]
+        delivery.ack(2, pending[0]["deliveryId"])
+        assert [m["uuid"] for m in delivery.pending(2)] == [second]
+        delivery.ack(2, pending[1]["deliveryId"])
+        assert delivery.pending(2) == []
+
+        # 接收方正在看该聊天时直接已读并推送
+        conversation.set_active_chat(2, 1)
+        writer.submit(1, 2, "第三条", "sid-a")
+        writer.flush(writer._next_batch())
+        assert [e[0] for e in socketio.events][-2:] == ["new_message", "message_sent"]
+        db.session.expire_all()
+        assert db.session.get(Conversation, (2, 1)).unread_count == 2
+        assert db.session.get(Conversation, (2, 1)).last_content == "第三条"
+
+        # 入库后推送失败不通知发送方失败，其余消息照常确认
+        def broker_down(*args):
+            raise RuntimeError("broker down")
+
+        conversation.clear_active_chat(2)
+        monkeypatch.setattr(
+            "app.websocket.message_writer.create_chat_notifications.delay",
+            broker_down,
+        )
+        socketio.events.clear()
+        uuids = [writer.submit(1, 2, "第四条", "sid-a")]
+        uuids.append(writer.submit(1, 2, "第五条", "sid-a"))
+        writer.flush(writer._next_batch())
+        assert Message.query.filter(Message.uuid.in_(uuids)).count() == 2
+        assert [e[0] for e in socketio.events] == ["message_sent", "message_sent"]
+
+        # 入库失败时按 uuid 和 client_id 通知发送方
+        monkeypatch.setattr(writer, "_insert", broker_down)
+        socketio.events.clear()
+        uuid = writer.submit(1, 2, "第六条", "sid-a", "c6")
+        with pytest.raises(RuntimeError):
+            writer.flush(writer._next_batch())
+        assert socketio.events == [
+            ("message_failed", {"uuid": uuid, "client_id": "c6"}, {"room": "sid-a"})
+        ]
@@ -0,0 +1,35 @@
+from app import redis
+from app.websocket import WSConnectionManager
+
+
+class TestMetricsCase:
+    def test_metrics(self, client):
+        """测试 /metrics 包含请求、连接池、Redis、Celery 队列和 websocket 连接数"""
+        connection = WSConnectionManager(redis, worker_id="host:1")
+        connection.heartbeat()
+        connection.bind_socket_to_user(1, "sid-a")
+        client.get("/api/v1/posts")
+
+        r = client.get("/metrics")
+        assert r.status_code == 200
+        text = r.get_data(as_text=True)
+        assert (
+            'http_request_duration_seconds_count{blueprint="api",'
+            'endpoint="api.post_group",method="GET",status="200"}'
+        ) in text
+        assert "db_pool_checkouts_total" in text
+        assert 'redis_command_duration_seconds_count{command="SET"}' in text
+        assert 'celery_queue_length{queue="celery"}' in text
+        assert 'socketio_connected_sockets{worker="host:1"} 1.0' in text
+
+    def test_metrics_restricted(self, client):
+        """测试内网以外的地址不能访问 /metrics"""
+        r = client.get("/metrics", environ_base={"REMOTE_ADDR": "203.0.113.7"})
+        assert r.status_code == 403
+        # 经反向代理转发的外部请求按 ProxyFix 取得的地址判断
+        r = client.get(
+            "/metrics",
+            headers={"X-Forwarded-For": "203.0.113.7"},
+            environ_base={"REMOTE_ADDR": "172.18.0.2"},
+        )
+        assert r.status_code == 403
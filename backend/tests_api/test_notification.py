@@ -174,3 +174,275 @@ class TestNotificationCase:
             self.pre_fix + "/notifications", headers=auth_a.get_headers()
         )
         assert r_final.get_json().get("data")[-1].get("isRead") is True
+
+    def test_notification_pages_and_unread(self, client, auth):
+        """测试通知分页、增量获取和未读数"""
+        auth_author = auth()
+        auth_author.register(username="author3", password="password")
+        auth_author.login(username="author3", password="password")
+        r = client.post(
+            self.pre_fix + "/posts",
+            headers=auth_author.get_headers(),
+            json={"content": "测试文章内容", "type": "text", "images": []},
+        )
+        post_id = r.get_json().get("data")[0].get("id")
+
+        auth_commenter = auth()
+        auth_commenter.register(username="commenter3", password="password")
+        auth_commenter.login(username="commenter3", password="password")
+
+        def comment():
+            client.post(
+                self.pre_fix + f"/posts/{post_id}/comments",
+                headers=auth_commenter.get_headers(),
+                json={"body": "评论", "directParentId": None, "at": []},
+            )
+
+        comment()
+        r = client.get(
+            self.pre_fix + "/notifications", headers=auth_author.get_headers()
+        )
+        assert r.get_json().get("unread") == 1
+        # 未读数已缓存，之后随新通知累加
+        comment()
+        comment()
+
+        r = client.get(
+            self.pre_fix + "/notifications?per_page=2",
+            headers=auth_author.get_headers(),
+        )
+        data = r.get_json()
+        assert data.get("unread") == 3
+        assert len(data.get("data")) == 2
+        first_id = data.get("data")[0].get("id")
+        r = client.get(
+            self.pre_fix
+            + f"/notifications?per_page=2&cursor={data.get('next_cursor')}",
+            headers=auth_author.get_headers(),
+        )
+        assert len(r.get_json().get("data")) == 1
+        assert r.get_json().get("next_cursor") is None
+
+        # 增量获取，超过一页时按 id 升序分批取完
+        comment()
+        comment()
+        r = client.get(
+            self.pre_fix + f"/notifications?since_id={first_id}&per_page=1",
+            headers=auth_author.get_headers(),
+        )
+        data = r.get_json()
+        assert data.get("has_more") is True
+        new_ids = [item.get("id") for item in data.get("data")]
+        assert data.get("since_id") == new_ids[-1]
+        r = client.get(
+            self.pre_fix + f"/notifications?since_id={data.get('since_id')}",
+            headers=auth_author.get_headers(),
+        )
+        data = r.get_json()
+        assert data.get("has_more") is False
+        new_ids += [item.get("id") for item in data.get("data")]
+        assert len(new_ids) == 2 and new_ids == sorted(new_ids)
+        assert new_ids[0] > first_id
+        assert data.get("unread") == 5
+
+        # 标记已读，重复标记不重复扣减
+        r = client.patch(
+            self.pre_fix + "/notifications",
+            headers=auth_author.get_headers(),
+            json={"ids": [first_id]},
+        )
+        assert r.get_json().get("unread") == 4
+        r = client.patch(
+            self.pre_fix + "/notifications",
+            headers=auth_author.get_headers(),
+            json={"ids": [first_id]},
+        )
+        assert r.get_json().get("unread") == 4
+
+    def test_like_notification_aggregated(self, client, auth):
+        """测试同一文章的点赞通知在时间窗口内聚合为一条"""
+        auth_author = auth()
+        auth_author.register(username="author4", password="password")
+        auth_author.login(username="author4", password="password")
+        r = client.post(
+            self.pre_fix + "/posts",
+            headers=auth_author.get_headers(),
+            json={"content": "测试文章内容", "type": "text", "images": []},
+        )
+        post_id = r.get_json().get("data")[0].get("id")
+
+        for username in ["liker4a", "liker4b"]:
+            auth_liker = auth()
+            auth_liker.register(username=username, password="password")
+            auth_liker.login(username=username, password="password")
+            r = client.post(
+                self.pre_fix + f"/posts/{post_id}/likes",
+                headers=auth_liker.get_headers(),
+            )
+            assert r.get_json().get("code") == 200
+
+        r = client.get(
+            self.pre_fix + "/notifications", headers=auth_author.get_headers()
+        )
+        data = r.get_json()
+        likes = [n for n in data.get("data") if n.get("type") == "点赞"]
+        assert len(likes) == 1
+        assert likes[0].get("actorCount") == 2
+        assert [a.get("username") for a in likes[0].get("latestActors")] == [
+            "liker4b",
+            "liker4a",
+        ]
+        assert data.get("unread") == 1
+
+    def test_new_post_notification_chunks(self, app, client, auth):
+        """测试新文章通知分批发送给所有粉丝，并记录进度"""
+        from app import redis
+        from app.mycelery.notification_task import fan_out_progress_key
+
+        app.config["NOTIFICATION_FAN_OUT_CHUNK"] = 2
+        auth_author = auth()
+        auth_author.register(username="author5", password="password")
+        followers = []
+        for username in ["fan5a", "fan5b", "fan5c"]:
+            auth_fan = auth()
+            auth_fan.register(username=username, password="password")
+            auth_fan.login(username=username, password="password")
+            client.post(
+                self.pre_fix + "/users/author5/follow", headers=auth_fan.get_headers()
+            )
+            followers.append(auth_fan)
+
+        auth_author.login(username="author5", password="password")
+        r = client.post(
+            self.pre_fix + "/posts",
+            headers=auth_author.get_headers(),
+            json={"content": "测试文章内容", "type": "text", "images": []},
+        )
+        post_id = r.get_json().get("data")[0].get("id")
+
+        for auth_fan in followers:
+            r = client.get(
+                self.pre_fix + "/notifications", headers=auth_fan.get_headers()
+            )
+            data = r.get_json().get("data")
+            assert [n.get("type") for n in data] == ["新文章"]
+            assert data[0].get("postId") == post_id
+
+        progress = redis.hgetall(fan_out_progress_key(post_id))
+        assert progress.get("chunks") == "2"
+        assert progress.get("sent") == "3"
+        assert progress.get("done") == "1"
+
+    def test_aggregate_window_anchored(self, client, auth):
+        """测试聚合窗口从通知创建时开始计算，合并只更新 updated_at"""
+        from datetime import datetime, timedelta
+
+        from app import db
+        from app.models import Notification, NotificationType
+        from app.utils.time_util import DateUtils
+
+        auth_author = auth()
+        auth_author.register(username="author6", password="password")
+        auth_author.login(username="author6", password="password")
+        r = client.post(
+            self.pre_fix + "/posts",
+            headers=auth_author.get_headers(),
+            json={"content": "测试文章内容", "type": "text", "images": []},
+        )
+        post_id = r.get_json().get("data")[0].get("id")
+
+        def like(username):
+            auth_liker = auth()
+            auth_liker.register(username=username, password="password")
+            auth_liker.login(username=username, password="password")
+            client.post(
+                self.pre_fix + f"/posts/{post_id}/likes",
+                headers=auth_liker.get_headers(),
+            )
+
+        def likes():
+            db.session.expire_all()
+            return (
+                Notification.query.filter_by(type=NotificationType.LIKE)
+                .order_by(Notification.id)
+                .all()
+            )
+
+        now = datetime.now(DateUtils.Shanghai_tz).replace(tzinfo=None)
+        like("liker6a")
+        first = likes()[0]
+        created_at = now - timedelta(minutes=50)
+        first.created_at = created_at
+        first.updated_at = created_at
+        db.session.commit()
+
+        # 窗口内合并，创建时间不变
+        like("liker6b")
+        rows = likes()
+        assert len(rows) == 1
+        assert rows[0].created_at == created_at
+        assert rows[0].updated_at > created_at
+        assert rows[0].actor_count == 2
+
+        # 从创建时起超过窗口后新建通知，旧通知不再合并
+        rows[0].created_at = now - timedelta(minutes=61)
+        db.session.commit()
+        like("liker6c")
+        rows = likes()
+        assert len(rows) == 2
+        assert rows[0].open_key is None
+        assert rows[1].actor_count == 1
+
+    def test_new_post_notification_keeps_post_ids(self, client, auth):
+        """测试新文章通知聚合时保留每篇文章id，不覆盖第一篇"""
+        auth_author = auth()
+        auth_author.register(username="author7", password="password")
+        auth_fan = auth()
+        auth_fan.register(username="fan7", password="password")
+        auth_fan.login(username="fan7", password="password")
+        client.post(
+            self.pre_fix + "/users/author7/follow", headers=auth_fan.get_headers()
+        )
+
+        auth_author.login(username="author7", password="password")
+        post_ids = []
+        for content in ["第一篇", "第二篇"]:
+            r = client.post(
+                self.pre_fix + "/posts",
+                headers=auth_author.get_headers(),
+                json={"content": content, "type": "text", "images": []},
+            )
+            post_ids.append(r.get_json().get("data")[0].get("id"))
+
+        r = client.get(self.pre_fix + "/notifications", headers=auth_fan.get_headers())
+        data = r.get_json().get("data")
+        assert len(data) == 1
+        assert data[0].get("postId") == post_ids[0]
+        assert data[0].get("postIds") == post_ids[::-1]
+
+    def test_aggregate_concurrent_first_event(self, client, auth, monkeypatch):
+        """测试并发的首个事件不会重复新建通知，唯一约束冲突后重试合并"""
+        from app.models import Notification, NotificationType
+        from app.mycelery import notification_task
+
+        for username in ["author8", "liker8a", "liker8b"]:
+            auth().register(username=username, password="password")
+
+        notification_task._aggregate_notifications(
+            [1], NotificationType.LIKE, 2, post_id=None
+        )
+        # 模拟另一个事件在本次查询之后、插入之前新建了通知
+        open_notifications = notification_task._open_notifications
+        calls = []
+
+        def racing(keys):
+            calls.append(keys)
+            return {} if len(calls) == 1 else open_notifications(keys)
+
+        monkeypatch.setattr(notification_task, "_open_notifications", racing)
+        notification_task._aggregate_notifications(
+            [1], NotificationType.LIKE, 3, post_id=None
+        )
+        rows = Notification.query.filter_by(type=NotificationType.LIKE).all()
+        assert len(rows) == 1
+        assert rows[0].actor_count == 2
@@ -114,3 +114,37 @@ class TestPasswordResetCase:
     #     })
     #     assert r.json.get('code') == 200
     #     assert 'token' in r.json
+
+    def test_change_password_revokes_websocket(self, client, auth):
+        """测试修改密码后旧 token 不能再建立 websocket 连接"""
+        import time
+
+        from app import redis
+        from app.websocket import SocketSession, SocketSessionService
+
+        auth_instance = auth()
+        auth_instance.register()
+        auth_instance.login()
+        sessions = SocketSessionService(redis)
+        old = SocketSession(user_id=1, username="test", issued_at=int(time.time()) - 10)
+        assert not sessions.is_revoked(old)
+
+        r = client.post(
+            "/auth/changePassword",
+            headers=auth_instance.get_headers(),
+            json={"old_password": "test", "new_password": "new_password"},
+        )
+        assert r.json.get("code") == 200
+        assert sessions.is_revoked(old)
+        assert not sessions.is_revoked(
+            SocketSession(user_id=1, username="test", issued_at=int(time.time()) + 1)
+        )
+
+        # 连接建立后的事件只读取进程内的会话，过期后不再可用
+        sessions.open("sid", old)
+        assert sessions.get("sid") == old
+        sessions.open(
+            "sid", SocketSession(1, "test", issued_at=0, expires_at=time.time() - 1)
+        )
+        assert sessions.get("sid") is None
+        sessions.close("sid")
@@ -1,7 +1,18 @@
+import json
 import time
 from base64 import b64encode
+from datetime import datetime
 
-from app.models import Role
+from app import db, redis
+from app.models import Log, LogRollup, Post, Role, User
+from app.mycelery import log_task
+from app.mycelery.log_task import (
+    LOG_BUFFER_KEY,
+    LOG_DEAD_KEY,
+    LOG_FLUSHING_KEY,
+    flush_log_buffer,
+)
+from app.timeline import TimelineService, timeline
 
 
 class TestApiCase:
@@ -15,11 +26,157 @@ class TestApiCase:
             "Content-type": "application/json",
         }
 
+    def login_admin(self, auth):
+        admin = auth()
+        admin.register_admin()
+        user = User.query.filter_by(username="admin").first()
+        user.role = Role.query.filter_by(name="Administrator").first()
+        db.session.commit()
+        admin.login("admin", "admin")
+        return admin
+
     def test_no_auth(self, client):
         r = client.get(self.pre_fix + "/posts", content_type="application/json")
         assert r.status_code == 200
         assert r.json.get("code") == 200
 
+    def test_visitor_log(self, client):
+        """测试首页访问日志：同一访客只记录一次，缓冲后批量入库"""
+        # 只信任代理追加的最后一个地址，客户端伪造的地址不影响去重
+        client.get(
+            self.pre_fix + "/posts", headers={"X-Forwarded-For": "1.2.3.4, 10.0.0.1"}
+        )
+        client.get(
+            self.pre_fix + "/posts", headers={"X-Forwarded-For": "5.6.7.8, 10.0.0.1"}
+        )
+        # 非首页不记录
+        client.get(
+            self.pre_fix + "/posts?page=2", headers={"X-Forwarded-For": "10.0.0.2"}
+        )
+        client.get(self.pre_fix + "/posts", headers={"X-Forwarded-For": "10.0.0.3"})
+        assert redis.llen(LOG_BUFFER_KEY) == 2
+        assert Log.query.count() == 0
+
+        assert flush_log_buffer() == 2
+        assert flush_log_buffer() == 0
+        logs = Log.query.order_by(Log.id).all()
+        assert [log.ip for log in logs] == ["10.0.0.1", "10.0.0.3"]
+        assert logs[0].username == "游客"
+        assert logs[0].operate_time is not None
+
+    def test_visitor_log_dead_letter(self, client):
+        """测试超长字段按列宽截断，无法入库的日志移入死信列表，不阻塞后续日志"""
+        client.get(
+            self.pre_fix + "/posts",
+            headers={"X-Forwarded-For": "10.0.0.1", "User-Agent": "x" * 2000},
+        )
+        redis.rpush(LOG_BUFFER_KEY, "not json")
+        redis.rpush(LOG_BUFFER_KEY, json.dumps({"ip": "10.0.0.2", "unknown": 1}))
+        client.get(self.pre_fix + "/posts", headers={"X-Forwarded-For": "10.0.0.3"})
+        log_task._ua_cache.clear()
+
+        assert flush_log_buffer() == 2
+        assert redis.llen(LOG_DEAD_KEY) == 2
+        assert not redis.exists(LOG_FLUSHING_KEY)
+        logs = Log.query.order_by(Log.id).all()
+        assert [log.ip for log in logs] == ["10.0.0.1", "10.0.0.3"]
+        row = log_task._log_row(
+            json.dumps(
+                {
+                    "ip": "1" * 300,
+                    "username": "u" * 100,
+                    "user_agent": "",
+                    "operate_time": 0,
+                }
+            )
+        )
+        assert (len(row["ip"]), len(row["username"])) == (100, 64)
+
+        client.get(self.pre_fix + "/posts", headers={"X-Forwarded-For": "10.0.0.4"})
+        assert flush_log_buffer() == 1
+
+    def test_visitor_log_user_agent(self, client, auth):
+        """测试 user-agent 在入库时解析，相同的 UA 只解析一次"""
+        ua = (
+            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+            "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+        )
+        for ip in ["10.0.0.1", "10.0.0.2"]:
+            client.get(
+                self.pre_fix + "/posts",
+                headers={"X-Forwarded-For": ip, "User-Agent": ua},
+            )
+        client.get(
+            self.pre_fix + "/posts",
+            headers={"X-Forwarded-For": "10.0.0.3", "User-Agent": ""},
+        )
+        log_task._ua_cache.clear()
+        log_task._ua_cache_reported.update(hits=0, misses=0)
+        # 其他进程已上报的次数
+        redis.hset(log_task.UA_CACHE_STATS_KEY, mapping={"hits": 2, "misses": 1})
+        redis.hset(log_task.UA_CACHE_SIZES_KEY, "other:1", 1)
+        assert flush_log_buffer() == 3
+
+        logs = Log.query.order_by(Log.id).all()
+        assert [log.browser for log in logs] == ["Chrome", "Chrome", ""]
+        assert logs[0].os == "Windows"
+
+        admin = self.login_admin(auth)
+        r = client.get(self.pre_fix + "/logs/ua-cache", headers=admin.get_headers())
+        assert r.json.get("code") == 200
+        stats = r.json.get("data")
+        assert (stats["hits"], stats["misses"], stats["size"]) == (3, 2, 2)
+        assert stats["hitRate"] == 0.6
+
+        # 再次落库只累加新增的次数
+        client.get(
+            self.pre_fix + "/posts",
+            headers={"X-Forwarded-For": "10.0.0.4", "User-Agent": ua},
+        )
+        assert flush_log_buffer() == 1
+        r = client.get(self.pre_fix + "/logs/ua-cache", headers=admin.get_headers())
+        stats = r.json.get("data")
+        assert (stats["hits"], stats["misses"], stats["size"]) == (4, 2, 2)
+
+    def test_visitor_log_rollup(self, client, auth):
+        """测试访客日志入库时累加汇总，统计接口读取汇总，过期日志分批删除"""
+        ua = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) Version/17.0 Safari/605.1.15"
+        for ip in ["10.0.0.1", "10.0.0.2", "10.0.0.3"]:
+            client.get(
+                self.pre_fix + "/posts",
+                headers={"X-Forwarded-For": ip, "User-Agent": ua},
+            )
+        assert flush_log_buffer() == 3
+        client.get(self.pre_fix + "/posts", headers={"X-Forwarded-For": "10.0.0.4"})
+        assert flush_log_buffer() == 1
+
+        hour = LogRollup.query.filter_by(period="hour", dimension="all").one()
+        assert hour.visits == 4
+        assert hour.bucket.minute == 0
+        day = LogRollup.query.filter_by(period="day", dimension="all").one()
+        assert day.visits == 4
+        assert (day.bucket.hour, day.bucket.minute) == (0, 0)
+
+        admin = self.login_admin(auth)
+        r = client.get(
+            self.pre_fix + "/logs/stats?period=hour", headers=admin.get_headers()
+        )
+        assert r.json.get("code") == 200
+        data = r.json.get("data")
+        assert [point["visits"] for point in data["timeline"]] == [4]
+        assert data["browser"][0] == {"value": "Safari", "visits": 3}
+        assert data["country"] == [{"value": "", "visits": 4}]
+        r = client.get(
+            self.pre_fix + "/logs/stats?period=week", headers=admin.get_headers()
+        )
+        assert r.json.get("code") == 400
+
+        old = Log(ip="10.0.0.9", operate_time=datetime(2020, 1, 1))
+        db.session.add(old)
+        db.session.commit()
+        assert Log.purge_before(datetime(2021, 1, 1)) == 1
+        assert Log.query.count() == 4
+
     def test_posts(self, client, auth):
         """模拟新用户注册、登陆，发布普通文章，图文，markdown文章的过程"""
         auth_instance = auth()
@@ -81,3 +238,200 @@ class TestApiCase:
         data = r.json.get("data")
         assert "测试markdown文章" in data[0].get("summary")
         assert "1" in data[0].get("pos")
+
+    def test_posts_cursor(self, client, auth):
+        """游标分页获取文章列表"""
+        auth_instance = auth()
+        auth_instance.register()
+        auth_instance.login()
+        for i in range(3):
+            r = client.post(
+                self.pre_fix + "/posts",
+                headers=auth_instance.get_headers(),
+                json={"content": f"文章{i}", "type": "text", "images": []},
+            )
+            assert r.json.get("code") == 200
+
+        r = client.get(self.pre_fix + "/posts?cursor=&per_page=2&with_total=true")
+        assert r.json.get("code") == 200
+        assert r.json.get("total") == 3
+        first_page = r.json.get("data")
+        assert len(first_page) == 2
+        next_cursor = r.json.get("next_cursor")
+        assert next_cursor
+
+        r = client.get(self.pre_fix + f"/posts?cursor={next_cursor}&per_page=2")
+        second_page = r.json.get("data")
+        assert len(second_page) == 1
+        assert r.json.get("next_cursor") is None
+        ids = [p.get("id") for p in first_page + second_page]
+        assert len(set(ids)) == 3
+
+        r = client.get(self.pre_fix + "/posts?cursor=invalid")
+        assert r.json.get("code") == 400
+
+    def test_posts_feed_per_viewer(self, client, auth):
+        """文章列表缓存不在访问者之间共享点赞状态和关注文章流"""
+        author = auth()
+        author.register(username="author", password="author")
+        author.login(username="author", password="author")
+        viewer = auth()
+        viewer.register(username="viewer", password="viewer")
+        viewer.login(username="viewer", password="viewer")
+
+        r = client.post(
+            self.pre_fix + "/posts",
+            headers=author.get_headers(),
+            json={"content": "666", "type": "text", "images": []},
+        )
+        post_id = r.json.get("data")[0].get("id")
+
+        # 关注前，viewer 的关注文章流为空
+        r = client.get(
+            self.pre_fix + "/posts?tabName=showFollowed", headers=viewer.get_headers()
+        )
+        assert r.json.get("total") == 0
+
+        client.post(self.pre_fix + "/users/author/follow", headers=viewer.get_headers())
+        client.post(
+            self.pre_fix + f"/posts/{post_id}/likes", headers=viewer.get_headers()
+        )
+
+        r = client.get(
+            self.pre_fix + "/posts?tabName=showFollowed", headers=viewer.get_headers()
+        )
+        assert r.json.get("total") == 1
+        assert r.json.get("data")[0].get("has_praised") is True
+        assert r.json.get("data")[0].get("praise_num") == 1
+
+        r = client.get(self.pre_fix + "/posts", headers=author.get_headers())
+        assert r.json.get("data")[0].get("has_praised") is False
+        assert r.json.get("data")[0].get("praise_num") == 1
+
+        # 删除后从列表中移除
+        client.delete(self.pre_fix + f"/posts/{post_id}", headers=author.get_headers())
+        r = client.get(self.pre_fix + "/posts", headers=viewer.get_headers())
+        assert r.json.get("total") == 0
+        assert r.json.get("data") == []
+
+    def test_legacy_create_bumps_feed(self, client, auth):
+        """旧版首页接口发布文章后最新文章页缓存失效"""
+        auth_instance = auth()
+        auth_instance.register()
+        auth_instance.login()
+        client.post(
+            self.pre_fix + "/posts",
+            headers=auth_instance.get_headers(),
+            json={"content": "第一篇", "type": "text", "images": []},
+        )
+        r = client.get(self.pre_fix + "/posts")
+        assert r.json.get("total") == 1
+
+        r = client.post(
+            "/",
+            headers=auth_instance.get_headers(),
+            json={"content": "第二篇", "type": "text", "images": []},
+        )
+        assert r.json.get("code") == 200
+        r = client.get(self.pre_fix + "/posts")
+        assert len(r.json.get("data")) == 2
+
+    def test_legacy_edit_invalidates_card(self, client, auth):
+        """旧版编辑接口修改文章后列表卡片缓存失效"""
+        auth_instance = auth()
+        auth_instance.register()
+        auth_instance.login()
+        r = client.post(
+            self.pre_fix + "/posts",
+            headers=auth_instance.get_headers(),
+            json={"content": "修改前", "type": "text", "images": []},
+        )
+        post_id = r.json.get("data")[0].get("id")
+        r = client.get(self.pre_fix + "/posts")
+        assert r.json.get("data")[0].get("summary") == "修改前"
+
+        r = client.put(
+            f"/edit/{post_id}",
+            headers=auth_instance.get_headers(),
+            json={"content": "修改后"},
+        )
+        assert r.json.get("code") == 200
+        r = client.get(self.pre_fix + "/posts")
+        assert r.json.get("data")[0].get("summary") == "修改后"
+
+    def test_followed_timeline(self, client, auth, monkeypatch):
+        """关注文章流：写扩散、大V读取时拉取、取消关注后重建"""
+        author = auth()
+        author.register(username="author", password="author")
+        author.login(username="author", password="author")
+        star = auth()
+        star.register(username="star", password="star")
+        star.login(username="star", password="star")
+        viewer = auth()
+        viewer.register(username="viewer", password="viewer")
+        viewer.login(username="viewer", password="viewer")
+
+        client.post(self.pre_fix + "/users/author/follow", headers=viewer.get_headers())
+        client.post(self.pre_fix + "/users/star/follow", headers=viewer.get_headers())
+        client.post(self.pre_fix + "/users/star/follow", headers=author.get_headers())
+        # star 的粉丝数达到阈值，改为读取时拉取；author 仍写扩散
+        monkeypatch.setattr(TimelineService, "PULL_THRESHOLD", 2)
+        monkeypatch.setattr(TimelineService, "BACKFILL_LEN", 1)
+
+        def publish(user, content):
+            r = client.post(
+                self.pre_fix + "/posts",
+                headers=user.get_headers(),
+                json={"content": content, "type": "text", "images": []},
+            )
+            assert r.json.get("code") == 200
+
+        def followed(query=""):
+            r = client.get(
+                self.pre_fix + "/posts?tabName=showFollowed" + query,
+                headers=viewer.get_headers(),
+            )
+            assert r.json.get("code") == 200
+            return r
+
+        # 首次读取构建时间线
+        assert followed().json.get("data") == []
+        assert redis.exists(TimelineService.key(3))
+
+        publish(author, "a1")
+        publish(star, "s1")
+        publish(author, "a2")
+        r = followed()
+        assert [p["summary"] for p in r.json.get("data")] == ["a2", "s1", "a1"]
+        # 时间线中只有写扩散的文章
+        assert redis.zcard(TimelineService.key(3)) == 3
+
+        # 游标分页
+        r = followed("&cursor=&per_page=2")
+        assert [p["summary"] for p in r.json.get("data")] == ["a2", "s1"]
+        r = followed(f"&cursor={r.json.get('next_cursor')}&per_page=2")
+        assert [p["summary"] for p in r.json.get("data")] == ["a1"]
+        assert r.json.get("next_cursor") is None
+
+        # 本页文章都已删除、尚未从时间线移除时，仍按时间线中的 id 继续翻页
+        a2 = Post.query.filter_by(content="a2").first()
+        a2.deleted = True
+        db.session.commit()
+        r = followed("&cursor=&per_page=1")
+        assert r.json.get("data") == []
+        r = followed(f"&cursor={r.json.get('next_cursor')}&per_page=1")
+        assert [p["summary"] for p in r.json.get("data")] == ["s1"]
+
+        # 删除文章后分批从粉丝时间线移除
+        monkeypatch.setattr(TimelineService, "FAN_OUT_BATCH", 1)
+        timeline.remove_post(a2.id, a2.author_id)
+        assert redis.zscore(TimelineService.key(3), a2.id) is None
+        assert redis.zscore(
+            TimelineService.key(3), Post.query.filter_by(content="a1").first().id
+        )
+
+        # 取消关注后不再包含其文章
+        client.delete(
+            self.pre_fix + "/users/author/follow", headers=viewer.get_headers()
+        )
+        assert [p["summary"] for p in followed().json.get("data")] == ["s1"]
@@ -66,6 +66,11 @@ class TestPraiseCommentCase:
         assert r.json.get("data").get("praise_total") == 1
         assert r.json.get("data").get("has_praised") is True
 
+        # 文章详情中的计数
+        r = client.get(self.pre_fix + f"/posts/{post_id}")
+        assert r.json.get("data").get("comment_count") == 1
+        assert r.json.get("data").get("praise_num") == 1
+
         # 重复点赞应该失败
         r = client.post(
             self.pre_fix + f"/posts/{post_id}/likes",
@@ -135,6 +140,10 @@ class TestPraiseCommentCase:
         assert r.json.get("code") == 200
         assert r.json.get("data").get("praise_total") == 1
 
+        # 评论作者获赞数
+        r = client.get(self.pre_fix + "/users/1", headers=auth_instance.get_headers())
+        assert r.json.get("data").get("praised_count") == 1
+
         # 检查已点赞的评论ID
         r = client.get(
             self.pre_fix + f"/posts/{post_id}/comments/praised?liked=true",
@@ -143,3 +152,25 @@ class TestPraiseCommentCase:
         assert r.status_code == 200
         assert r.json.get("code") == 200
         assert comment_id in r.json.get("data")
+
+        # 评论列表附带第一页回复、回复总数及已点赞的评论ID
+        for i in range(6):
+            client.post(
+                self.pre_fix + f"/posts/{post_id}/comments",
+                headers=auth_instance.get_headers(),
+                json={"body": f"回复{i}", "directParentId": comment_id, "at": []},
+            )
+        r = client.get(
+            self.pre_fix + f"/posts/{post_id}/comments",
+            headers=auth_instance.get_headers(),
+        )
+        assert r.json.get("code") == 200
+        root = r.json.get("data")[0]
+        assert root.get("id") == comment_id
+        assert root.get("likes") == 1
+        assert root.get("reply").get("total") == 7
+        replies = root.get("reply").get("list")
+        assert len(replies) == 5
+        assert replies[0].get("content") == "回复5"
+        assert replies[0].get("user").get("username") == "test"
+        assert r.json.get("liked_ids") == [comment_id]
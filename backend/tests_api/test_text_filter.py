@@ -0,0 +1,24 @@
+from app.utils.text_filter import KeywordMatcher, get_keyword_filter
+
+
+class TestKeywordMatcherCase:
+    """测试敏感词过滤"""
+
+    def test_filter(self):
+        matcher = KeywordMatcher(["ab", "bcd", "敏感词"])
+        assert matcher.filter("xabcdx") == "x****x"
+        assert matcher.filter("这是敏感词吗") == "这是***吗"
+        assert matcher.filter("Hello ABC") == "Hello **C"
+        assert matcher.filter("正常评论") == "正常评论"
+        assert matcher.filter("") == ""
+
+    def test_prefix_not_matched(self):
+        matcher = KeywordMatcher(["1989年"])
+        assert matcher.filter("1989", "*") == "1989"
+
+    def test_filter_many(self):
+        matcher = KeywordMatcher(["ab"])
+        assert matcher.filter_many(["ab", "cd", "xab"]) == ["**", "cd", "x**"]
+
+    def test_shared_instance(self):
+        assert get_keyword_filter() is get_keyword_filter()
@@ -1,4 +1,9 @@
 from base64 import b64encode
+from datetime import datetime
+
+from app import db, redis
+from app.models import Principal, Role, User
+from app.utils.time_util import DateUtils
 
 
 class TestUserProfileCase:
@@ -70,6 +75,53 @@ class TestUserProfileCase:
         assert r.status_code == 200
         assert r.json.get("data").get("nickname") == "测试昵称"
 
+    def test_update_user_tags(self, client, auth):
+        """测试更新标签后资料同步更新"""
+        auth_instance = auth()
+        auth_instance.register()
+        auth_instance.login()
+        headers = auth_instance.get_headers()
+
+        # 首次读取会缓存资料文档
+        r = client.get(self.pre_fix + "/users/1", headers=headers)
+        assert r.json.get("data").get("tags") == []
+
+        r = client.post(
+            self.pre_fix + "/users/1/tags",
+            headers=headers,
+            json={"tagAdd": ["摄影"], "tagRemove": []},
+        )
+        assert r.json.get("code") == 200
+
+        r = client.get(self.pre_fix + "/users/1", headers=headers)
+        assert r.json.get("data").get("tags") == ["摄影"]
+
+        # 旧版接口更新标签
+        r = client.post(
+            "/update_user_tag",
+            headers=headers,
+            json={"tagAdd": ["旅行"], "tagRemove": []},
+        )
+        assert r.json.get("code") == 200
+        r = client.get(self.pre_fix + "/users/1", headers=headers)
+        assert sorted(r.json.get("data").get("tags")) == ["摄影", "旅行"]
+
+        # 管理员从公共标签库删除标签，拥有该标签的用户资料同步更新
+        admin = auth()
+        admin.register_admin()
+        user = User.query.filter_by(username="admin").first()
+        user.role = Role.query.filter_by(name="Administrator").first()
+        db.session.commit()
+        admin.login("admin", "admin")
+        r = client.post(
+            self.pre_fix + "/tags",
+            headers=admin.get_headers(),
+            json={"tagAdd": [], "tagRemove": ["摄影"]},
+        )
+        assert r.json.get("code") == 200
+        r = client.get(self.pre_fix + "/users/1", headers=headers)
+        assert r.json.get("data").get("tags") == ["旅行"]
+
     def test_follow_unfollow_user(self, client, auth):
         """测试关注和取消关注用户"""
         # 创建两个独立的认证实例
@@ -119,6 +171,12 @@ class TestUserProfileCase:
         # 验证关注状态
         r = client.get(self.pre_fix + f"/users/{user1_id}", headers=headers_user2)
         assert r.json.get("data").get("is_followed_by_current_user") is True
+        assert r.json.get("data").get("followers_count") == 1
+
+        # 从 user1 的视角看 user2：user2 关注了 user1
+        r = client.get(self.pre_fix + "/users/2", headers=headers_user1)
+        assert r.json.get("data").get("is_following_current_user") is True
+        assert r.json.get("data").get("is_followed_by_current_user") is False
 
         # user2 取消关注 user1
         r = client.delete(
@@ -130,3 +188,68 @@ class TestUserProfileCase:
         # 验证取消关注状态
         r = client.get(self.pre_fix + f"/users/{user1_id}", headers=headers_user2)
         assert r.json.get("data").get("is_followed_by_current_user") is False
+        assert r.json.get("data").get("followers_count") == 0
+
+    def test_last_seen_write_behind(self, client, auth):
+        """最近活跃时间先写入 Redis，批量落库"""
+        auth_instance = auth()
+        auth_instance.register()
+        auth_instance.login()
+        # 落库前的值与缓冲的时间不同，才能确认是 flush 写入的
+        User.query.filter_by(id=1).update({"last_seen": datetime(2000, 1, 1)})
+        db.session.commit()
+        client.get(self.pre_fix + "/users/1", headers=auth_instance.get_headers())
+        buffered = int(redis.hget(User.LAST_SEEN_KEY, 1))
+
+        assert User.flush_last_seen() >= 1
+        assert not redis.exists(User.LAST_SEEN_KEY)
+        assert not redis.exists(User.LAST_SEEN_FLUSHING_KEY)
+        db.session.expire_all()
+        user = db.session.get(User, 1)
+        assert user.last_seen == datetime.fromtimestamp(
+            buffered, DateUtils.Shanghai_tz
+        ).replace(tzinfo=None)
+        # 缓冲为空时不做任何事
+        assert User.flush_last_seen() == 0
+
+    def test_principal_cache(self, client, auth):
+        """current_user 使用缓存的身份，资料变更后失效"""
+        auth_instance = auth()
+        auth_instance.register()
+        auth_instance.login()
+
+        principal = Principal.load(1)
+        assert principal.username == "test"
+        assert principal.can(0)
+        # 缓存命中时不加载完整的 User
+        cached = Principal.load(1)
+        assert cached.nickname == principal.nickname
+        assert cached._user is None
+        # 未缓存的字段按需加载
+        assert cached.email == User.query.get(1).email
+
+        r = client.patch(
+            self.pre_fix + "/users/1",
+            headers=auth_instance.get_headers(),
+            json={"nickname": "新昵称"},
+        )
+        assert r.json.get("code") == 200
+        assert Principal.load(1).nickname == "新昵称"
+
+        # 版本号在提交后才递增，回滚时不变
+        version = redis.get(Principal.version_key(1))
+        user = db.session.get(User, 1)
+        user.nickname = "回滚的昵称"
+        db.session.flush()
+        assert redis.get(Principal.version_key(1)) == version
+        db.session.rollback()
+        assert redis.get(Principal.version_key(1)) == version
+        assert Principal.load(1).nickname == "新昵称"
+
+        user = db.session.get(User, 1)
+        user.nickname = "提交的昵称"
+        db.session.flush()
+        assert redis.get(Principal.version_key(1)) == version
+        db.session.commit()
+        assert redis.get(Principal.version_key(1)) != version
+        assert Principal.load(1).nickname == "提交的昵称"
@@ -0,0 +1,68 @@
+import time
+
+from app import redis
+from app.websocket import (
+    ConversationStateService,
+    UserPresenceService,
+    WSConnectionManager,
+)
+
+
+class TestWebsocketStateCase:
+    """测试 websocket 会话状态"""
+
+    def test_typing_transitions(self, app):
+        """测试连续输入只在开始时算一次状态变化"""
+        conversation = ConversationStateService(redis)
+        assert conversation.mark_typing(1, 2) is True
+        assert conversation.mark_typing(1, 2) is False
+        assert 0 < conversation.typing_ttl(1, 2) <= conversation.TYPING_TTL
+        # 给其他人输入互不影响
+        assert conversation.mark_typing(1, 3) is True
+
+        conversation.clear_typing(1, 2)
+        assert conversation.typing_ttl(1, 2) == 0
+        assert conversation.mark_typing(1, 2) is True
+
+    def test_presence_expire(self, app):
+        """测试超时未活跃的用户按分数区间批量移除，同一间隔只执行一次"""
+        presence = UserPresenceService(redis)
+        presence.mark_user_online(1)
+        presence.mark_user_online(2)
+        # 用户 2 超时未活跃
+        redis.zadd(presence.KEY, {2: int(time.time()) - presence.INACTIVE_TIMEOUT - 1})
+
+        assert presence.is_user_online(1)
+        assert not presence.is_user_online(2)
+        assert presence.list_online_users() == {1}
+        assert presence.count_online_users() == 1
+
+        assert presence.expire_inactive(30) == [2]
+        assert presence.get_user_presence(2) == {"online": 0}
+        # 同一间隔内其他进程不再执行
+        assert presence.expire_inactive(30) is None
+
+        presence.update_last_active(2)
+        assert presence.list_online_users() == {1, 2}
+        presence.mark_user_offline(1)
+        assert presence.list_online_users() == {2}
+
+    def test_reap_dead_workers(self, app):
+        """测试心跳超时的 worker 遗留的连接被清理"""
+        alive = WSConnectionManager(redis, worker_id="host:1")
+        dead = WSConnectionManager(redis, worker_id="host:2")
+        alive.heartbeat()
+        dead.heartbeat()
+        alive.bind_socket_to_user(1, "sid-a")
+        dead.bind_socket_to_user(1, "sid-b")
+        dead.bind_socket_to_user(2, "sid-c")
+        # host:2 异常退出，心跳超时
+        redis.zadd(alive.WORKERS_KEY, {"host:2": int(time.time()) - 100})
+
+        assert alive.list_workers(60) == ["host:1"]
+        # 用户 1 仍有其他 worker 上的连接，不算离线
+        assert alive.reap_dead_workers(60) == {2}
+        assert alive.get_bound_sockets(1) == {"sid-a"}
+        assert alive.get_bound_sockets(2) == set()
+        assert not redis.exists(alive.worker_sockets_key("host:2"))
+        assert alive.list_workers(0) == ["host:1"]
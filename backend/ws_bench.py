@@ -0,0 +1,217 @@
+"""
+websocket 压测脚本
+
+使用专用的压测用户（用户名 bench_<序号>，不存在时自动创建）建立连接，统计:
+- 建连速率
+- 推送延迟: 经由消息队列向每个用户房间推送，客户端收到时计算耗时
+- 各 worker 的消息吞吐: 按 message_accepted 返回的 worker 分组
+
+需要运行中的 websocket 服务、数据库、Redis 和 Celery worker，
+与被压测的服务使用同一份配置（--config / FLASK_CONFIG）。
+
+用法:
+    python ws_bench.py --url http://127.0.0.1:5001 --clients 200 --messages 20
+
+清理:
+    send_message 走真实的写入流程，压测消息会写入数据库，并生成私信通知、
+    会话摘要和离线待投递记录，只发生在压测用户之间。压测结束后执行
+        python ws_bench.py --cleanup
+    删除全部压测用户及其消息、会话、通知、关注记录和 Redis 中的聊天状态
+"""
+
+import argparse
+import os
+import statistics
+import threading
+import time
+from collections import Counter
+
+import socketio
+from app import create_app, db, redis
+from app.models import Conversation, Follow, Message, Notification, User
+from app.websocket import ConversationStateService, OfflineDeliveryService
+from app.websocket.emitter import get_emitter
+from flask_jwt_extended import create_access_token
+from sqlalchemy import or_
+
+BENCH_PREFIX = "bench_"
+BENCH_EMAIL_DOMAIN = "bench.invalid"
+
+
+def bench_users():
+    return User.query.filter(User.email.like(f"%@{BENCH_EMAIL_DOMAIN}"))
+
+
+def load_tokens(app, count):
+    """取得 count 个压测用户的 token，不足时创建"""
+    with app.app_context():
+        users = []
+        for i in range(count):
+            username = f"{BENCH_PREFIX}{i}"
+            email = f"{username}@{BENCH_EMAIL_DOMAIN}"
+            # 按邮箱查找，不会用到恰好同名的真实用户
+            user = User.query.filter_by(email=email).first()
+            if user is None:
+                user = User(
+                    username=username,
+                    email=email,
+                    password=username,
+                    confirmed=True,
+                )
+                db.session.add(user)
+            users.append(user)
+        db.session.commit()
+        return [
+            (user.id, create_access_token(identity=user, expires_delta=False))
+            for user in users
+        ]
+
+
+def cleanup(app):
+    """删除压测用户及其产生的数据"""
+    with app.app_context():
+        ids = [user.id for user in bench_users().with_entities(User.id)]
+        if not ids:
+            print("没有压测用户")
+            return
+        messages = Message.query.filter(
+            or_(Message.sender_id.in_(ids), Message.receiver_id.in_(ids))
+        ).delete(synchronize_session=False)
+        Conversation.query.filter(
+            or_(Conversation.user_id.in_(ids), Conversation.peer_id.in_(ids))
+        ).delete(synchronize_session=False)
+        Notification.query.filter(
+            or_(
+                Notification.receiver_id.in_(ids),
+                Notification.trigger_user_id.in_(ids),
+            )
+        ).delete(synchronize_session=False)
+        Follow.query.filter(
+            or_(Follow.follower_id.in_(ids), Follow.followed_id.in_(ids))
+        ).delete(synchronize_session=False)
+        User.query.filter(User.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+
+        conversation = ConversationStateService(redis)
+        for user_id in ids:
+            conversation.clear_active_chat(user_id)
+        redis.delete(*(OfflineDeliveryService.key(user_id) for user_id in ids))
+        print(f"已删除压测用户 {len(ids)} 个, 消息 {messages} 条")
+
+
+class BenchClient:
+    def __init__(self, url, user_id, token):
+        self.url = url
+        self.user_id = user_id
+        self.token = token
+        self.client = socketio.Client(reconnection=False)
+        self.latencies = []
+        self.workers = Counter()
+        self.accepted = threading.Event()
+        self.client.on("bench_ping", self.on_ping)
+        self.client.on("message_accepted", self.on_accepted)
+
+    def on_ping(self, data):
+        self.latencies.append(time.time() - data["sent_at"])
+
+    def on_accepted(self, data):
+        self.workers[data.get("worker")] += 1
+        self.accepted.set()
+
+    def connect(self):
+        self.client.connect(
+            f"{self.url}?token={self.token}",
+            transports=["websocket"],
+            wait_timeout=10,
+        )
+
+    def send(self, receiver_id, count):
+        for i in range(count):
+            self.accepted.clear()
+            self.client.emit(
+                "send_message",
+                {"receiver_id": receiver_id, "content": f"bench {i}"},
+            )
+            self.accepted.wait(5)
+
+
+def run_in_threads(target, items):
+    threads = [threading.Thread(target=target, args=(item,)) for item in items]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def percentile(values, p):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="websocket 压测")
+    parser.add_argument("--url", default="http://127.0.0.1:5001")
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--messages", type=int, default=10, help="每个客户端发送消息数")
+    parser.add_argument("--pings", type=int, default=10, help="推送轮数")
+    parser.add_argument("--config", default=os.getenv("FLASK_CONFIG") or "default")
+    parser.add_argument("--cleanup", action="store_true", help="删除压测用户及其数据")
+    args = parser.parse_args()
+
+    app = create_app(args.config)
+    if args.cleanup:
+        cleanup(app)
+        return
+    clients = [
+        BenchClient(args.url, user_id, token)
+        for user_id, token in load_tokens(app, args.clients)
+    ]
+    if len(clients) < 2:
+        parser.error("--clients 至少为 2")
+
+    # 建连
+    start = time.monotonic()
+    run_in_threads(lambda c: c.connect(), clients)
+    elapsed = time.monotonic() - start
+    print(f"建连: {len(clients)} 个, {len(clients) / elapsed:.1f} 个/秒")
+
+    # 推送延迟
+    with app.app_context():
+        emitter = get_emitter()
+        for _ in range(args.pings):
+            for c in clients:
+                emitter.emit("bench_ping", {"sent_at": time.time()}, to=str(c.user_id))
+            time.sleep(0.5)
+    time.sleep(1)
+    latencies = [ms * 1000 for c in clients for ms in c.latencies]
+    expected = len(clients) * args.pings
+    print(
+        f"推送: 收到 {len(latencies)}/{expected}, "
+        f"p50 {percentile(latencies, 0.5):.1f}ms, "
+        f"p99 {percentile(latencies, 0.99):.1f}ms, "
+        f"平均 {statistics.fmean(latencies) if latencies else 0:.1f}ms"
+    )
+
+    # 消息吞吐，每个客户端发给下一个用户
+    start = time.monotonic()
+    run_in_threads(
+        lambda i: clients[i].send(
+            clients[(i + 1) % len(clients)].user_id, args.messages
+        ),
+        range(len(clients)),
+    )
+    elapsed = time.monotonic() - start
+    workers = sum((c.workers for c in clients), Counter())
+    total = sum(workers.values())
+    print(f"消息: {total} 条, {total / elapsed:.1f} 条/秒")
+    for worker, count in sorted(workers.items()):
+        print(f"  worker {worker}: {count} 条, {count / elapsed:.1f} 条/秒")
+
+    run_in_threads(lambda c: c.client.disconnect(), clients)
+    print("压测消息已写入数据库，执行 python ws_bench.py --cleanup 清理")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,12 @@ export default {
       params: params,
     });
   },
+  // 获取会话列表，cursor 为上一页返回的 next_cursor
+  getConversations(cursor) {
+    return $http.get(`${url_prefix}/conversations`, {
+      params: cursor ? { cursor: cursor } : {},
+    });
+  },
   // markMessagesRead(ids) {
   //   let params = {}
   //   params[ids] = ids
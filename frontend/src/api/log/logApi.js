@@ -12,4 +12,8 @@ export default {
   deleteLog(ids) {
     return $http.delete(`${url_prefix}/logs`, { data: ids });
   },
+  // 获取访客统计，period: hour 或 day
+  getLogStats(period, days) {
+    return $http.get(`${url_prefix}/logs/stats`, { params: { period, days } });
+  },
 };
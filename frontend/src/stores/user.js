@@ -3,11 +3,14 @@ import { io } from "socket.io-client";
 import imageCfg from "@/config/image.js";
 import cityUtil from "@/utils/cityUtil.js";
 import { areaList } from "@vant/area-data";
+import { v4 as uuidv4 } from "uuid";
 
 export const useCurrentUserStore = defineStore("currentUser", {
   state: () => ({
     socket: null,
     activeChat: null,
+    // 已发出、尚未收到 message_sent 的消息，按前端生成的 clientId 索引
+    pendingMessages: {},
     heartbeatInterval: null,
     token: "",
     userInfo: {
@@ -170,15 +173,43 @@ export const useCurrentUserStore = defineStore("currentUser", {
         console.warn("⚠️ WebSocket断开连接：", reason);
       });
 
+      // 消息已进入写入队列，记下服务端 uuid
+      this.socket.on("message_accepted", (data) => {
+        const chat = this.findPendingMessage(data);
+        if (chat) chat.uuid = data.uuid;
+      });
+
       this.socket.on("message_sent", (msg) => {
         console.log("📤 消息发送成功（后端确认）：", msg);
-        // 前端消息发送成功后的逻辑（比如清空输入框、更新聊天记录）
+        const chat = this.findPendingMessage(msg);
+        if (chat) {
+          chat.uuid = msg.uuid;
+          chat.status = "sent";
+          delete this.pendingMessages[chat.clientId];
+        }
+      });
+
+      // 写入队列已满（reason: busy）或入库失败，标记失败，由聊天页提示重试
+      this.socket.on("message_failed", (data) => {
+        console.warn("⚠️ 消息发送失败：", data);
+        const chat = this.findPendingMessage(data);
+        if (chat) chat.status = "failed";
       });
 
       this.socket.on("heartbeat", () => {
         console.log("💓 心跳响应正常");
       });
 
+      // 离线期间的消息在连接后一次补发，展示由聊天页处理，这里负责确认
+      this.socket.on("missed_messages", (data) => {
+        const messages = data.messages || [];
+        if (messages.length) {
+          this.socket.emit("messages_delivered", {
+            deliveryId: messages[messages.length - 1].deliveryId,
+          });
+        }
+      });
+
       // 初始化心跳定时器
       this.heartbeatInterval = setInterval(() => {
         if (this.socket?.connected) {
@@ -197,7 +228,10 @@ export const useCurrentUserStore = defineStore("currentUser", {
       this.socket.off("disconnect");
       // 清理业务事件
       this.socket.off("new_message");
+      this.socket.off("message_accepted");
       this.socket.off("message_sent");
+      this.socket.off("message_failed");
+      this.socket.off("missed_messages");
       this.socket.off("new_notification");
       this.socket.off("heartbeat");
 
@@ -232,13 +266,27 @@ export const useCurrentUserStore = defineStore("currentUser", {
       }
     },
 
+    // 按 clientId 查找待确认的消息，没有 clientId 时按服务端 uuid 查找
+    findPendingMessage({ client_id, uuid }) {
+      if (client_id && this.pendingMessages[client_id]) {
+        return this.pendingMessages[client_id];
+      }
+      return Object.values(this.pendingMessages).find(
+        (chat) => uuid && chat.uuid === uuid
+      );
+    },
+
     sendMessage(chat, func) {
       let content = chat.content;
       if (this.activeChat && content.trim()) {
         if (this.socket?.connected) {
+          chat.clientId = chat.clientId || uuidv4();
+          chat.status = "sending";
+          this.pendingMessages[chat.clientId] = chat;
           this.socket.emit("send_message", {
             receiver_id: this.activeChat,
             content: content.trim(),
+            client_id: chat.clientId,
           });
           console.log("📤 发送消息:", content.trim());
           // 前端临时处理（最终以后端message_sent为准）
@@ -251,6 +299,11 @@ export const useCurrentUserStore = defineStore("currentUser", {
         }
       }
     },
+    // 重新发送失败的消息，沿用原 clientId，聊天记录中不重复添加
+    retryMessage(chat) {
+      if (chat.status !== "failed") return;
+      this.sendMessage(chat);
+    },
     setUserInfo(val) {
       this.userInfo = { ...this.userInfo, ...val };
     },